@@ -0,0 +1,177 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Checks the import time of pyhanabi, the environment and the agents.
+
+Every module is imported in fresh interpreters, after a first import that
+fills the pyhanabi header cache, and the best time is compared against a
+budget in milliseconds. Importing must also not import the modules that are
+deferred to first use (the C library, pycparser, NumPy, TensorFlow):
+
+  python benchmarks/import_time.py
+  python benchmarks/import_time.py --first_use
+
+With --first_use, the time of the first call into the C library is checked
+too. Modules whose optional dependencies are missing are skipped, any other
+import failure is a violation. The script exits with status 1 if a module fails
+to import, a budget is exceeded or a deferred module is imported.
+"""
+
+from __future__ import print_function
+
+import getopt
+import json
+import os
+import subprocess
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_AGENTS_DIR = os.path.join(_ROOT, 'hanabi_learning_environment', 'agents')
+_PATH = [_ROOT, _AGENTS_DIR, os.path.join(_AGENTS_DIR, 'rainbow')]
+
+# Modules whose import is deferred to first use.
+_DEFERRED = ('pycparser', 'numpy', 'tensorflow')
+
+# (module, budget in ms, deferred modules it may import).
+BUDGETS = [
+    ('hanabi_learning_environment.pyhanabi', 50, ()),
+    ('hanabi_learning_environment.rl_env', 60, ()),
+    ('red_ranger', 80, ()),
+    ('tournament', 80, ()),
+    ('dqn_agent', 300, ('numpy',)),
+    ('run_experiment', 400, ('numpy',)),
+]
+
+FIRST_USE_BUDGET_MS = 100
+
+_PROBE = r"""
+import json, os, sys, time
+sys.path[:0] = {path!r}
+start = time.perf_counter()
+try:
+  import {module}
+except Exception as error:  # pylint: disable=broad-except
+  # Only a missing module from outside the tree is a missing dependency.
+  top = (getattr(error, 'name', None) or '').split('.')[0]
+  missing = isinstance(error, ModuleNotFoundError) and top and not any(
+      os.path.exists(os.path.join(directory, top)) or
+      os.path.exists(os.path.join(directory, top + '.py'))
+      for directory in {path!r})
+  print(json.dumps({{'skipped' if missing else 'error': repr(error)}}))
+  sys.exit(0)
+elapsed = time.perf_counter() - start
+result = {{'ms': 1e3 * elapsed,
+           'deferred': [name for name in {deferred!r} if name in sys.modules]}}
+from hanabi_learning_environment import pyhanabi
+if pyhanabi.lib_loaded_flag:
+  result['deferred'].append('libpyhanabi')
+if {first_use!r}:
+  start = time.perf_counter()
+  pyhanabi.HanabiGame({{'players': 2}})
+  result['first_use_ms'] = 1e3 * (time.perf_counter() - start)
+print(json.dumps(result))
+"""
+
+
+def measure(module, first_use=False):
+  """Imports a module in a fresh interpreter.
+
+  Args:
+    module: str, name of the module.
+    first_use: bool, whether to also time the first game creation.
+
+  Returns:
+    A dict with the import time 'ms', the deferred modules imported
+    'deferred' (with 'libpyhanabi' if the C library was loaded), and with
+    first_use the time of the first game creation 'first_use_ms'. Or with
+    'skipped' if a dependency of the module is missing, or 'error' if
+    importing it fails otherwise.
+  """
+  probe = _PROBE.format(path=_PATH, module=module, deferred=_DEFERRED,
+                        first_use=first_use)
+  output = subprocess.check_output([sys.executable, '-c', probe])
+  return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def run(num_runs=5, first_use=False):
+  """Measures every module of BUDGETS.
+
+  Args:
+    num_runs: int, number of fresh imports per module, the best is kept.
+    first_use: bool, whether to also check the first game creation.
+
+  Returns:
+    A pair of the results, by module, and the list of violations.
+  """
+  results = {}
+  violations = []
+  for module, budget_ms, allowed in BUDGETS:
+    # The first import may write the header cache, and is not counted.
+    first = measure(module)
+    if 'skipped' in first:
+      print('{:<40} skipped: {}'.format(module, first['skipped']))
+      continue
+    if 'error' in first:
+      print('{:<40} failed: {}'.format(module, first['error']))
+      violations.append('{} fails to import: {}'.format(module,
+                                                       first['error']))
+      continue
+    runs = [measure(module, first_use) for _ in range(num_runs)]
+    best = min(runs, key=lambda result: result['ms'])
+    results[module] = best
+    print('{:<40} {:>8.1f} ms (budget {} ms)'.format(
+        module, best['ms'], budget_ms))
+    if best['ms'] > budget_ms:
+      violations.append('{} imports in {:.1f} ms, budget {} ms'.format(
+          module, best['ms'], budget_ms))
+    for name in best['deferred']:
+      if name not in allowed:
+        violations.append('{} imports {}'.format(module, name))
+    if first_use:
+      first_use_ms = min(result['first_use_ms'] for result in runs)
+      if first_use_ms > FIRST_USE_BUDGET_MS:
+        violations.append(
+            '{}: first game created in {:.1f} ms, budget {} ms'.format(
+                module, first_use_ms, FIRST_USE_BUDGET_MS))
+  return results, violations
+
+
+USAGE = """usage: import_time.py [options]
+--num_runs   fresh imports per module, the best is kept (default 5).
+--first_use  also check the time of the first game creation."""
+
+
+def main(argv):
+  try:
+    options, arguments = getopt.getopt(argv[1:], '',
+                                       ['num_runs=', 'first_use'])
+  except getopt.GetoptError:
+    sys.exit(USAGE)
+  if arguments:
+    sys.exit(USAGE)
+  num_runs = 5
+  first_use = False
+  for flag, value in options:
+    if flag == '--num_runs':
+      num_runs = int(value)
+    elif flag == '--first_use':
+      first_use = True
+
+  _, violations = run(num_runs, first_use)
+  for violation in violations:
+    print('VIOLATION: ' + violation)
+  sys.exit(1 if violations else 0)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
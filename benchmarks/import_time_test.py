@@ -0,0 +1,37 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Enforces the import time budgets of import_time.py.
+
+  python -m unittest discover -s benchmarks -p '*_test.py'
+"""
+
+from __future__ import absolute_import
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import import_time  # pylint: disable=g-import-not-at-top
+
+
+class ImportTimeTest(unittest.TestCase):
+
+  def test_imports_within_budget(self):
+    _, violations = import_time.run(num_runs=3)
+    self.assertEqual(violations, [])
+
+
+if __name__ == '__main__':
+  unittest.main()
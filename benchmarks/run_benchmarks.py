@@ -0,0 +1,418 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks of the game engine, the environment and the agents.
+
+Every benchmark is run for every game configuration it depends on, a number of
+times with fixed seeds, and the best time per operation is kept. Results are
+written as JSON, and compared against a baseline file written by an earlier
+run on the same machine:
+
+  python benchmarks/run_benchmarks.py --update_baseline
+  # ... make a change, rebuild ...
+  python benchmarks/run_benchmarks.py
+
+The script exits with status 1 if an operation got slower than its baseline
+by more than the tolerance. Baselines are machine specific and are not
+checked in.
+
+The replay memory benchmark needs TensorFlow and gin, and is skipped when
+they are not installed.
+"""
+
+from __future__ import print_function
+
+import getopt
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_AGENTS_DIR = os.path.join(_ROOT, 'hanabi_learning_environment', 'agents')
+# The agents and the rainbow code use imports relative to their directories.
+for _path in (_ROOT, _AGENTS_DIR, os.path.join(_AGENTS_DIR, 'rainbow')):
+  if _path not in sys.path:
+    sys.path.insert(0, _path)
+
+from hanabi_learning_environment import game_record  # pylint: disable=g-import-not-at-top
+from hanabi_learning_environment import pyhanabi  # pylint: disable=g-import-not-at-top
+from hanabi_learning_environment import rl_env  # pylint: disable=g-import-not-at-top
+from Knowledge import Knowledge  # pylint: disable=g-import-not-at-top
+from third_party.dopamine import sum_tree  # pylint: disable=g-import-not-at-top
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+
+# Game configurations, by name.
+CONFIGS = {
+    '2p_full': {'players': 2, 'colors': 5, 'ranks': 5, 'hand_size': 5},
+    '3p_full': {'players': 3, 'colors': 5, 'ranks': 5, 'hand_size': 5},
+    '4p_full': {'players': 4, 'colors': 5, 'ranks': 5, 'hand_size': 4},
+    '5p_full': {'players': 5, 'colors': 5, 'ranks': 5, 'hand_size': 4},
+    '2p_small': {'players': 2, 'colors': 2, 'ranks': 5, 'hand_size': 2},
+    '3p_small': {'players': 3, 'colors': 3, 'ranks': 3, 'hand_size': 3},
+}
+
+
+class Skipped(Exception):
+  """Raised by a benchmark that cannot run in this environment."""
+
+
+def _game_config(name):
+  observation_type = pyhanabi.AgentObservationType.CARD_KNOWLEDGE.value
+  return dict(CONFIGS[name], max_information_tokens=8, max_life_tokens=3,
+              observation_type=observation_type)
+
+
+def _random_games(game, num_games, seed):
+  """Yields the states of random games, before every move, with the move.
+
+  The state is modified in place between yields.
+  """
+  rng = random.Random(seed)
+  for game_index in range(num_games):
+    state = game.new_initial_state(seed=seed + game_index)
+    state.deal_pending_cards()
+    while not state.is_terminal():
+      move = rng.choice(state.legal_moves())
+      yield state, move
+      state.apply_move(move)
+      state.deal_pending_cards()
+
+
+def bench_apply_move(config_name, scale):
+  """Time of HanabiState.apply_move, including the deal that follows."""
+  game = pyhanabi.HanabiGame(_game_config(config_name))
+  rng = random.Random(0)
+  num_games = 200 * scale
+  num_moves = 0
+  elapsed = 0.
+  for game_index in range(num_games):
+    state = game.new_initial_state(seed=game_index)
+    state.deal_pending_cards()
+    while not state.is_terminal():
+      move = rng.choice(state.legal_moves())
+      start = time.perf_counter()
+      state.apply_move(move)
+      state.deal_pending_cards()
+      elapsed += time.perf_counter() - start
+      num_moves += 1
+  return elapsed, num_moves
+
+
+def bench_env_step(config_name, scale):
+  """Time of HanabiEnv.step, which builds the observations of all players."""
+  env = rl_env.HanabiEnv(_game_config(config_name))
+  rng = random.Random(0)
+  num_games = 20 * scale
+  num_steps = 0
+  elapsed = 0.
+  for game_index in range(num_games):
+    observations = env.reset(seed=game_index)
+    done = False
+    while not done:
+      current_player = observations['current_player']
+      legal_moves = (observations['player_observations'][current_player]
+                     ['legal_moves_as_int'])
+      action = rng.choice(legal_moves)
+      start = time.perf_counter()
+      observations, _, done, _ = env.step(action)
+      elapsed += time.perf_counter() - start
+      num_steps += 1
+  return elapsed, num_steps
+
+
+def bench_encode(config_name, scale):
+  """Time of ObservationEncoder.encode, for one player's observation."""
+  game = pyhanabi.HanabiGame(_game_config(config_name))
+  encoder = pyhanabi.ObservationEncoder(
+      game, pyhanabi.ObservationEncoderType.CANONICAL)
+  num_encodings = 0
+  elapsed = 0.
+  for state, _ in _random_games(game, 20 * scale, seed=0):
+    observation = state.observation(state.cur_player())
+    start = time.perf_counter()
+    encoder.encode(observation)
+    elapsed += time.perf_counter() - start
+    num_encodings += 1
+  return elapsed, num_encodings
+
+
+def bench_observation_lists(config_name, scale):
+  """Time of an observation's legal_moves, last_moves and card_knowledge."""
+  game = pyhanabi.HanabiGame(_game_config(config_name))
+  num_observations = 0
+  elapsed = 0.
+  for state, _ in _random_games(game, 20 * scale, seed=0):
+    observation = state.observation(state.cur_player())
+    start = time.perf_counter()
+    observation.legal_moves()
+    observation.last_moves()
+    observation.card_knowledge()
+    elapsed += time.perf_counter() - start
+    num_observations += 1
+  return elapsed, num_observations
+
+
+def bench_replay_game_record(config_name, scale):
+  """Time of GameRecordReader.replay, for a whole game."""
+  config = _game_config(config_name)
+  game = pyhanabi.HanabiGame(config)
+  num_games = 20 * scale
+  with tempfile.NamedTemporaryFile(suffix='.hgr') as record_file:
+    with game_record.GameRecordWriter(record_file.name, config) as writer:
+      rng = random.Random(0)
+      for game_index in range(num_games):
+        state = game.new_initial_state(seed=game_index)
+        state.deal_pending_cards()
+        while not state.is_terminal():
+          state.apply_move(rng.choice(state.legal_moves()))
+          state.deal_pending_cards()
+        writer.write(state, game_index)
+    with game_record.GameRecordReader(record_file.name) as reader:
+      records = list(reader)
+      start = time.perf_counter()
+      for record in records:
+        reader.replay(record)
+      elapsed = time.perf_counter() - start
+  return elapsed, len(records)
+
+
+def bench_knowledge_update(config_name, scale):
+  """Time of Knowledge.update, per player and turn."""
+  config = _game_config(config_name)
+  game = pyhanabi.HanabiGame(config)
+  num_updates = 0
+  elapsed = 0.
+  # Beliefs can divide by zero when a card is ruled out entirely.
+  with warnings.catch_warnings():
+    warnings.simplefilter('ignore', RuntimeWarning)
+    for game_index in range(5 * scale):
+      players = [Knowledge(config, game, player, verbose=False)
+                 for player in range(game.num_players())]
+      for state, move in _random_games(game, 1, seed=game_index):
+        for player, knowledge in enumerate(players):
+          observation = state.observation(player)
+          start = time.perf_counter()
+          knowledge.update(observation)
+          elapsed += time.perf_counter() - start
+          num_updates += 1
+        if move.type() in (pyhanabi.HanabiMoveType.PLAY,
+                           pyhanabi.HanabiMoveType.DISCARD):
+          players[state.cur_player()].initialize_new_card(move.card_index())
+  return elapsed, num_updates
+
+
+def bench_sum_tree_sample(capacity, scale):
+  """Time of SumTree.stratified_sample, for a batch of 32."""
+  np.random.seed(0)
+  random.seed(0)
+  tree = sum_tree.SumTree(capacity)
+  for index, priority in enumerate(np.random.uniform(0.1, 1., capacity)):
+    tree.set(index, priority)
+  num_batches = 1000 * scale
+  start = time.perf_counter()
+  for _ in range(num_batches):
+    tree.stratified_sample(32)
+  return time.perf_counter() - start, num_batches
+
+
+def bench_sample_transition_batch(config_name, scale):
+  """Time of OutOfGraphReplayMemory.sample_transition_batch, batch of 32."""
+  try:
+    import replay_memory  # pylint: disable=g-import-not-at-top
+  except ImportError as error:
+    raise Skipped(str(error))
+  game = pyhanabi.HanabiGame(_game_config(config_name))
+  encoder = pyhanabi.ObservationEncoder(
+      game, pyhanabi.ObservationEncoderType.CANONICAL)
+  observation_size = encoder.shape()[0]
+  num_actions = game.max_moves()
+  capacity = 10000
+  memory = replay_memory.OutOfGraphReplayMemory(
+      num_actions, observation_size, stack_size=1, replay_capacity=capacity,
+      batch_size=32)
+  np.random.seed(0)
+  observation = np.zeros(observation_size, dtype=np.uint8)
+  legal_actions = np.zeros(num_actions, dtype=np.float32)
+  for index in range(capacity):
+    memory.add(observation, index % num_actions, 0., index % 50 == 49,
+               legal_actions)
+  num_batches = 1000 * scale
+  start = time.perf_counter()
+  for _ in range(num_batches):
+    memory.sample_transition_batch(32)
+  return time.perf_counter() - start, num_batches
+
+
+# Benchmarks by name, with the arguments they are run for.
+BENCHMARKS = {
+    'apply_move': (bench_apply_move, sorted(CONFIGS)),
+    'env_step': (bench_env_step, sorted(CONFIGS)),
+    'encode': (bench_encode, sorted(CONFIGS)),
+    'observation_lists': (bench_observation_lists, sorted(CONFIGS)),
+    'replay_game_record': (bench_replay_game_record, sorted(CONFIGS)),
+    'knowledge_update': (bench_knowledge_update, sorted(CONFIGS)),
+    'sum_tree_sample': (bench_sum_tree_sample, [1000, 100000]),
+    'sample_transition_batch': (bench_sample_transition_batch,
+                                ['2p_full', '5p_full']),
+}
+
+
+def run_benchmarks(names, repeats=5, scale=1):
+  """Runs benchmarks and returns their results.
+
+  Args:
+    names: list of benchmark names, keys of BENCHMARKS.
+    repeats: int, number of runs of each benchmark, the fastest is kept.
+    scale: int, multiplies the amount of work of every run.
+
+  Returns:
+    A dict from '<benchmark>/<argument>' to a dict with the best time per
+    operation in microseconds, 'us_per_op', the number of operations per
+    run, 'ops', and the rate, 'ops_per_sec'. Skipped benchmarks are not in
+    the dict.
+  """
+  results = {}
+  for name in names:
+    function, arguments = BENCHMARKS[name]
+    for argument in arguments:
+      best = None
+      try:
+        for _ in range(repeats):
+          elapsed, num_ops = function(argument, scale)
+          if best is None or elapsed / num_ops < best[0] / best[1]:
+            best = (elapsed, num_ops)
+      except Skipped as error:
+        print('Skipping {}/{}: {}'.format(name, argument, error))
+        break
+      us_per_op = 1e6 * best[0] / best[1]
+      results['{}/{}'.format(name, argument)] = {
+          'us_per_op': us_per_op,
+          'ops': best[1],
+          'ops_per_sec': 1e6 / us_per_op,
+      }
+  return results
+
+
+def compare(results, baseline, tolerance):
+  """Compares results with a baseline.
+
+  Args:
+    results: dict, as returned by run_benchmarks.
+    baseline: dict, results of an earlier run.
+    tolerance: float, relative slowdown above which a result is a regression.
+
+  Returns:
+    A list of (key, baseline us_per_op, us_per_op, ratio, is regression), for
+    the keys found in both.
+  """
+  rows = []
+  for key in sorted(results):
+    if key not in baseline:
+      continue
+    old = baseline[key]['us_per_op']
+    new = results[key]['us_per_op']
+    ratio = new / old
+    rows.append((key, old, new, ratio, ratio > 1. + tolerance))
+  return rows
+
+
+def machine_info():
+  """Returns a description of the machine and software versions."""
+  return {
+      'python': platform.python_version(),
+      'numpy': np.__version__,
+      'platform': platform.platform(),
+      'processor': platform.processor(),
+  }
+
+
+USAGE = """usage: run_benchmarks.py [options]
+--benchmarks       comma separated benchmarks, among {}.
+--repeats          runs of each benchmark, the fastest is kept.
+--scale            multiplies the amount of work of every run.
+--output           file to write the results to, as JSON.
+--baseline         baseline file to compare with, or to update.
+--tolerance        relative slowdown reported as a regression.
+--update_baseline  write the results to the baseline file."""
+
+
+if __name__ == '__main__':
+  flags = {'benchmarks': ','.join(sorted(BENCHMARKS)), 'repeats': 5,
+           'scale': 1, 'output': '', 'baseline': DEFAULT_BASELINE,
+           'tolerance': 0.1}
+  options, arguments = getopt.getopt(
+      sys.argv[1:], '', [flag + '=' for flag in flags] + ['update_baseline'])
+  if arguments:
+    sys.exit(USAGE.format(', '.join(sorted(BENCHMARKS))))
+  update_baseline = False
+  for flag, value in options:
+    flag = flag[2:]  # Strip leading --.
+    if flag == 'update_baseline':
+      update_baseline = True
+    else:
+      flags[flag] = type(flags[flag])(value)
+  benchmark_names = flags['benchmarks'].split(',')
+  for benchmark_name in benchmark_names:
+    if benchmark_name not in BENCHMARKS:
+      sys.exit(USAGE.format(', '.join(sorted(BENCHMARKS))))
+
+  benchmark_results = run_benchmarks(benchmark_names, flags['repeats'],
+                                     flags['scale'])
+  report = {'machine': machine_info(), 'results': benchmark_results}
+  if flags['output']:
+    with open(flags['output'], 'w') as output_file:
+      json.dump(report, output_file, indent=2, sort_keys=True)
+
+  if update_baseline:
+    baseline_results = {}
+    if os.path.exists(flags['baseline']):
+      with open(flags['baseline']) as baseline_file:
+        baseline_results = json.load(baseline_file)['results']
+    baseline_results.update(benchmark_results)
+    report['results'] = baseline_results
+    with open(flags['baseline'], 'w') as baseline_file:
+      json.dump(report, baseline_file, indent=2, sort_keys=True)
+    for key in sorted(benchmark_results):
+      print('{:<40} {:12.2f} us/op'.format(
+          key, benchmark_results[key]['us_per_op']))
+    print('Baseline written to {}.'.format(flags['baseline']))
+  elif not os.path.exists(flags['baseline']):
+    for key in sorted(benchmark_results):
+      print('{:<40} {:12.2f} us/op'.format(
+          key, benchmark_results[key]['us_per_op']))
+    print('No baseline at {}, run with --update_baseline to write one.'.format(
+        flags['baseline']))
+  else:
+    with open(flags['baseline']) as baseline_file:
+      baseline_report = json.load(baseline_file)
+    rows = compare(benchmark_results, baseline_report['results'],
+                   flags['tolerance'])
+    print('{:<40} {:>12} {:>12} {:>8}'.format('benchmark', 'baseline us',
+                                              'us', 'ratio'))
+    for key, old, new, ratio, regression in rows:
+      print('{:<40} {:12.2f} {:12.2f} {:8.3f}{}'.format(
+          key, old, new, ratio, '  REGRESSION' if regression else ''))
+    if baseline_report.get('machine') != report['machine']:
+      print('Warning: the baseline was written on another machine or with '
+            'other versions.')
+    if any(regression for _, _, _, _, regression in rows):
+      sys.exit(1)
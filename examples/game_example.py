@@ -17,6 +17,7 @@
 from __future__ import print_function
 
 import numpy as np
+from hanabi_learning_environment import game_cache
 from hanabi_learning_environment import pyhanabi
 
 
@@ -72,12 +73,12 @@ def run_game(game_parameters):
           i, encoder.encode(state.observation(i))))
     print("--- EndEncodedObservations ---")
 
-  game = pyhanabi.HanabiGame(game_parameters)
+  # Games of the same parameters share a HanabiGame, see game_cache.py.
+  game, obs_encoder = game_cache.acquire(
+      game_parameters, pyhanabi.ObservationEncoderType.CANONICAL)
   print(game.parameter_string(), end="")
-  obs_encoder = pyhanabi.ObservationEncoder(
-      game, enc_type=pyhanabi.ObservationEncoderType.CANONICAL)
 
-  state = game.new_initial_state()
+  state = game.new_initial_state(seed=game_cache.config_seed(game_parameters))
   while not state.is_terminal():
     if state.cur_player() == pyhanabi.CHANCE_PLAYER_ID:
       state.deal_random_card()
@@ -104,6 +105,7 @@ def run_game(game_parameters):
   print(state)
   print("")
   print("score: {}".format(state.score()))
+  game_cache.release(game_parameters)
 
 
 if __name__ == "__main__":
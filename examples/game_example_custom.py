@@ -17,6 +17,7 @@
 from __future__ import print_function
 
 import numpy as np
+from hanabi_learning_environment import game_cache
 from hanabi_learning_environment import pyhanabi
 import hanabi_learning_environment.agents as rdcustom
 from hanabi_learning_environment.agents import RandomAgent
@@ -78,16 +79,15 @@ def run_game(game_parameters):
           i, encoder.encode(state.observation(i))))
     print("--- EndEncodedObservations ---")
 
-  game = pyhanabi.HanabiGame(game_parameters)
+  game, obs_encoder = game_cache.acquire(
+      game_parameters, pyhanabi.ObservationEncoderType.CANONICAL)
   print(game.parameter_string(), end="")
-  obs_encoder = pyhanabi.ObservationEncoder(
-      game, enc_type=pyhanabi.ObservationEncoderType.CANONICAL)
 
   players_number = game_parameters['players']
   players = [rdcustom.random_agent_custom.RandomAgent(game_parameters) for k in range(players_number)]
   # players = [red_ranger.RedRanger(game_parameters) for k in range(players_number)]
 
-  state = game.new_initial_state()
+  state = game.new_initial_state(seed=game_cache.config_seed(game_parameters))
   while not state.is_terminal():
     if state.cur_player() == pyhanabi.CHANCE_PLAYER_ID:
       state.deal_random_card()
@@ -116,6 +116,7 @@ def run_game(game_parameters):
   print(state)
   print("")
   print("score: {}".format(state.score()))
+  game_cache.release(game_parameters)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,9 @@
 from __future__ import division
-import numpy as np
 from bcolors import bcolors
+from hanabi_learning_environment.lazy_import import LazyModule
+
+# NumPy is imported when a Knowledge is first built, not with this module.
+np = LazyModule('numpy')
 
 
 
@@ -27,13 +30,14 @@ class Knowledge:
     The hints about each card in the payer's hand is stored in an array as well
     """
 
-    def __init__(self, config, game, playerIndex):
+    def __init__(self, config, game, playerIndex, verbose=True):
         #configuration
+        self.verbose = verbose #print the knowledge at each update
         self.config = config
         self.players = config['players'] if 'players' in config else 5
         self.colors = config['colors'] if 'colors' in config else 5
         self.ranks = config['ranks'] if 'ranks' in config else 5
-        self.hand_size = config['ranks'] if 'ranks' in config else 5
+        self.hand_size = game.hand_size()
         self.game = game
         self.index = playerIndex #0-based player index
 
@@ -55,7 +59,8 @@ class Knowledge:
                     #update_proba_vectors_v2
                         # ... (until the information propagates)
 
-        self.print_knowledge()
+        if self.verbose:
+            self.print_knowledge()
         return
 
 
@@ -72,9 +77,10 @@ class Knowledge:
         lastMoves = observation.last_moves()
 
         ##print
-        print(bcolors.LIGHTGREEN + "LAST MOVES " + bcolors.WHITE)
-        print(lastMoves)
-        print("")
+        if self.verbose:
+            print(bcolors.LIGHTGREEN + "LAST MOVES " + bcolors.WHITE)
+            print(lastMoves)
+            print("")
         ##
 
         for i in range(len(lastMoves)):
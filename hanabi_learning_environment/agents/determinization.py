@@ -0,0 +1,59 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Sampling of complete game states from an agent's point of view."""
+
+from hanabi_learning_environment import lazy_import
+
+np = lazy_import.LazyModule('numpy')
+
+
+def belief_weights(observation, beliefs):
+  """Returns per-card weights for HanabiObservation.sample_determinizations.
+
+  Args:
+    observation: pyhanabi.HanabiObservation of the player holding beliefs.
+    beliefs: Knowledge of the observing player, or None.
+
+  Returns:
+    An array indexed by [card_index][color][rank] with the probability that
+    each card in the observer's hand has that color and rank, or None if
+    beliefs is None.
+  """
+  if beliefs is None:
+    return None
+  hand_size = len(observation.card_knowledge()[0])
+  return np.array([beliefs.proba_vectors[card_index].getProbaMatrix()
+                   for card_index in range(hand_size)])
+
+
+def sample_determinization(observation, beliefs, n, seed=None):
+  """Samples complete game states consistent with an observation.
+
+  The observer's cards are drawn according to the unseen card counts and the
+  hints received, weighted by the card probabilities in beliefs. In the
+  returned states the observer is player 0 and the other players are seated
+  relative to them, as in the observation.
+
+  Args:
+    observation: pyhanabi.HanabiObservation of the current player.
+    beliefs: Knowledge of the observing player, or None to sample from the
+      hints and card counts alone.
+    n: int, number of states to sample.
+    seed: int, optional seed of the sampling.
+
+  Returns:
+    A list of n pyhanabi.HanabiState objects.
+  """
+  return observation.sample_determinizations(
+      n, card_weights=belief_weights(observation, beliefs), seed=seed)
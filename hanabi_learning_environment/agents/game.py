@@ -17,6 +17,7 @@
 from __future__ import print_function
 from bcolors import bcolors
 import numpy as np
+from hanabi_learning_environment import game_cache
 from hanabi_learning_environment import pyhanabi
 import hanabi_learning_environment.agents as rdcustom
 
@@ -82,12 +83,9 @@ def run_game(config):
 
 
     ### Creating an instance of the Hanabi game
-    game = pyhanabi.HanabiGame(config)
+    game, obs_encoder = game_cache.acquire(
+        config, pyhanabi.ObservationEncoderType.CANONICAL)
     #print(game.parameter_string(), end="")
-    obs_encoder = pyhanabi.ObservationEncoder(
-      game,
-      enc_type=pyhanabi.ObservationEncoderType.CANONICAL
-    )
 
 
     ### Initialize players
@@ -96,14 +94,14 @@ def run_game(config):
 
 
     ### Initialize the state of the Hanabi Game
-    state = game.new_initial_state()
+    state = game.new_initial_state(seed=game_cache.config_seed(config))
 
 
     ### Main loop of the game
     nb_round = 1
     while not state.is_terminal():
         if state.cur_player() == pyhanabi.CHANCE_PLAYER_ID:
-          state.deal_random_card()
+          state.deal_pending_cards()
           continue
 
         active_player = players[state.cur_player()]
@@ -144,6 +142,7 @@ def run_game(config):
     print(state)
     print("")
     print("score: {}".format(state.score()))
+    game_cache.release(config)
 
 
 if __name__ == "__main__":
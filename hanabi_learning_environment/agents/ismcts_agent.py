@@ -0,0 +1,325 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Information-set Monte Carlo tree search agent.
+
+Single-observer IS-MCTS: every iteration samples a complete state consistent
+with the agent's observation and beliefs, then descends a single tree whose
+edges are move uids, only considering the moves that are legal in the sampled
+state. Move uids are relative to the acting player, so the same edge stands
+for the same move in every sampled state.
+
+The tree is kept between turns: at the next turn, the moves played since the
+agent's last action are followed down the tree and the reached node becomes
+the new root. With several processes, each child process searches its own
+copy of the tree and the visit counts of the root moves are summed.
+"""
+
+import math
+import multiprocessing
+import random
+import time
+
+from determinization import sample_determinization
+from hanabi_learning_environment.rl_env import Agent
+from hanabi_learning_environment.pyhanabi import HanabiMoveType
+from hanabi_learning_environment.pyhanabi import RolloutPolicy
+from Knowledge import Knowledge
+from transposition_table import TranspositionTable
+
+# Number of states sampled per call when running on a time budget.
+_SAMPLE_BATCH_SIZE = 64
+
+
+class _Node(object):
+  """Statistics of a move in the search tree."""
+
+  __slots__ = ['children', 'visits', 'total_reward', 'availability']
+
+  def __init__(self):
+    self.children = {}  # Move uid to _Node.
+    self.visits = 0
+    self.total_reward = 0.
+    # Number of times the move was legal when its parent was visited.
+    self.availability = 0
+
+
+def _random_playout(state, rng):
+  """Plays random legal moves until the end of the game.
+
+  Args:
+    state: pyhanabi.HanabiState, modified in place.
+    rng: random.Random.
+
+  Returns:
+    The number of cards on the fireworks at the end. Unlike the score, it is
+    not zeroed when the players run out of life tokens, which random playouts
+    nearly always do.
+  """
+  return state.rollout_to_terminal(RolloutPolicy.RANDOM,
+                                   seed=rng.randint(0, 2**31 - 1),
+                                   return_stats=True)['fireworks']
+
+
+def _heuristic_playout(state, rng):
+  """Plays a simple policy that sees every card until the end of the game.
+
+  The current player plays a playable card if they hold one. Otherwise they
+  discard, preferring cards that can no longer be played, or give a random
+  hint if discarding is not allowed.
+
+  Args:
+    state: pyhanabi.HanabiState, modified in place.
+    rng: random.Random.
+
+  Returns:
+    The final score.
+  """
+  return state.rollout_to_terminal(RolloutPolicy.SIMPLE,
+                                   seed=rng.randint(0, 2**31 - 1))
+
+
+_PLAYOUTS = {'heuristic': _heuristic_playout, 'random': _random_playout}
+
+
+def _search_process(agent, observation, num_iterations, deadline, seed, conn):
+  """Entry point of a root-parallel search process."""
+  agent.rng.seed(seed)
+  agent.search(observation, num_iterations, deadline)
+  conn.send(dict((uid, (child.visits, child.total_reward))
+                 for uid, child in agent.root.children.items()))
+  conn.close()
+
+
+def _rank_key(stats):
+  """Returns the sort key of a root move from its (visits, total reward)."""
+  visits, total_reward = stats
+  return visits, total_reward / visits if visits else 0.
+
+
+class ISMCTSAgent(Agent):
+  """Agent that plans with information-set Monte Carlo tree search."""
+
+  def __init__(self, config, game, playerIndex, *args, **kwargs):
+    """Initialize the agent.
+
+    Args:
+      config: dict, game configuration. The search reads the following
+        optional keys:
+        - mcts_iterations: int, iterations per move (default 1000), used when
+          no time budget is given.
+        - mcts_time_budget: float, seconds of search per move, overrides
+          mcts_iterations.
+        - mcts_processes: int, number of processes searching in parallel from
+          the root (default 1).
+        - mcts_exploration: float, UCB exploration constant (default 0.7).
+        - mcts_use_beliefs: bool, sample hands from the Knowledge beliefs
+          rather than the hints alone (default True).
+        - mcts_playout: str, 'heuristic' (default) or 'random', the policy
+          playing out the sampled states after the tree.
+        - mcts_transposition_size: int, capacity of a transposition table
+          caching playout results by state hash (default 0, no table).
+        - mcts_transposition_visits: int, number of playouts from a state
+          after which its cached mean is used instead of a new playout
+          (default 8).
+        - seed: int, seed of the search.
+      game: pyhanabi.HanabiGame of the game played.
+      playerIndex: int, 0-based index of the agent in the game.
+      **kwargs: optional `verbose` flag of the Knowledge beliefs, and optional
+        `transposition_table`, a TranspositionTable shared with other agents,
+        which overrides mcts_transposition_size.
+    """
+    self.config = config
+    self.game = game
+    self.index = playerIndex
+    self.num_iterations = config.get('mcts_iterations', 1000)
+    self.time_budget = config.get('mcts_time_budget', None)
+    self.num_processes = config.get('mcts_processes', 1)
+    self.exploration = config.get('mcts_exploration', 0.7)
+    self.use_beliefs = config.get('mcts_use_beliefs', True)
+    self.playout = _PLAYOUTS[config.get('mcts_playout', 'heuristic')]
+    self.transpositions = kwargs.get('transposition_table', None)
+    if (self.transpositions is None and
+        config.get('mcts_transposition_size', 0) > 0):
+      self.transpositions = TranspositionTable(
+          config['mcts_transposition_size'])
+    self.transposition_visits = config.get('mcts_transposition_visits', 8)
+    self.max_score = game.num_colors() * game.num_ranks()
+    self.rng = random.Random(config.get('seed', None))
+    self.knowledge = Knowledge(config, game, playerIndex,
+                               verbose=kwargs.get('verbose', False))
+    self.root = _Node()
+    self._last_move_uid = None
+
+  def act(self, observation):
+    """Act based on an observation."""
+    self.knowledge.update(observation)
+    if observation.cur_player_offset() != 0:
+      return None
+
+    self._advance_root(observation)
+    deadline = None
+    if self.time_budget is not None:
+      deadline = time.time() + self.time_budget
+    if self.num_processes > 1:
+      stats = self._parallel_search(observation, deadline)
+    else:
+      self.search(observation, self.num_iterations, deadline)
+      stats = dict((uid, (child.visits, child.total_reward))
+                   for uid, child in self.root.children.items())
+
+    # Most visited move, ties broken by mean reward.
+    legal_moves = dict((self.game.get_move_uid(move), move)
+                       for move in observation.legal_moves())
+    uid = max(legal_moves, key=lambda uid: _rank_key(stats.get(uid, (0, 0.))))
+    move = legal_moves[uid]
+    self._last_move_uid = uid
+    if move.type() in (HanabiMoveType.PLAY, HanabiMoveType.DISCARD):
+      self.knowledge.initialize_new_card(move.card_index())
+    return move
+
+  def search(self, observation, num_iterations, deadline=None):
+    """Runs search iterations from the root.
+
+    Args:
+      observation: pyhanabi.HanabiObservation of the agent, who must be the
+        current player.
+      num_iterations: int, number of iterations, ignored if deadline is set.
+      deadline: float, time.time() at which to stop, or None.
+    """
+    beliefs = self.knowledge if self.use_beliefs else None
+    iteration = 0
+    while (iteration < num_iterations if deadline is None
+           else time.time() < deadline):
+      batch_size = (num_iterations - iteration if deadline is None
+                    else _SAMPLE_BATCH_SIZE)
+      states = sample_determinization(
+          observation, beliefs, batch_size, seed=self.rng.randint(0, 2**31 - 1))
+      if not states:
+        return
+      for state in states:
+        self._iterate(state)
+        iteration += 1
+        if deadline is not None and time.time() >= deadline:
+          return
+
+  def _iterate(self, state):
+    """Runs one selection, expansion, playout and backup on a sampled state."""
+    path = [self.root]
+    node = self.root
+    while not state.is_terminal():
+      legal = dict((self.game.get_move_uid(move), move)
+                   for move in state.legal_moves())
+      for uid in legal:
+        if uid in node.children:
+          node.children[uid].availability += 1
+      untried = [uid for uid in legal if uid not in node.children]
+      if untried:
+        uid = self.rng.choice(untried)
+        child = _Node()
+        child.availability = 1
+        node.children[uid] = child
+        state.apply_move(legal[uid])
+        state.deal_pending_cards()
+        path.append(child)
+        break
+      uid = max(legal, key=lambda uid: self._ucb(node.children[uid]))
+      node = node.children[uid]
+      state.apply_move(legal[uid])
+      state.deal_pending_cards()
+      path.append(node)
+
+    reward = self._evaluate(state)
+    for node in path:
+      node.visits += 1
+      node.total_reward += reward
+
+  def _evaluate(self, state):
+    """Returns the playout reward of a state, using the transposition table.
+
+    Args:
+      state: pyhanabi.HanabiState, modified in place by the playout.
+    """
+    if self.transpositions is None:
+      return self.playout(state, self.rng) / self.max_score
+    key = state.hash()
+    entry = self.transpositions.get(key)
+    if entry is not None and entry[0] >= self.transposition_visits:
+      return entry[1] / entry[0]
+    reward = self.playout(state, self.rng) / self.max_score
+    if entry is None:
+      self.transpositions.put(key, [1, reward])
+    else:
+      entry[0] += 1
+      entry[1] += reward
+    return reward
+
+  def _ucb(self, node):
+    """Returns the upper confidence bound of a visited node."""
+    return (node.total_reward / node.visits + self.exploration *
+            math.sqrt(math.log(node.availability) / node.visits))
+
+  def _advance_root(self, observation):
+    """Moves the root to the node of the current turn, if it was explored."""
+    if self._last_move_uid is None:
+      self.root = _Node()
+      return
+    # Last moves are most recent first, and start with the agent's own move.
+    node = self.root
+    for item in reversed(observation.last_moves()):
+      move = item.move()
+      if move.type() == HanabiMoveType.DEAL:
+        continue
+      node = node.children.get(self.game.get_move_uid(move))
+      if node is None:
+        break
+    self.root = node if node is not None else _Node()
+
+  def _parallel_search(self, observation, deadline):
+    """Searches from the root in several processes.
+
+    Child processes are forked with a copy of the tree and return the
+    statistics of the root moves. This process searches its own tree too, and
+    keeps it for the next turn.
+
+    Returns:
+      A dict from move uid to (visits, total reward), summed over processes.
+    """
+    context = multiprocessing.get_context('fork')
+    # Child trees start from the current statistics, only count their work.
+    start_stats = dict((uid, (child.visits, child.total_reward))
+                       for uid, child in self.root.children.items())
+    processes = []
+    connections = []
+    for _ in range(self.num_processes - 1):
+      parent_conn, child_conn = context.Pipe(duplex=False)
+      process = context.Process(
+          target=_search_process,
+          args=(self, observation, self.num_iterations, deadline,
+                self.rng.randint(0, 2**31 - 1), child_conn))
+      process.start()
+      child_conn.close()
+      processes.append(process)
+      connections.append(parent_conn)
+
+    self.search(observation, self.num_iterations, deadline)
+    stats = dict((uid, (child.visits, child.total_reward))
+                 for uid, child in self.root.children.items())
+    for conn, process in zip(connections, processes):
+      for uid, (visits, total_reward) in conn.recv().items():
+        start_visits, start_reward = start_stats.get(uid, (0, 0.))
+        old_visits, old_reward = stats.get(uid, (0, 0.))
+        stats[uid] = (old_visits + visits - start_visits,
+                      old_reward + total_reward - start_reward)
+      process.join()
+    return stats
@@ -0,0 +1,331 @@
+# coding=utf-8
+# Copyright 2018 The Dopamine Authors and Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Parallel actor processes feeding a central learner.
+
+Actor processes are forked from a process that loaded the experiment's gin
+configuration and built the environment. Each builds its own agent and plays
+self-play episodes with a copy of the learner's online network. Instead of
+writing to a local replay memory, the actor ships every finished episode to
+the learner through a queue. The learner adds the transitions to its replay
+memory and runs one training step per transition, which keeps the update
+schedule of the single-process loop while the actors are already playing the
+next episodes.
+
+An actor can play several episodes at once, one per thread, with
+envs_per_actor. Their actions are then selected in batches by an
+inference_server.InferenceServer, with one forward pass for all the threads
+waiting for an action.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import concurrent.futures
+import multiprocessing
+import threading
+import time
+
+import gin
+from hanabi_learning_environment import lazy_import
+from hanabi_learning_environment import worker_pool
+import inference_server
+import numpy as np
+
+tf = lazy_import.LazyModule('tensorflow')
+
+try:
+  import queue  # pylint: disable=g-import-not-at-top
+except ImportError:
+  import Queue as queue  # pylint: disable=g-import-not-at-top
+
+# Actors never sample from their replay memory, so they only need a small one.
+ACTOR_REPLAY_CAPACITY = 1000
+
+
+def _drain(q):
+  """Returns the most recent item of a queue, or None if it is empty."""
+  item = None
+  while True:
+    try:
+      item = q.get_nowait()
+    except queue.Empty:
+      return item
+
+
+def _preload_actor(gin_files, gin_bindings, episode_queue, weights_queues,
+                   stop_event):
+  """Prepares the actors, in the server process of their worker pool.
+
+  Loads the gin configuration, which imports TensorFlow, and builds the
+  environment, so that the forked actors only build their agent.
+
+  Args:
+    gin_files: list of str, gin configuration files of the experiment.
+    gin_bindings: list of str, gin bindings of the experiment.
+    episode_queue: queue receiving the episodes played by the actors.
+    weights_queues: list of queues from which the learner's weights are read,
+      one per actor.
+    stop_event: event set by the learner when the actors should exit.
+  """
+  # Imported here to avoid a circular import, run_experiment imports this
+  # module.
+  import run_experiment  # pylint: disable=g-import-not-at-top
+
+  run_experiment.load_gin_configs(gin_files, gin_bindings)
+  for configurable in ('WrappedReplayMemory', 'WrappedPrioritizedReplayMemory'):
+    gin.bind_parameter('{}.replay_capacity'.format(configurable),
+                       ACTOR_REPLAY_CAPACITY)
+  environment = run_experiment.create_environment()
+  worker_pool.preloaded_context().update(
+      environment=environment,
+      episode_queue=episode_queue,
+      weights_queues=weights_queues,
+      stop_event=stop_event)
+
+
+def _play_episodes(actor_id, agent, environment, obs_stacker, episode,
+                   weights_lock, done):
+  """Plays episodes and ships them to the learner until the actor stops.
+
+  Args:
+    actor_id: int, index of this actor.
+    agent: the actor's agent, whose transition_sink appends to
+      episode.transitions.
+    environment: the environment to play in, used by this thread only.
+    obs_stacker: observation stacker of the environment.
+    episode: threading.local holding the transitions of the calling thread.
+    weights_lock: lock serializing the weight updates of the agent.
+    done: event set when another thread of the actor failed.
+  """
+  import run_experiment  # pylint: disable=g-import-not-at-top
+
+  context = worker_pool.preloaded_context()
+  episode_queue = context['episode_queue']
+  weights_queue = context['weights_queues'][actor_id]
+  stop_event = context['stop_event']
+  episode.transitions = []
+  while not (stop_event.is_set() or done.is_set()):
+    with weights_lock:
+      update = _drain(weights_queue)
+      if update is not None:
+        training_steps, weights = update
+        agent.set_weights(weights)
+        # Exploration follows the learner's global schedule.
+        agent.training_steps = training_steps
+
+    episode_length, episode_return = run_experiment.run_one_episode(
+        agent, environment, obs_stacker)
+    columns = [np.stack(column) for column in zip(*episode.transitions)]
+    del episode.transitions[:]
+    episode_queue.put((actor_id, episode_length, episode_return, columns))
+
+
+def _actor_main(actor_id, envs_per_actor=1):
+  """Entry point of an actor, in a worker forked by _preload_actor's pool.
+
+  Args:
+    actor_id: int, index of this actor.
+    envs_per_actor: int, number of episodes played at once, one per thread.
+  """
+  import run_experiment  # pylint: disable=g-import-not-at-top
+
+  environment = worker_pool.preloaded_context()['environment']
+  # TensorFlow sessions do not survive a fork, so every actor builds its
+  # agent after it.
+  obs_stacker = run_experiment.create_obs_stacker(environment)
+  agent = run_experiment.create_agent(environment, obs_stacker)
+  agent.eval_mode = False
+
+  # Each thread collects the transitions of its own episodes.
+  episode = threading.local()
+  agent.transition_sink = (
+      lambda *transition: episode.transitions.append(transition))
+  weights_lock = threading.Lock()
+  done = threading.Event()
+  if envs_per_actor == 1:
+    _play_episodes(actor_id, agent, environment, obs_stacker, episode,
+                   weights_lock, done)
+    return
+
+  environments = [environment] + [run_experiment.create_environment()
+                                  for _ in range(envs_per_actor - 1)]
+  agent.inference_server = inference_server.InferenceServer(
+      agent, max_batch_size=envs_per_actor)
+  agent.inference_server.start()
+  executor = concurrent.futures.ThreadPoolExecutor(envs_per_actor)
+  try:
+    futures = [
+        executor.submit(_play_episodes, actor_id, agent, env,
+                        run_experiment.create_obs_stacker(env), episode,
+                        weights_lock, done)
+        for env in environments]
+    concurrent.futures.wait(
+        futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+  finally:
+    done.set()
+    executor.shutdown(wait=True)
+    agent.inference_server.stop()
+  for future in futures:
+    # Raises the exception of a thread that failed.
+    future.result()
+
+
+@gin.configurable
+class ActorPool(object):
+  """Set of actor processes playing episodes for a learner.
+
+  The actors are the workers of a worker_pool.WorkerPool, forked from a
+  server process that loaded the gin configuration and built the environment.
+  """
+
+  def __init__(self, num_actors, gin_files, gin_bindings, queue_size=64,
+               weight_sync_period=500, envs_per_actor=1):
+    """Initializes the pool. Actors are started by start().
+
+    Args:
+      num_actors: int, number of actor processes.
+      gin_files: list of str, gin configuration files, loaded by every actor.
+      gin_bindings: list of str, gin bindings, applied by every actor.
+      queue_size: int, maximum number of finished episodes waiting for the
+        learner. Actors block when the queue is full.
+      weight_sync_period: int, number of learner training steps between two
+        weight broadcasts to the actors.
+      envs_per_actor: int, number of episodes each actor plays at once, in
+        threads whose actions are selected in batches by an InferenceServer.
+    """
+    self._num_actors = num_actors
+    self._gin_files = list(gin_files or [])
+    self._gin_bindings = list(gin_bindings or [])
+    self._weight_sync_period = weight_sync_period
+    self._envs_per_actor = envs_per_actor
+    # The queues and event are inherited by the actors from the pool's server
+    # process, which starts from a fresh interpreter.
+    self._context = multiprocessing.get_context('spawn')
+    self._episode_queue = self._context.Queue(maxsize=queue_size)
+    self._weights_queues = [self._context.Queue(maxsize=1)
+                            for _ in range(num_actors)]
+    self._stop_event = self._context.Event()
+    self._pool = None
+    self._actors = []
+    self._last_sync_step = None
+
+  def start(self):
+    """Starts the actor processes."""
+    self._pool = worker_pool.WorkerPool(
+        self._num_actors, initializer=_preload_actor,
+        initargs=(self._gin_files, self._gin_bindings, self._episode_queue,
+                  self._weights_queues, self._stop_event))
+    self._actors = [
+        self._pool.submit(_actor_main, actor_id, self._envs_per_actor)
+        for actor_id in range(self._num_actors)]
+    tf.logging.info('Started %d actor processes.', self._num_actors)
+
+  def maybe_publish_weights(self, agent):
+    """Sends the agent's weights to the actors if a sync is due.
+
+    Args:
+      agent: the learner agent.
+    """
+    if (self._last_sync_step is not None and
+        agent.training_steps - self._last_sync_step < self._weight_sync_period):
+      return
+    update = (agent.training_steps, agent.get_weights())
+    for weights_queue in self._weights_queues:
+      # Replace a stale update the actor has not picked up yet.
+      _drain(weights_queue)
+      weights_queue.put(update)
+    self._last_sync_step = agent.training_steps
+
+  def get_episode(self, poll_period=1.):
+    """Blocks until an actor finishes an episode and returns it.
+
+    Args:
+      poll_period: float, seconds between two checks that the actors are
+        still running while waiting.
+
+    Returns:
+      actor_id: int, the actor that played the episode.
+      episode_length: int, number of actions in the episode.
+      episode_return: float, undiscounted return of the episode.
+      transitions: list of `np.array`, the observations, actions, rewards,
+        terminals and legal actions of the episode, in replay order.
+
+    Raises:
+      The exception of an actor that failed, or worker_pool.WorkerError if an
+      actor exited.
+    """
+    while True:
+      try:
+        return self._episode_queue.get(timeout=poll_period)
+      except queue.Empty:
+        pass
+      for actor in self._actors:
+        if actor.ready():
+          # Raises the actor's exception, if it failed.
+          actor.get()
+          raise worker_pool.WorkerError('An actor exited before being stopped.')
+
+  def stop(self):
+    """Stops and joins the actor processes."""
+    self._stop_event.set()
+    # Unblock actors waiting on a full queue.
+    _drain(self._episode_queue)
+    deadline = time.time() + 10
+    while (not all(actor.ready() for actor in self._actors) and
+           time.time() < deadline):
+      time.sleep(0.1)
+    if all(actor.ready() for actor in self._actors):
+      self._pool.close()
+    else:
+      self._pool.terminate()
+    self._pool = None
+    self._actors = []
+
+
+def run_actor_learner_phase(agent, actor_pool, min_steps, statistics):
+  """Trains the learner on episodes played by the actors.
+
+  Args:
+    agent: the learner agent.
+    actor_pool: a started `ActorPool`.
+    min_steps: int, minimum number of environment steps to consume.
+    statistics: `IterationStatistics` object which records the experimental
+      results.
+
+  Returns:
+    The number of steps consumed in this phase, the sum of returns, and the
+      number of episodes consumed.
+  """
+  step_count = 0
+  num_episodes = 0
+  sum_returns = 0.
+
+  agent.eval_mode = False
+  while step_count < min_steps:
+    _, episode_length, episode_return, transitions = actor_pool.get_episode()
+    agent.add_transitions(*transitions)
+    agent.train(len(transitions[0]))
+    actor_pool.maybe_publish_weights(agent)
+
+    statistics.append({
+        'train_episode_lengths': episode_length,
+        'train_episode_returns': episode_return
+    })
+    step_count += episode_length
+    sum_returns += episode_return
+    num_episodes += 1
+
+  return step_count, sum_returns, num_episodes
@@ -28,14 +28,17 @@ import collections
 import math
 import os
 import random
+import threading
 
-import gin.tf
+import gin
+from hanabi_learning_environment import instrumentation
+from hanabi_learning_environment import lazy_import
 import numpy as np
 import replay_memory
-import tensorflow as tf
 
 
-slim = tf.contrib.slim
+tf = lazy_import.LazyModule('tensorflow')
+slim = lazy_import.LazyModule('tensorflow.contrib.slim')
 
 Transition = collections.namedtuple(
     'Transition', ['reward', 'observation', 'legal_actions', 'action', 'begin'])
@@ -107,12 +110,9 @@ class DQNAgent(object):
                graph_template=dqn_template,
                tf_device='/cpu:*',
                use_staging=True,
-               optimizer=tf.train.RMSPropOptimizer(
-                   learning_rate=.0025,
-                   decay=0.95,
-                   momentum=0.0,
-                   epsilon=1e-6,
-                   centered=True)):
+               observation_dtype=np.uint8,
+               optimizer=None,
+               sparse_capacity=None):
     """Initializes the agent and constructs its graph.
 
     Args:
@@ -136,8 +136,23 @@ class DQNAgent(object):
       tf_device: str, Tensorflow device on which to run computations.
       use_staging: bool, when True use a staging area to prefetch the next
         sampling batch.
-      optimizer: Optimizer instance used for learning.
+      observation_dtype: numpy dtype of the observations, uint8 for binary
+        encodings, float32 for belief encodings.
+      optimizer: Optimizer instance used for learning, by default RMSProp
+        (built here, so that importing this module does not import
+        TensorFlow).
+      sparse_capacity: int or None. If set, the replay memory stores the
+        indices of the nonzero entries of binary observations, see
+        OutOfGraphReplayMemory, which begin_episode and step then take as
+        observation_indices.
     """
+    if optimizer is None:
+      optimizer = tf.train.RMSPropOptimizer(
+          learning_rate=.0025,
+          decay=0.95,
+          momentum=0.0,
+          epsilon=1e-6,
+          centered=True)
 
     tf.logging.info('Creating %s agent with the following parameters:',
                     self.__class__.__name__)
@@ -156,6 +171,8 @@ class DQNAgent(object):
     # Global variables.
     self.num_actions = num_actions
     self.observation_size = observation_size
+    self.observation_dtype = observation_dtype
+    self.sparse_capacity = sparse_capacity
     self.num_players = num_players
     self.gamma = gamma
     self.update_horizon = update_horizon
@@ -171,6 +188,13 @@ class DQNAgent(object):
     self.training_steps = 0
     self.batch_staged = False
     self.optimizer = optimizer
+    # When set, transitions are handed to this callable instead of being
+    # written to the local replay memory. Used by actor processes, which ship
+    # their experience to a central learner.
+    self.transition_sink = None
+    # When set, actions are selected by this inference_server.InferenceServer,
+    # in batches with those of the other threads playing with this agent.
+    self.inference_server = None
 
     with tf.device(tf_device):
       # Calling online_convnet will generate a new graph as defined in
@@ -182,7 +206,8 @@ class DQNAgent(object):
       # that make up the state.
       states_shape = (1, observation_size, stack_size)
       self.state = np.zeros(states_shape)
-      self.state_ph = tf.placeholder(tf.uint8, states_shape, name='state_ph')
+      self.state_ph = tf.placeholder(tf.as_dtype(observation_dtype),
+                                     states_shape, name='state_ph')
       self.legal_actions_ph = tf.placeholder(tf.float32,
                                              [self.num_actions],
                                              name='legal_actions_ph')
@@ -197,6 +222,14 @@ class DQNAgent(object):
 
       self._q_argmax = tf.argmax(self._q + self.legal_actions_ph, axis=1)[0]
 
+      # Batched action selection, see select_actions.
+      self.batch_state_ph = tf.placeholder(
+          tf.as_dtype(observation_dtype), (None, observation_size, stack_size),
+          name='batch_state_ph')
+      self.batch_legal_actions_ph = tf.placeholder(
+          tf.float32, [None, self.num_actions], name='batch_legal_actions_ph')
+      self._batch_q_argmax = self._build_batch_q_argmax(online_convnet)
+
     # Set up a session and initialize variables.
     self._sess = tf.Session(
         '', config=tf.ConfigProto(allow_soft_placement=True))
@@ -206,8 +239,15 @@ class DQNAgent(object):
     self._saver = tf.train.Saver(max_to_keep=3)
 
     # This keeps tracks of the observed transitions during play, for each
-    # player.
-    self.transitions = [[] for _ in range(num_players)]
+    # player, and for each thread playing with this agent, see transitions.
+    self._episodes = threading.local()
+
+  @property
+  def transitions(self):
+    """Returns the transitions of the calling thread's episode, per player."""
+    if not hasattr(self._episodes, 'transitions'):
+      self._episodes.transitions = [[] for _ in range(self.num_players)]
+    return self._episodes.transitions
 
   def _build_replay_memory(self, use_staging):
     """Creates the replay memory used by the agent.
@@ -225,7 +265,22 @@ class DQNAgent(object):
         stack_size=1,
         use_staging=use_staging,
         update_horizon=self.update_horizon,
-        gamma=self.gamma)
+        gamma=self.gamma,
+        observation_dtype=self.observation_dtype,
+        sparse_capacity=self.sparse_capacity)
+
+  def _build_batch_q_argmax(self, online_convnet):
+    """Builds an op selecting the greedy legal action for a batch of states.
+
+    Args:
+      online_convnet: the online network template.
+
+    Returns:
+      An op returning one action per row of batch_state_ph.
+    """
+    batch_q = online_convnet(state=self.batch_state_ph,
+                             num_actions=self.num_actions)
+    return tf.argmax(batch_q + self.batch_legal_actions_ph, axis=1)
 
   def _build_target_q_op(self):
     """Build an op to be used as a target for the Q-value.
@@ -281,25 +336,32 @@ class DQNAgent(object):
       sync_qt_ops.append(w_target.assign(w_online, use_locking=True))
     return sync_qt_ops
 
-  def begin_episode(self, current_player, legal_actions, observation):
+  def begin_episode(self, current_player, legal_actions, observation,
+                    observation_indices=None):
     """Returns the agent's first action.
 
     Args:
       current_player: int, the player whose turn it is.
       legal_actions: `np.array`, actions which the player can currently take.
       observation: `np.array`, the environment's initial observation.
+      observation_indices: `np.array` int16, the indices of the nonzero entries
+        of observation padded to sparse_capacity with -1, stored instead of it
+        when sparse_capacity is set.
 
     Returns:
       A legal, int-valued action.
     """
     self._train_step()
 
-    self.action = self._select_action(observation, legal_actions)
+    action = self._select_action(observation, legal_actions)
+    self.action = action
     self._record_transition(current_player, 0, observation, legal_actions,
-                            self.action, begin=True)
-    return self.action
+                            action, begin=True,
+                            observation_indices=observation_indices)
+    return action
 
-  def step(self, reward, current_player, legal_actions, observation):
+  def step(self, reward, current_player, legal_actions, observation,
+           observation_indices=None):
     """Stores observations from last transition and chooses a new action.
 
     Notifies the agent of the outcome of the latest transition and stores it
@@ -310,16 +372,19 @@ class DQNAgent(object):
       current_player: int, the player whose turn it is.
       legal_actions: `np.array`, actions which the player can currently take.
       observation: `np.array`, the most recent observation.
+      observation_indices: `np.array` int16, the indices of the nonzero entries
+        of observation, see begin_episode.
 
     Returns:
       A legal, int-valued action.
     """
     self._train_step()
 
-    self.action = self._select_action(observation, legal_actions)
+    action = self._select_action(observation, legal_actions)
+    self.action = action
     self._record_transition(current_player, reward, observation, legal_actions,
-                            self.action)
-    return self.action
+                            action, observation_indices=observation_indices)
+    return action
 
   def end_episode(self, final_rewards):
     """Signals the end of the episode to the agent.
@@ -332,7 +397,8 @@ class DQNAgent(object):
     self._post_transitions(terminal_rewards=final_rewards)
 
   def _record_transition(self, current_player, reward, observation,
-                         legal_actions, action, begin=False):
+                         legal_actions, action, begin=False,
+                         observation_indices=None):
     """Records the most recent transition data.
 
     Specifically, the data consists of (r_t, o_{t+1}, l_{t+1}, a_{t+1}), where
@@ -348,9 +414,23 @@ class DQNAgent(object):
       legal_actions: `np.array`, legal actions from this state.
       action: int, the selected action.
       begin: bool, if True, this is the beginning of an episode.
+      observation_indices: `np.array` int16, the indices of the nonzero entries
+        of observation, recorded instead of it when sparse_capacity is set.
+
+    Raises:
+      ValueError: if sparse_capacity is set and observation_indices is not
+        given.
     """
+    if self.sparse_capacity is None:
+      observation = np.array(observation, dtype=self.observation_dtype,
+                             copy=True)
+    elif observation_indices is None:
+      raise ValueError('The replay memory is sparse, observation_indices '
+                       'must be given.')
+    else:
+      observation = np.array(observation_indices, dtype=np.int16, copy=True)
     self.transitions[current_player].append(
-        Transition(reward, np.array(observation, dtype=np.uint8, copy=True),
+        Transition(reward, observation,
                    np.array(legal_actions, dtype=np.float32, copy=True),
                    action, begin))
 
@@ -382,6 +462,46 @@ class DQNAgent(object):
       # buffer.
       self.transitions[player] = []
 
+  def _epsilon(self):
+    """Returns the exploration rate for the current mode and training step."""
+    if self.eval_mode:
+      return self.epsilon_eval
+    return self.epsilon_fn(self.epsilon_decay_period, self.training_steps,
+                           self.min_replay_history, self.epsilon_train)
+
+  @instrumentation.timed('agent.select_actions')
+  def select_actions(self, observations, legal_actions):
+    """Selects an action for each row of a batch, with one forward pass.
+
+    Uses the same epsilon-greedy policy as _select_action, but neither trains
+    nor records transitions, so it is meant for callers that serve actions to
+    many environments at once (see inference_server.py).
+
+    Args:
+      observations: `np.array`, one observation per row.
+      legal_actions: `np.array`, one row per observation describing legal
+        actions, with -inf meaning not legal.
+
+    Returns:
+      actions: `np.array` of int, one legal action per row.
+    """
+    observations = np.asarray(observations)
+    legal_actions = np.asarray(legal_actions, dtype=np.float32)
+    batch_size = len(observations)
+    actions = np.empty(batch_size, dtype=np.int64)
+
+    explore = np.random.random(batch_size) <= self._epsilon()
+    greedy = np.logical_not(explore)
+    if greedy.any():
+      actions[greedy] = self._sess.run(
+          self._batch_q_argmax,
+          {self.batch_state_ph: observations[greedy][:, :, None],
+           self.batch_legal_actions_ph: legal_actions[greedy]})
+    for row in np.flatnonzero(explore):
+      actions[row] = np.random.choice(np.flatnonzero(legal_actions[row] == 0.0))
+    return actions
+
+  @instrumentation.timed('agent.select_action')
   def _select_action(self, observation, legal_actions):
     """Select an action from the set of allowed actions.
 
@@ -396,13 +516,10 @@ class DQNAgent(object):
     Returns:
       action: int, a legal action.
     """
-    if self.eval_mode:
-      epsilon = self.epsilon_eval
-    else:
-      epsilon = self.epsilon_fn(self.epsilon_decay_period, self.training_steps,
-                                self.min_replay_history, self.epsilon_train)
-
-    if random.random() <= epsilon:
+    if self.inference_server is not None:
+      # Same policy, in a batch with the other threads' requests.
+      return self.inference_server.select_action(observation, legal_actions)
+    if random.random() <= self._epsilon():
       # Choose a random action with probability epsilon.
       legal_action_indices = np.where(legal_actions == 0.0)
       return np.random.choice(legal_action_indices[0])
@@ -417,6 +534,7 @@ class DQNAgent(object):
       assert legal_actions[action] == 0.0, 'Expected legal action.'
       return action
 
+  @instrumentation.timed('agent.train_step')
   def _train_step(self):
     """Runs a single training step.
 
@@ -458,7 +576,12 @@ class DQNAgent(object):
       is_terminal: bool, indicating if the current state is a terminal state.
       legal_actions: Legal actions from the current state.
     """
-    if not self.eval_mode:
+    if self.eval_mode:
+      return
+    if self.transition_sink is not None:
+      self.transition_sink(observation, action, reward, is_terminal,
+                           legal_actions)
+    else:
       self._sess.run(
           self._replay.add_transition_op, {
               self._replay.add_obs_ph: observation,
@@ -468,6 +591,54 @@ class DQNAgent(object):
               self._replay.add_legal_actions_ph: legal_actions
           })
 
+  def add_transitions(self, observations, actions, rewards, terminals,
+                      legal_actions):
+    """Adds a batch of externally generated transitions to the replay memory.
+
+    The transitions must be ordered as _post_transitions would store them,
+    i.e. each player's episode stored consecutively.
+
+    Args:
+      observations: `np.array`, one observation per row.
+      actions: `np.array`, the actions taken.
+      rewards: `np.array`, the rewards.
+      terminals: `np.array`, whether each transition ends the episode.
+      legal_actions: `np.array`, legal actions of each transition, one row each.
+    """
+    for transition in zip(observations, actions, rewards, terminals,
+                          legal_actions):
+      self._replay.add(*transition)
+
+  def train(self, num_steps):
+    """Advances the training schedule without acting in the environment.
+
+    Each step is equivalent to the training step that begin_episode and step
+    run before selecting an action, so a learner that calls train once per
+    transition received reproduces the update schedule of a single process.
+
+    Args:
+      num_steps: int, number of training steps to run.
+    """
+    for _ in range(num_steps):
+      self._train_step()
+
+  def _online_variables(self):
+    """Returns the trainable variables of the online network."""
+    return tf.get_collection(tf.GraphKeys.TRAINABLE_VARIABLES, scope='Online')
+
+  def get_weights(self):
+    """Returns the online network weights as a list of `np.array`."""
+    return self._sess.run(self._online_variables())
+
+  def set_weights(self, weights):
+    """Loads online network weights as returned by get_weights.
+
+    Args:
+      weights: list of `np.array`, one per online network variable.
+    """
+    for variable, value in zip(self._online_variables(), weights):
+      variable.load(value, self._sess)
+
   def bundle_and_checkpoint(self, checkpoint_dir, iteration_number):
     """Returns a self-contained bundle of the agent's state.
 
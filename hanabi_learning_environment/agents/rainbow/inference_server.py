@@ -0,0 +1,197 @@
+# coding=utf-8
+# Copyright 2018 The Dopamine Authors and Google LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Batched action selection for many concurrent environments.
+
+The server gathers action requests submitted from any number of threads,
+waits until it has max_batch_size requests or max_wait_time has elapsed since
+the first one, and answers all of them with a single call to
+DQNAgent.select_actions. Each request carries its own legal action mask.
+
+Example:
+
+  server = InferenceServer(agent)
+  server.start()
+  # From each environment thread:
+  action = server.select_action(observation_vector, legal_moves)
+  ...
+  server.stop()
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+import time
+
+import gin
+import numpy as np
+
+try:
+  import queue  # pylint: disable=g-import-not-at-top
+except ImportError:
+  import Queue as queue  # pylint: disable=g-import-not-at-top
+
+
+class _Request(object):
+  """A pending action request."""
+
+  def __init__(self, observation, legal_actions):
+    self.observation = observation
+    self.legal_actions = legal_actions
+    self.action = None
+    self.error = None
+    self._done = threading.Event()
+
+  def set_result(self, action=None, error=None):
+    self.action = action
+    self.error = error
+    self._done.set()
+
+  def result(self):
+    """Blocks until the request is served and returns the action."""
+    self._done.wait()
+    if self.error is not None:
+      raise self.error
+    return self.action
+
+
+@gin.configurable
+class InferenceServer(object):
+  """Serves batched action selection requests for an agent."""
+
+  def __init__(self, agent, max_batch_size=64, max_wait_time=0.001):
+    """Initializes the server. Requests are only served after start().
+
+    Args:
+      agent: a `DQNAgent` (or subclass) providing select_actions.
+      max_batch_size: int, maximum number of requests per forward pass.
+      max_wait_time: float, maximum number of seconds to wait for more
+        requests once the first request of a batch has arrived.
+    """
+    self._agent = agent
+    self._max_batch_size = max_batch_size
+    self._max_wait_time = max_wait_time
+    self._requests = queue.Queue()
+    # Held to queue requests, so that none is queued after the stop sentinel.
+    self._lock = threading.Lock()
+    self._thread = None
+    self._running = False
+    self._stopped = False
+    self.num_batches = 0
+    self.num_requests = 0
+
+  def start(self):
+    """Starts the serving thread."""
+    self._running = True
+    self._stopped = False
+    self._thread = threading.Thread(target=self._serve)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def stop(self):
+    """Stops the serving thread once the pending requests are served.
+
+    Requests submitted afterwards are rejected, until the next start().
+    """
+    with self._lock:
+      self._running = False
+      self._stopped = True
+      self._requests.put(None)
+    self._thread.join()
+    self._thread = None
+
+  def submit(self, observation, legal_actions):
+    """Queues an action request without waiting for it.
+
+    Args:
+      observation: `np.array`, the current observation.
+      legal_actions: `np.array`, legal actions, with -inf meaning not legal.
+
+    Returns:
+      A request whose result() method returns the selected action.
+
+    Raises:
+      ValueError: if the server is stopped.
+    """
+    request = _Request(observation, legal_actions)
+    with self._lock:
+      if self._stopped:
+        raise ValueError("The inference server is stopped.")
+      self._requests.put(request)
+    return request
+
+  def select_action(self, observation, legal_actions):
+    """Returns an action for the observation, blocking until it is served.
+
+    Args:
+      observation: `np.array`, the current observation.
+      legal_actions: `np.array`, legal actions, with -inf meaning not legal.
+
+    Returns:
+      action: int, a legal action.
+
+    Raises:
+      ValueError: if the server is stopped.
+    """
+    return self.submit(observation, legal_actions).result()
+
+  @property
+  def mean_batch_size(self):
+    """Returns the average number of requests served per forward pass."""
+    return self.num_requests / max(self.num_batches, 1)
+
+  def _next_batch(self):
+    """Blocks for the first request, then gathers more until full or late."""
+    first = self._requests.get()
+    if first is None:
+      return []
+    batch = [first]
+    deadline = time.time() + self._max_wait_time
+    while len(batch) < self._max_batch_size:
+      timeout = deadline - time.time()
+      try:
+        request = (self._requests.get(timeout=timeout) if timeout > 0
+                   else self._requests.get_nowait())
+      except queue.Empty:
+        break
+      if request is None:
+        # Stop requested; serve what we have and leave the sentinel for the
+        # main loop.
+        self._requests.put(None)
+        break
+      batch.append(request)
+    return batch
+
+  def _serve(self):
+    """Serving loop, run by the server thread."""
+    while True:
+      batch = self._next_batch()
+      if not batch:
+        if not self._running:
+          return
+        continue
+      try:
+        actions = self._agent.select_actions(
+            np.stack([request.observation for request in batch]),
+            np.stack([request.legal_actions for request in batch]))
+      except Exception as error:  # pylint: disable=broad-except
+        for request in batch:
+          request.set_result(error=error)
+      else:
+        for request, action in zip(batch, actions):
+          request.set_result(action=action)
+      self.num_batches += 1
+      self.num_requests += len(batch)
@@ -30,10 +30,12 @@ from __future__ import division
 from __future__ import print_function
 
 from third_party.dopamine import sum_tree
-import gin.tf
+import gin
+from hanabi_learning_environment import lazy_import
 import numpy as np
 import replay_memory
-import tensorflow as tf
+
+tf = lazy_import.LazyModule('tensorflow')
 
 DEFAULT_PRIORITY = 100.0
 
@@ -45,7 +47,8 @@ class OutOfGraphPrioritizedReplayMemory(replay_memory.OutOfGraphReplayMemory):
   """
 
   def __init__(self, num_actions, observation_size, stack_size, replay_capacity,
-               batch_size, update_horizon=1, gamma=1.0):
+               batch_size, update_horizon=1, gamma=1.0,
+               observation_dtype=np.uint8, sparse_capacity=None):
     """This data structure does the heavy lifting in the replay memory.
 
     Args:
@@ -56,12 +59,15 @@ class OutOfGraphPrioritizedReplayMemory(replay_memory.OutOfGraphReplayMemory):
       batch_size: int, batch size.
       update_horizon: int, length of update ('n' in n-step update).
       gamma: int, the discount factor.
+      observation_dtype: numpy dtype of the observations.
+      sparse_capacity: int or None, see OutOfGraphReplayMemory.
     """
     super(OutOfGraphPrioritizedReplayMemory, self).__init__(
         num_actions=num_actions,
         observation_size=observation_size, stack_size=stack_size,
         replay_capacity=replay_capacity, batch_size=batch_size,
-        update_horizon=update_horizon, gamma=gamma)
+        update_horizon=update_horizon, gamma=gamma,
+        observation_dtype=observation_dtype, sparse_capacity=sparse_capacity)
 
     self.sum_tree = sum_tree.SumTree(replay_capacity)
 
@@ -211,7 +217,11 @@ class WrappedPrioritizedReplayMemory(replay_memory.WrappedReplayMemory):
                replay_capacity=1000000,
                batch_size=32,
                update_horizon=1,
-               gamma=1.0):
+               gamma=1.0,
+               use_async_sampling=False,
+               prefetch_queue_size=4,
+               observation_dtype=np.uint8,
+               sparse_capacity=None):
     """Initializes a graph wrapper for the python Replay Memory.
 
     Args:
@@ -224,6 +234,12 @@ class WrappedPrioritizedReplayMemory(replay_memory.WrappedReplayMemory):
       batch_size: int.
       update_horizon: int, length of update ('n' in n-step update).
       gamma: int, the discount factor.
+      use_async_sampling: bool, when True batches are sampled by a background
+        thread, and priority updates are applied asynchronously by that thread.
+      prefetch_queue_size: int, number of batches the background thread keeps
+        ready when use_async_sampling is True.
+      observation_dtype: numpy dtype of the observations.
+      sparse_capacity: int or None, see OutOfGraphReplayMemory.
 
     Raises:
       ValueError: If update_horizon is not positive.
@@ -232,11 +248,26 @@ class WrappedPrioritizedReplayMemory(replay_memory.WrappedReplayMemory):
     memory = OutOfGraphPrioritizedReplayMemory(num_actions, observation_size,
                                                stack_size, replay_capacity,
                                                batch_size, update_horizon,
-                                               gamma)
+                                               gamma, observation_dtype,
+                                               sparse_capacity)
     super(WrappedPrioritizedReplayMemory, self).__init__(
         num_actions,
         observation_size, stack_size, use_staging, replay_capacity, batch_size,
-        update_horizon, gamma, wrapped_memory=memory)
+        update_horizon, gamma, wrapped_memory=memory,
+        use_async_sampling=use_async_sampling,
+        prefetch_queue_size=prefetch_queue_size,
+        observation_dtype=observation_dtype,
+        sparse_capacity=sparse_capacity)
+
+  def _set_priority(self, indices, priorities):
+    if self._sampler is not None:
+      self._sampler.set_priority(indices, priorities)
+    else:
+      self.memory.set_priority(indices, priorities)
+
+  def _get_priority(self, indices):
+    with self._lock:
+      return self.memory.get_priority(indices)
 
   def tf_set_priority(self, indices, losses):
     """Sets the priorities for the given indices.
@@ -250,7 +281,7 @@ class WrappedPrioritizedReplayMemory(replay_memory.WrappedReplayMemory):
        Replay.
     """
     return tf.py_func(
-        self.memory.set_priority, [indices, losses],
+        self._set_priority, [indices, losses],
         [],
         name='prioritized_replay_set_priority_py_func')
 
@@ -264,6 +295,6 @@ class WrappedPrioritizedReplayMemory(replay_memory.WrappedReplayMemory):
        A tensor (float32) of priorities.
     """
     return tf.py_func(
-        self.memory.get_priority, [indices],
+        self._get_priority, [indices],
         [tf.float32],
         name='prioritized_replay_get_priority_py_func')
@@ -27,13 +27,14 @@ from __future__ import print_function
 import functools
 
 import dqn_agent
-import gin.tf
+import gin
+from hanabi_learning_environment import lazy_import
 import numpy as np
 import prioritized_replay_memory
-import tensorflow as tf
 
 
-slim = tf.contrib.slim
+tf = lazy_import.LazyModule('tensorflow')
+slim = lazy_import.LazyModule('tensorflow.contrib.slim')
 
 
 @gin.configurable
@@ -92,7 +93,9 @@ class RainbowAgent(dqn_agent.DQNAgent):
                epsilon_decay_period=1000,
                learning_rate=0.000025,
                optimizer_epsilon=0.00003125,
-               tf_device='/cpu:*'):
+               tf_device='/cpu:*',
+               observation_dtype=np.uint8,
+               sparse_capacity=None):
     """Initializes the agent and constructs its graph.
 
     Args:
@@ -113,6 +116,8 @@ class RainbowAgent(dqn_agent.DQNAgent):
       learning_rate: float, learning rate for the optimizer.
       optimizer_epsilon: float, epsilon for Adam optimizer.
       tf_device: str, Tensorflow device on which to run computations.
+      observation_dtype: numpy dtype of the observations.
+      sparse_capacity: int or None, see DQNAgent.
     """
     # We need this because some tools convert round floats into ints.
     vmax = float(vmax)
@@ -137,7 +142,9 @@ class RainbowAgent(dqn_agent.DQNAgent):
         epsilon_eval=epsilon_eval,
         epsilon_decay_period=epsilon_decay_period,
         graph_template=graph_template,
-        tf_device=tf_device)
+        tf_device=tf_device,
+        observation_dtype=observation_dtype,
+        sparse_capacity=sparse_capacity)
     tf.logging.info('\t learning_rate: %f', learning_rate)
     tf.logging.info('\t optimizer_epsilon: %f', optimizer_epsilon)
 
@@ -158,7 +165,9 @@ class RainbowAgent(dqn_agent.DQNAgent):
         stack_size=1,
         use_staging=use_staging,
         update_horizon=self.update_horizon,
-        gamma=self.gamma)
+        gamma=self.gamma,
+        observation_dtype=self.observation_dtype,
+        sparse_capacity=self.sparse_capacity)
 
   def _reshape_networks(self):
     # self._q is actually logits now, rename things.
@@ -178,6 +187,21 @@ class RainbowAgent(dqn_agent.DQNAgent):
     del self._replay_qs
     del self._replay_next_qt
 
+  def _build_batch_q_argmax(self, online_convnet):
+    """Builds an op selecting the greedy legal action for a batch of states.
+
+    Args:
+      online_convnet: the online network template.
+
+    Returns:
+      An op returning one action per row of batch_state_ph.
+    """
+    batch_logits = online_convnet(state=self.batch_state_ph,
+                                  num_actions=self.num_actions)
+    batch_q = tf.reduce_sum(
+        self.support * tf.contrib.layers.softmax(batch_logits), axis=2)
+    return tf.argmax(batch_q + self.batch_legal_actions_ph, axis=1)
+
   def _build_target_distribution(self):
     self._reshape_networks()
     batch_size = tf.shape(self._replay.rewards)[0]
@@ -35,10 +35,19 @@ import gzip
 import math
 import os
 import pickle
+import threading
 
-import gin.tf
+import gin
+from hanabi_learning_environment import instrumentation
+from hanabi_learning_environment import lazy_import
 import numpy as np
-import tensorflow as tf
+
+tf = lazy_import.LazyModule('tensorflow')
+
+try:
+  import queue  # pylint: disable=g-import-not-at-top
+except ImportError:
+  import Queue as queue  # pylint: disable=g-import-not-at-top
 
 
 # This constant determines how many iterations a checkpoint is kept for.
@@ -82,7 +91,8 @@ class OutOfGraphReplayMemory(object):
   """
 
   def __init__(self, num_actions, observation_size, stack_size, replay_capacity,
-               batch_size, update_horizon=1, gamma=1.0):
+               batch_size, update_horizon=1, gamma=1.0,
+               observation_dtype=np.uint8, sparse_capacity=None):
     """Data structure doing the heavy lifting.
 
     Args:
@@ -93,8 +103,24 @@ class OutOfGraphReplayMemory(object):
       batch_size: int, batch size.
       update_horizon: int, length of update ('n' in n-step update).
       gamma: float, the discount factor.
+      observation_dtype: numpy dtype of the observations, uint8 for binary
+        encodings, float32 for belief encodings.
+      sparse_capacity: int or None. If set, binary observations are stored as
+        the indices of their nonzero entries, and densified when sampled. The
+        observations added are then int16 arrays of sparse_capacity indices,
+        padded with -1, as ObservationStacker.get_observation_indices returns
+        them.
+
+    Raises:
+      ValueError: if sparse_capacity is set for a non-binary observation_dtype.
     """
+    if (sparse_capacity is not None and
+        np.dtype(observation_dtype) not in (np.uint8, np.bool_)):
+      raise ValueError('Sparse observations are binary, got dtype {}.'.format(
+          np.dtype(observation_dtype)))
     self._observation_size = observation_size
+    self._observation_dtype = observation_dtype
+    self._sparse_capacity = sparse_capacity
     self._num_actions = num_actions
     self._replay_capacity = replay_capacity
     self._batch_size = batch_size
@@ -109,8 +135,13 @@ class OutOfGraphReplayMemory(object):
         dtype=np.float32)
 
     # Create numpy arrays used to store sampled transitions.
-    self.observations = np.empty(
-        (replay_capacity, observation_size), dtype=np.uint8)
+    if sparse_capacity is None:
+      self.observations = np.empty(
+          (replay_capacity, observation_size), dtype=observation_dtype)
+    else:
+      assert observation_size <= np.iinfo(np.int16).max + 1
+      self.observations = np.full(
+          (replay_capacity, sparse_capacity), -1, dtype=np.int16)
     self.actions = np.empty((replay_capacity), dtype=np.int32)
     self.rewards = np.empty((replay_capacity), dtype=np.float32)
     self.terminals = np.empty((replay_capacity), dtype=np.uint8)
@@ -121,6 +152,10 @@ class OutOfGraphReplayMemory(object):
 
     self.invalid_range = np.zeros((self._stack_size))
 
+    # Bookkeeping for incremental checkpoints, see save().
+    self._last_checkpoint_add_count = 0
+    self._checkpoint_chunks = []
+
   def add(self, observation, action, reward, terminal, legal_actions):
     """Adds a transition to the replay memory.
 
@@ -130,7 +165,8 @@ class OutOfGraphReplayMemory(object):
     If the replay memory is at capacity the oldest transition will be discarded.
 
     Args:
-      observation: `np.array` uint8, (observation_size).
+      observation: `np.array` uint8, (observation_size), or int16,
+        (sparse_capacity) for a sparse memory.
       action: uint8, indicating the action in the transition.
       reward: float, indicating the reward received in the transition.
       terminal: uint8, acting as a boolean indicating whether the transition
@@ -138,7 +174,10 @@ class OutOfGraphReplayMemory(object):
       legal_actions: Binary vector indicating legal actions (1 == legal).
     """
     if self.is_empty() or self.terminals[self.cursor() - 1] == 1:
-      dummy_observation = np.zeros((self._observation_size))
+      if self._sparse_capacity is None:
+        dummy_observation = np.zeros((self._observation_size))
+      else:
+        dummy_observation = np.full((self._sparse_capacity), -1, np.int16)
       dummy_legal_actions = np.zeros((self._num_actions))
       for _ in range(self._stack_size - 1):
         self._add(dummy_observation, 0, 0, 0, dummy_legal_actions)
@@ -193,8 +232,15 @@ class OutOfGraphReplayMemory(object):
     return stack
 
   def get_observation_stack(self, index):
-    state = self.get_stack(self.observations, index)
-    return np.transpose(state, [1, 0])
+    if self._sparse_capacity is None:
+      state = self.get_stack(self.observations, index)
+      return np.transpose(state, [1, 0])
+    indices = self.get_stack(self.observations, index)
+    state = np.zeros((self._observation_size, self._stack_size),
+                     dtype=self._observation_dtype)
+    for frame in range(self._stack_size):
+      state[indices[frame][indices[frame] >= 0], frame] = 1
+    return state
 
   def get_terminal_stack(self, index):
     return self.get_stack(self.terminals, index)
@@ -237,9 +283,11 @@ class OutOfGraphReplayMemory(object):
 
   def reset_state_batch_arrays(self, batch_size):
     self._next_state_batch = np.empty(
-        (batch_size, self._observation_size, self._stack_size), dtype=np.uint8)
+        (batch_size, self._observation_size, self._stack_size),
+        dtype=self._observation_dtype)
     self._state_batch = np.empty(
-        (batch_size, self._observation_size, self._stack_size), dtype=np.uint8)
+        (batch_size, self._observation_size, self._stack_size),
+        dtype=self._observation_dtype)
 
   def sample_index_batch(self, batch_size):
     """Returns a batch of valid indices.
@@ -270,6 +318,7 @@ class OutOfGraphReplayMemory(object):
                       (MAX_SAMPLE_ATTEMPTS, len(indices)))
     return indices
 
+  @instrumentation.timed('replay.sample_transition_batch')
   def sample_transition_batch(self, batch_size=None, indices=None):
     """Returns a batch of transitions.
 
@@ -350,10 +399,45 @@ class OutOfGraphReplayMemory(object):
   def _generate_filename(self, checkpoint_dir, name, suffix):
     return os.path.join(checkpoint_dir, '{}_ckpt.{}.gz'.format(name, suffix))
 
+  def _slot_attributes(self):
+    """Returns the public arrays holding one entry per replay memory slot."""
+    return sorted(
+        attr for attr, value in self.__dict__.items()
+        if not attr.startswith('_') and isinstance(value, np.ndarray) and
+        value.ndim > 0 and value.shape[0] == self._replay_capacity)
+
+  def _write_chunk(self, filename, start, end):
+    """Writes the slots added between add counts start and end to a file."""
+    positions = np.arange(start, end) % self._replay_capacity
+    with tf.gfile.Open(filename, 'wb') as f:
+      with gzip.GzipFile(fileobj=f) as outfile:
+        for attr in self._slot_attributes():
+          np.save(outfile, self.__dict__[attr][positions], allow_pickle=False)
+
+  def _read_chunk(self, filename, start, end):
+    """Reads back a chunk written by _write_chunk into the memory."""
+    positions = np.arange(start, end) % self._replay_capacity
+    with tf.gfile.Open(filename, 'rb') as f:
+      with gzip.GzipFile(fileobj=f) as infile:
+        for attr in self._slot_attributes():
+          self.__dict__[attr][positions] = np.load(infile, allow_pickle=False)
+
+  def _read_manifest(self, checkpoint_dir, suffix):
+    filename = self._generate_filename(checkpoint_dir, 'replay_manifest',
+                                       suffix)
+    with tf.gfile.Open(filename, 'rb') as f:
+      with gzip.GzipFile(fileobj=f) as infile:
+        return pickle.load(infile)
+
   def save(self, checkpoint_dir, iteration_number):
-    """Save the python replay memory attributes into a file.
+    """Save the python replay memory attributes incrementally.
 
-    This method will save all the replay memory's state in a single file.
+    Only the slots added since the previous call are written, as one
+    append-only chunk file. A manifest lists, in order, the chunks needed to
+    rebuild the memory, together with the attributes that are not per-slot
+    arrays (e.g. add_count). Chunks that have been entirely overwritten in the
+    circular buffer are dropped from the manifest and deleted once no
+    checkpoint still in use references them.
 
     Args:
       checkpoint_dir: str, directory where numpy checkpoint files should be
@@ -363,33 +447,100 @@ class OutOfGraphReplayMemory(object):
     """
     if not tf.gfile.Exists(checkpoint_dir):
       return
-    for attr in self.__dict__:
-      if not attr.startswith('_'):
-        filename = self._generate_filename(checkpoint_dir, attr,
-                                           iteration_number)
-        with tf.gfile.Open(filename, 'wb') as f:
-          with gzip.GzipFile(fileobj=f) as outfile:
-            # Checkpoint numpy arrays directly with np.save to avoid excessive
-            # memory usage. This is particularly important for the observations
-            # data.
-            if isinstance(self.__dict__[attr], np.ndarray):
-              np.save(outfile, self.__dict__[attr], allow_pickle=False)
-            else:
-              pickle.dump(self.__dict__[attr], outfile)
-
-      # After writing a checkpoint file, we garbage collect the checkpoint file
-      # that is four versions old.
-      stale_iteration_number = iteration_number - CHECKPOINT_DURATION
-      if stale_iteration_number >= 0:
-        stale_filename = self._generate_filename(checkpoint_dir, attr,
-                                                 stale_iteration_number)
+    add_count = int(self.add_count)
+    oldest_live_count = add_count - self._replay_capacity
+    start = max(self._last_checkpoint_add_count, oldest_live_count)
+    chunks = [chunk for chunk in self._checkpoint_chunks
+              if chunk['end'] > oldest_live_count]
+    if add_count > start:
+      filename = self._generate_filename(checkpoint_dir, 'replay_chunk',
+                                         iteration_number)
+      self._write_chunk(filename, start, add_count)
+      chunks.append({'filename': os.path.basename(filename),
+                     'start': start, 'end': add_count})
+
+    slot_attributes = self._slot_attributes()
+    manifest = {
+        'chunks': chunks,
+        'attributes': {attr: value for attr, value in self.__dict__.items()
+                       if not attr.startswith('_') and
+                       attr not in slot_attributes},
+    }
+    # The manifest is written last, so that it never references a missing
+    # chunk.
+    filename = self._generate_filename(checkpoint_dir, 'replay_manifest',
+                                       iteration_number)
+    with tf.gfile.Open(filename, 'wb') as f:
+      with gzip.GzipFile(fileobj=f) as outfile:
+        pickle.dump(manifest, outfile)
+    self._last_checkpoint_add_count = add_count
+    self._checkpoint_chunks = chunks
+
+    # Garbage collect the manifest that is four versions old, and the chunks
+    # that only it referenced.
+    stale_iteration_number = iteration_number - CHECKPOINT_DURATION
+    if stale_iteration_number >= 0:
+      try:
+        stale_chunks = self._read_manifest(checkpoint_dir,
+                                           stale_iteration_number)['chunks']
+      except tf.errors.NotFoundError:
+        return
+      live_files = set()
+      for suffix in range(stale_iteration_number + 1, iteration_number + 1):
+        try:
+          live_files.update(chunk['filename'] for chunk in
+                            self._read_manifest(checkpoint_dir,
+                                                suffix)['chunks'])
+        except tf.errors.NotFoundError:
+          pass
+      stale_files = [self._generate_filename(checkpoint_dir, 'replay_manifest',
+                                             stale_iteration_number)]
+      stale_files.extend(os.path.join(checkpoint_dir, chunk['filename'])
+                         for chunk in stale_chunks
+                         if chunk['filename'] not in live_files)
+      for stale_filename in stale_files:
         try:
           tf.gfile.Remove(stale_filename)
         except tf.errors.NotFoundError:
           pass
 
   def load(self, checkpoint_dir, suffix):
-    """Restores the object from bundle_dictionary and numpy checkpoints.
+    """Restores the object from an incremental checkpoint.
+
+    Chunks are streamed back one at a time, in the order they were written.
+    Checkpoints written in the previous format, with one file per attribute,
+    are still supported.
+
+    Args:
+      checkpoint_dir: str, directory where to read the numpy checkpointed files
+        from.
+      suffix: str, suffix to use in numpy checkpoint files.
+
+    Raises:
+      NotFoundError: if all expected files are not found in directory.
+    """
+    manifest_filename = self._generate_filename(checkpoint_dir,
+                                                'replay_manifest', suffix)
+    if not tf.gfile.Exists(manifest_filename):
+      self._load_per_attribute_files(checkpoint_dir, suffix)
+      return
+    manifest = self._read_manifest(checkpoint_dir, suffix)
+    # Make sure all the chunks are available to avoid loading a partially
+    # restored (i.e. corrupted) replay buffer.
+    for chunk in manifest['chunks']:
+      filename = os.path.join(checkpoint_dir, chunk['filename'])
+      if not tf.gfile.Exists(filename):
+        raise tf.errors.NotFoundError(None, None,
+                                      'Missing file: {}'.format(filename))
+    for chunk in manifest['chunks']:
+      self._read_chunk(os.path.join(checkpoint_dir, chunk['filename']),
+                       chunk['start'], chunk['end'])
+    self.__dict__.update(manifest['attributes'])
+    self._last_checkpoint_add_count = int(self.add_count)
+    self._checkpoint_chunks = manifest['chunks']
+
+  def _load_per_attribute_files(self, checkpoint_dir, suffix):
+    """Restores a checkpoint with one gzipped file per public attribute.
 
     Args:
       checkpoint_dir: str, directory where to read the numpy checkpointed files
@@ -420,6 +571,134 @@ class OutOfGraphReplayMemory(object):
             self.__dict__[attr] = np.load(infile, allow_pickle=False)
           else:
             self.__dict__[attr] = pickle.load(infile)
+    # The next checkpoint has to contain the whole buffer.
+    self._last_checkpoint_add_count = 0
+    self._checkpoint_chunks = []
+
+
+def _drain_queue(q):
+  """Removes every item of a queue."""
+  while True:
+    try:
+      q.get_nowait()
+    except queue.Empty:
+      return
+
+
+class _SamplingError(object):
+  """Exception raised by the sampling thread, passed to next_batch."""
+
+  def __init__(self, error):
+    self.error = error
+
+
+class PrefetchingSampler(object):
+  """Samples transition batches from a replay memory on a background thread.
+
+  The thread keeps a bounded queue of ready minibatches, so the train op only
+  waits for sampling when the queue is empty. Writes to the memory (adds and
+  priority updates) go through this object: adds take the memory lock, while
+  priority updates are queued and applied by the sampling thread between two
+  batches. The thread starts with the first call to next_batch, i.e. once the
+  agent has collected enough transitions to train.
+
+  If sampling raises, the thread stops and next_batch raises the exception;
+  the next call to next_batch starts a new thread. stop() must be called
+  before the memory is replaced, e.g. loaded from a checkpoint.
+  """
+
+  def __init__(self, memory, lock, queue_size=4):
+    """Initializes the sampler.
+
+    Args:
+      memory: `OutOfGraphReplayMemory`, the memory to sample from.
+      lock: `threading.Lock` guarding all accesses to memory.
+      queue_size: int, maximum number of prefetched batches.
+    """
+    self._memory = memory
+    self._lock = lock
+    self._batches = queue.Queue(maxsize=queue_size)
+    self._priority_updates = queue.Queue()
+    self._thread = None
+    self._stop_event = threading.Event()
+
+  @instrumentation.timed('replay.wait_batch')
+  def next_batch(self):
+    """Returns the next prefetched batch, blocking if none is ready.
+
+    Raises:
+      The exception raised by the memory while sampling the batch.
+    """
+    if self._thread is None:
+      self._stop_event.clear()
+      self._thread = threading.Thread(target=self._run)
+      self._thread.daemon = True
+      self._thread.start()
+    batch = self._batches.get()
+    if isinstance(batch, _SamplingError):
+      self._thread.join()
+      self._thread = None
+      raise batch.error
+    return batch
+
+  def stop(self):
+    """Stops the thread, and drops the prefetched batches.
+
+    Pending priority updates are dropped too, as they refer to the current
+    contents of the memory. Must not be called with the memory lock held.
+    """
+    if self._thread is None:
+      return
+    self._stop_event.set()
+    # Unblock the thread if it waits on a full queue.
+    _drain_queue(self._batches)
+    self._thread.join()
+    self._thread = None
+    _drain_queue(self._batches)
+    _drain_queue(self._priority_updates)
+
+  def set_priority(self, indices, priorities):
+    """Queues a priority update, applied before the next batch is sampled.
+
+    Args:
+      indices: `np.array` of indices in range [0, replay_capacity).
+      priorities: list of floats, the corresponding priorities.
+    """
+    self._priority_updates.put((np.copy(indices), np.copy(priorities)))
+
+  def _apply_priority_updates(self):
+    while True:
+      try:
+        indices, priorities = self._priority_updates.get_nowait()
+      except queue.Empty:
+        return
+      with self._lock:
+        self._memory.set_priority(indices, priorities)
+
+  def _put(self, item):
+    """Queues an item, unless the sampler is stopped while waiting."""
+    while not self._stop_event.is_set():
+      try:
+        self._batches.put(item, timeout=0.1)
+        return
+      except queue.Full:
+        pass
+
+  def _run(self):
+    """Sampling loop, run by the background thread."""
+    while not self._stop_event.is_set():
+      try:
+        self._apply_priority_updates()
+        with self._lock:
+          # The memory reuses its state batch arrays, so the batch is copied
+          # before it leaves the lock.
+          batch = tuple(np.copy(array)
+                        for array in self._memory.sample_transition_batch())
+      except Exception as error:  # pylint: disable=broad-except
+        # Raised by next_batch in the training thread.
+        self._put(_SamplingError(error))
+        return
+      self._put(batch)
 
 
 @gin.configurable(blacklist=['observation_size', 'stack_size'])
@@ -457,7 +736,11 @@ class WrappedReplayMemory(object):
                batch_size=32,
                update_horizon=1,
                gamma=1.0,
-               wrapped_memory=None):
+               wrapped_memory=None,
+               use_async_sampling=False,
+               prefetch_queue_size=4,
+               observation_dtype=np.uint8,
+               sparse_capacity=None):
     """Initializes a graph wrapper for the python replay memory.
 
     Args:
@@ -472,6 +755,14 @@ class WrappedReplayMemory(object):
       gamma: int, the discount factor.
       wrapped_memory: The 'inner' memory data structure. Defaults to None, which
         creates the standard DQN replay memory.
+      use_async_sampling: bool, when True batches are sampled by a background
+        thread (see `PrefetchingSampler`) instead of inside the sample op.
+      prefetch_queue_size: int, number of batches the background thread keeps
+        ready when use_async_sampling is True.
+      observation_dtype: numpy dtype of the observations. Ignored when
+        wrapped_memory is given, which must store observations of this dtype.
+      sparse_capacity: int or None, see OutOfGraphReplayMemory. When
+        wrapped_memory is given, it must have the same sparse_capacity.
 
     Raises:
       ValueError: If update_horizon is not positive.
@@ -492,12 +783,28 @@ class WrappedReplayMemory(object):
     else:
       self.memory = OutOfGraphReplayMemory(
           num_actions, observation_size, stack_size,
-          replay_capacity, batch_size, update_horizon, gamma)
+          replay_capacity, batch_size, update_horizon, gamma,
+          observation_dtype=observation_dtype,
+          sparse_capacity=sparse_capacity)
+    obs_dtype = tf.as_dtype(observation_dtype)
+
+    self._lock = threading.Lock()
+    self._sampler = None
+    if use_async_sampling:
+      self._sampler = PrefetchingSampler(self.memory, self._lock,
+                                         prefetch_queue_size)
+      sample_fn = self._sampler.next_batch
+    else:
+      sample_fn = self.memory.sample_transition_batch
 
     with tf.name_scope('replay'):
       with tf.name_scope('add_placeholders'):
-        self.add_obs_ph = tf.placeholder(
-            tf.uint8, [observation_size], name='add_obs_ph')
+        if sparse_capacity is None:
+          self.add_obs_ph = tf.placeholder(
+              obs_dtype, [observation_size], name='add_obs_ph')
+        else:
+          self.add_obs_ph = tf.placeholder(
+              tf.int16, [sparse_capacity], name='add_obs_ph')
         self.add_action_ph = tf.placeholder(tf.int32, [], name='add_action_ph')
         self.add_reward_ph = tf.placeholder(
             tf.float32, [], name='add_reward_ph')
@@ -513,11 +820,11 @@ class WrappedReplayMemory(object):
 
       with tf.device('/cpu:*'):
         self.add_transition_op = tf.py_func(
-            self.memory.add, add_transition_ph, [], name='replay_add_py_func')
+            self.add, add_transition_ph, [], name='replay_add_py_func')
 
         self.transition = tf.py_func(
-            self.memory.sample_transition_batch, [],
-            [tf.uint8, tf.int32, tf.float32, tf.uint8, tf.uint8, tf.int32,
+            sample_fn, [],
+            [obs_dtype, tf.int32, tf.float32, obs_dtype, tf.uint8, tf.int32,
              tf.float32],
             name='replay_sample_py_func')
 
@@ -538,7 +845,7 @@ class WrappedReplayMemory(object):
 
           # Create the staging area in CPU.
           prefetch_area = tf.contrib.staging.StagingArea(
-              [tf.uint8, tf.int32, tf.float32, tf.uint8, tf.uint8, tf.int32,
+              [obs_dtype, tf.int32, tf.float32, obs_dtype, tf.uint8, tf.int32,
                tf.float32])
 
           self.prefetch_batch = prefetch_area.put(
@@ -560,6 +867,23 @@ class WrappedReplayMemory(object):
       self.states.set_shape([None, observation_size, stack_size])
       self.next_states.set_shape([None, observation_size, stack_size])
 
+  def add(self, observation, action, reward, terminal, legal_actions):
+    """Adds a transition to the underlying replay memory.
+
+    Safe to call while a background sampler is running.
+
+    Args:
+      observation: `np.array` uint8, (observation_size), or int16,
+        (sparse_capacity) for a sparse memory.
+      action: uint8, indicating the action in the transition.
+      reward: float, indicating the reward received in the transition.
+      terminal: uint8, acting as a boolean indicating whether the transition
+                 was terminal (1) or not (0).
+      legal_actions: Binary vector indicating legal actions (1 == legal).
+    """
+    with self._lock:
+      self.memory.add(observation, action, reward, terminal, legal_actions)
+
   def save(self, checkpoint_dir, iteration_number):
     """Save the underlying replay memory's contents in a file.
 
@@ -569,7 +893,8 @@ class WrappedReplayMemory(object):
       iteration_number: int, iteration_number to use as a suffix in naming
         numpy checkpoint files.
     """
-    self.memory.save(checkpoint_dir, iteration_number)
+    with self._lock:
+      self.memory.save(checkpoint_dir, iteration_number)
 
   def load(self, checkpoint_dir, suffix):
     """Loads the replay memory's state from a saved file.
@@ -579,4 +904,8 @@ class WrappedReplayMemory(object):
         files.
       suffix: str, suffix to use in numpy checkpoint files.
     """
-    self.memory.load(checkpoint_dir, suffix)
+    # Batches prefetched from the previous contents would be stale.
+    if self._sampler is not None:
+      self._sampler.stop()
+    with self._lock:
+      self.memory.load(checkpoint_dir, suffix)
@@ -31,71 +31,211 @@ import time
 
 from third_party.dopamine import checkpointer
 from third_party.dopamine import iteration_statistics
+import actor_learner
 import dqn_agent
-import gin.tf
+import gin
+from hanabi_learning_environment import instrumentation
+from hanabi_learning_environment import lazy_import
+from hanabi_learning_environment import pyhanabi
 from hanabi_learning_environment import rl_env
 import numpy as np
 import rainbow_agent
-import tensorflow as tf
+
+tf = lazy_import.LazyModule('tensorflow')
 
 LENIENT_SCORE = False
 
 
 class ObservationStacker(object):
-  """Class for stacking agent observations."""
+  """Class for stacking agent observations.
+
+  Each player's history is kept in a mirrored ring buffer: every observation is
+  written twice, at the write cursor and history_size slots further on, so the
+  most recent history_size observations always form one contiguous slice. This
+  avoids the np.roll reallocation per step and lets get_observation_stack
+  return a view instead of a copy.
+
+  When num_envs is given the stacker holds one buffer per environment, with
+  layout (num_envs, num_players, 2 * history_size, observation_size), so that a
+  vectorized runner can keep all of its stacks in a single array.
+
+  Given max_active_bits, the stacker also takes sparse observations, the
+  indices of their nonzero entries, and keeps them to return stacked indices
+  for a sparse replay memory.
+  """
 
-  def __init__(self, history_size, observation_size, num_players):
+  def __init__(self, history_size, observation_size, num_players,
+               num_envs=None, dtype=np.uint8, max_active_bits=None):
     """Initializer for observation stacker.
 
     Args:
       history_size: int, number of time steps to stack.
       observation_size: int, size of observation vector on one time step.
       num_players: int, number of players.
+      num_envs: int or None, number of environments to stack observations for.
+        None means a single environment.
+      dtype: numpy dtype used to store observations. The canonical encodings
+        are binary, so uint8 is sufficient; belief encodings need float32.
+      max_active_bits: int or None, maximum number of nonzero entries of an
+        observation, if sparse observations are added.
+
+    Raises:
+      ValueError: if the indices of stacked observations do not fit in int16.
     """
+    if (max_active_bits is not None and
+        history_size * observation_size > np.iinfo(np.int16).max + 1):
+      raise ValueError('Stacked observations of size {} are too large for '
+                       'int16 indices.'.format(history_size * observation_size))
     self._history_size = history_size
     self._observation_size = observation_size
     self._num_players = num_players
-    self._obs_stacks = list()
-    for _ in range(0, self._num_players):
-      self._obs_stacks.append(np.zeros(self._observation_size *
-                                       self._history_size))
-
-  def add_observation(self, observation, current_player):
+    self._num_envs = num_envs
+    self._dtype = dtype
+    self._obs_stacks = np.zeros(
+        (num_envs or 1, num_players, 2 * history_size, observation_size),
+        dtype=dtype)
+    self._cursors = np.zeros((num_envs or 1, num_players), dtype=np.int64)
+    self._max_active_bits = max_active_bits
+    self._index_stacks = None
+    if max_active_bits is not None:
+      # Same ring buffers as _obs_stacks, each frame padded with -1.
+      self._index_stacks = np.full(
+          (num_envs or 1, num_players, 2 * history_size, max_active_bits), -1,
+          dtype=np.int16)
+      # Offset of the indices of each frame of a stack.
+      self._frame_offsets = (
+          np.arange(history_size)[:, None] * observation_size).astype(np.int16)
+
+  def add_observation(self, observation, current_player, env_index=0):
     """Adds observation for the current player.
 
     Args:
       observation: observation vector for current player.
       current_player: int, current player id.
+      env_index: int, index of the environment the observation comes from.
     """
-    self._obs_stacks[current_player] = np.roll(self._obs_stacks[current_player],
-                                               -self._observation_size)
-    self._obs_stacks[current_player][(self._history_size - 1) *
-                                     self._observation_size:] = observation
+    cursor = self._cursors[env_index, current_player]
+    stack = self._obs_stacks[env_index, current_player]
+    stack[cursor] = observation
+    stack[cursor + self._history_size] = stack[cursor]
+    self._cursors[env_index, current_player] = (
+        (cursor + 1) % self._history_size)
+
+  def add_observation_indices(self, indices, current_player, env_index=0):
+    """Adds a sparse observation for the current player.
 
-  def get_observation_stack(self, current_player):
+    Args:
+      indices: sequence of int, indices of the nonzero entries of the
+        observation, at most max_active_bits of them.
+      current_player: int, current player id.
+      env_index: int, index of the environment the observation comes from.
+    """
+    cursor = self._cursors[env_index, current_player]
+    stack = self._obs_stacks[env_index, current_player]
+    stack[cursor] = 0
+    stack[cursor, indices] = 1
+    stack[cursor + self._history_size] = stack[cursor]
+    index_stack = self._index_stacks[env_index, current_player]
+    index_stack[cursor] = -1
+    index_stack[cursor, :len(indices)] = indices
+    index_stack[cursor + self._history_size] = index_stack[cursor]
+    self._cursors[env_index, current_player] = (
+        (cursor + 1) % self._history_size)
+
+  def get_observation_stack(self, current_player, env_index=0):
     """Returns the stacked observation for current player.
 
+    The returned array is a view on the internal buffer, ordered from oldest to
+    newest observation. It is only valid until the next call to
+    add_observation or reset_stack for this player; copy it to keep it longer.
+
     Args:
       current_player: int, current player id.
+      env_index: int, index of the environment.
+
+    Returns:
+      A flat array of size observation_size().
+    """
+    cursor = self._cursors[env_index, current_player]
+    return self._obs_stacks[env_index, current_player,
+                            cursor:cursor + self._history_size].reshape(-1)
+
+  def get_observation_indices(self, current_player, env_index=0):
+    """Returns the indices of the nonzero entries of the stacked observation.
+
+    Only available for sparse observations, see add_observation_indices.
+
+    Args:
+      current_player: int, current player id.
+      env_index: int, index of the environment.
+
+    Returns:
+      A new int16 array of size index_capacity(), the indices in the array
+      get_observation_stack returns, padded with -1.
     """
+    cursor = self._cursors[env_index, current_player]
+    frames = self._index_stacks[env_index, current_player,
+                                cursor:cursor + self._history_size]
+    return np.where(frames >= 0, frames + self._frame_offsets,
+                    np.int16(-1)).reshape(-1)
 
-    return self._obs_stacks[current_player]
+  def get_observation_stacks(self, current_players):
+    """Returns the stacked observations of the current player of every env.
 
-  def reset_stack(self):
-    """Resets the observation stacks to all zero."""
+    Args:
+      current_players: sequence of int, the current player of each environment.
+
+    Returns:
+      An array of shape (num_envs, observation_size()).
+    """
+    stacks = np.empty((len(current_players), self.observation_size()),
+                      dtype=self._dtype)
+    for env_index, player in enumerate(current_players):
+      stacks[env_index] = self.get_observation_stack(player, env_index)
+    return stacks
 
-    for i in range(0, self._num_players):
-      self._obs_stacks[i].fill(0.0)
+  def reset_stack(self, env_index=None):
+    """Resets the observation stacks to all zero.
+
+    Args:
+      env_index: int or None, environment to reset. None resets all of them.
+    """
+    if env_index is None:
+      self._obs_stacks.fill(0)
+      self._cursors.fill(0)
+      if self._index_stacks is not None:
+        self._index_stacks.fill(-1)
+    else:
+      self._obs_stacks[env_index].fill(0)
+      self._cursors[env_index].fill(0)
+      if self._index_stacks is not None:
+        self._index_stacks[env_index].fill(-1)
 
   @property
   def history_size(self):
     """Returns number of steps to stack."""
     return self._history_size
 
+  @property
+  def num_envs(self):
+    """Returns the number of environments, or None for a single one."""
+    return self._num_envs
+
+  @property
+  def dtype(self):
+    """Returns the dtype used to store observations."""
+    return self._dtype
+
   def observation_size(self):
     """Returns the size of the observation vector after history stacking."""
     return self._observation_size * self._history_size
 
+  def index_capacity(self):
+    """Returns the number of stacked indices, or None without sparse ones."""
+    if self._max_active_bits is None:
+      return None
+    return self._max_active_bits * self._history_size
+
 
 def load_gin_configs(gin_files, gin_bindings):
   """Loads gin configuration files.
@@ -106,13 +246,17 @@ def load_gin_configs(gin_files, gin_bindings):
     gin_bindings: List of gin parameter bindings to override the values in the
       config files.
   """
+  # Registers TensorFlow's classes with gin, for the configs that name them.
+  # Deferred to here so that importing this module does not import TensorFlow.
+  import gin.tf  # pylint: disable=g-import-not-at-top,unused-import
   gin.parse_config_files_and_bindings(gin_files,
                                       bindings=gin_bindings,
                                       skip_unknown=False)
 
 
 @gin.configurable
-def create_environment(game_type='Hanabi-Full', num_players=2):
+def create_environment(game_type='Hanabi-Full', num_players=2,
+                       encoder_type='CANONICAL', sparse_observations=False):
   """Creates the Hanabi environment.
 
   Args:
@@ -120,29 +264,47 @@ def create_environment(game_type='Hanabi-Full', num_players=2):
       Hanabi-Full: Regular game.
       Hanabi-Small: The small version of Hanabi, with 2 cards and 2 colours.
     num_players: Int, number of players to play this game.
+    encoder_type: str, name of the pyhanabi.ObservationEncoderType of the
+      observations: 'CANONICAL' or 'BELIEF'.
+    sparse_observations: bool, if True the environment returns CANONICAL
+      observations as the indices of their nonzero entries, which are stored
+      as such in the replay memory.
 
   Returns:
     A Hanabi environment.
   """
   return rl_env.make(
-      environment_name=game_type, num_players=num_players, pyhanabi_path=None)
+      environment_name=game_type, num_players=num_players, pyhanabi_path=None,
+      encoder_type=pyhanabi.ObservationEncoderType[encoder_type],
+      sparse_observations=sparse_observations)
 
 
 @gin.configurable
-def create_obs_stacker(environment, history_size=4):
+def create_obs_stacker(environment, history_size=4, num_envs=None):
   """Creates an observation stacker.
 
   Args:
     environment: environment object.
     history_size: int, number of steps to stack.
+    num_envs: int or None, number of environments to stack observations for.
 
   Returns:
     An observation stacker object.
   """
 
+  if environment.encoder_type == pyhanabi.ObservationEncoderType.CANONICAL:
+    dtype = np.uint8
+  else:
+    dtype = np.float32
+  max_active_bits = None
+  if environment.sparse_observations:
+    max_active_bits = environment.observation_encoder.max_active_bits()
   return ObservationStacker(history_size,
                             environment.vectorized_observation_shape()[0],
-                            environment.players)
+                            environment.players,
+                            num_envs=num_envs,
+                            dtype=dtype,
+                            max_active_bits=max_active_bits)
 
 
 @gin.configurable
@@ -163,12 +325,16 @@ def create_agent(environment, obs_stacker, agent_type='DQN'):
   if agent_type == 'DQN':
     return dqn_agent.DQNAgent(observation_size=obs_stacker.observation_size(),
                               num_actions=environment.num_moves(),
-                              num_players=environment.players)
+                              num_players=environment.players,
+                              observation_dtype=obs_stacker.dtype,
+                              sparse_capacity=obs_stacker.index_capacity())
   elif agent_type == 'Rainbow':
     return rainbow_agent.RainbowAgent(
         observation_size=obs_stacker.observation_size(),
         num_actions=environment.num_moves(),
-        num_players=environment.players)
+        num_players=environment.players,
+        observation_dtype=obs_stacker.dtype,
+        sparse_capacity=obs_stacker.index_capacity())
   else:
     raise ValueError('Expected valid agent_type, got {}'.format(agent_type))
 
@@ -270,13 +436,24 @@ def parse_observations(observations, num_actions, obs_stacker):
   legal_moves = current_player_observation['legal_moves_as_int']
   legal_moves = format_legal_moves(legal_moves, num_actions)
 
-  observation_vector = current_player_observation['vectorized']
-  obs_stacker.add_observation(observation_vector, current_player)
+  if 'vectorized_indices' in current_player_observation:
+    obs_stacker.add_observation_indices(
+        current_player_observation['vectorized_indices'], current_player)
+  else:
+    obs_stacker.add_observation(current_player_observation['vectorized'],
+                                current_player)
   observation_vector = obs_stacker.get_observation_stack(current_player)
 
   return current_player, legal_moves, observation_vector
 
 
+def _observation_indices(obs_stacker, current_player):
+  """Returns the stacked sparse observation, or None for dense observations."""
+  if obs_stacker.index_capacity() is None:
+    return None
+  return obs_stacker.get_observation_indices(current_player)
+
+
 def run_one_episode(agent, environment, obs_stacker):
   """Runs the agent on a single game of Hanabi in self-play mode.
 
@@ -293,7 +470,9 @@ def run_one_episode(agent, environment, obs_stacker):
   observations = environment.reset()
   current_player, legal_moves, observation_vector = (
       parse_observations(observations, environment.num_moves(), obs_stacker))
-  action = agent.begin_episode(current_player, legal_moves, observation_vector)
+  action = agent.begin_episode(
+      current_player, legal_moves, observation_vector,
+      observation_indices=_observation_indices(obs_stacker, current_player))
 
   is_done = False
   total_reward = 0
@@ -317,14 +496,17 @@ def run_one_episode(agent, environment, obs_stacker):
       break
     current_player, legal_moves, observation_vector = (
         parse_observations(observations, environment.num_moves(), obs_stacker))
+    observation_indices = _observation_indices(obs_stacker, current_player)
     if current_player in has_played:
       action = agent.step(reward_since_last_action[current_player],
-                          current_player, legal_moves, observation_vector)
+                          current_player, legal_moves, observation_vector,
+                          observation_indices=observation_indices)
     else:
       # Each player begins the episode on their first turn (which may not be
       # the first move of the game).
       action = agent.begin_episode(current_player, legal_moves,
-                                   observation_vector)
+                                   observation_vector,
+                                   observation_indices=observation_indices)
       has_played.add(current_player)
 
     # Reset this player's reward accumulator.
@@ -375,6 +557,7 @@ def run_one_phase(agent, environment, obs_stacker, min_steps, statistics,
 @gin.configurable
 def run_one_iteration(agent, environment, obs_stacker,
                       iteration, training_steps,
+                      actor_pool=None,
                       evaluate_every_n=100,
                       num_evaluation_games=100):
   """Runs one iteration of agent/environment interaction.
@@ -388,6 +571,8 @@ def run_one_iteration(agent, environment, obs_stacker,
     obs_stacker: Observation stacker object.
     iteration: int, current iteration number, used as a global_step.
     training_steps: int, the number of training steps to perform.
+    actor_pool: `ActorPool` or None. When given, training episodes are played
+      by the actor processes and the agent only learns from them.
     evaluate_every_n: int, frequency of evaluation.
     num_evaluation_games: int, number of games per evaluation.
 
@@ -400,9 +585,14 @@ def run_one_iteration(agent, environment, obs_stacker,
 
   # First perform the training phase, during which the agent learns.
   agent.eval_mode = False
-  number_steps, sum_returns, num_episodes = (
-      run_one_phase(agent, environment, obs_stacker, training_steps, statistics,
-                    'train'))
+  if actor_pool is None:
+    number_steps, sum_returns, num_episodes = (
+        run_one_phase(agent, environment, obs_stacker, training_steps,
+                      statistics, 'train'))
+  else:
+    number_steps, sum_returns, num_episodes = (
+        actor_learner.run_actor_learner_phase(agent, actor_pool,
+                                              training_steps, statistics))
   time_delta = time.time() - start_time
   tf.logging.info('Average training steps per second: %.2f',
                   number_steps / time_delta)
@@ -433,6 +623,13 @@ def run_one_iteration(agent, environment, obs_stacker,
         'eval_episode_returns': -1
     })
 
+  if instrumentation.is_enabled():
+    # Times of the instrumented sections during this iteration, in this
+    # process. Actor processes are not included.
+    statistics.append(instrumentation.flat_summary())
+    tf.logging.info('Time per section:\n%s', instrumentation.format_summary())
+    instrumentation.reset()
+
   return statistics.data_lists
 
 
@@ -484,27 +681,52 @@ def run_experiment(agent,
                    training_steps=5000,
                    logging_file_prefix='log',
                    log_every_n=1,
-                   checkpoint_every_n=1):
-  """Runs a full experiment, spread over multiple iterations."""
+                   checkpoint_every_n=1,
+                   num_actors=0,
+                   gin_files=None,
+                   gin_bindings=None,
+                   instrument=False):
+  """Runs a full experiment, spread over multiple iterations.
+
+  With num_actors > 0, training episodes are generated by that many actor
+  processes (see actor_learner.py), forked from a process that loaded
+  gin_files and gin_bindings and built the environment.
+
+  With instrument=True, the environment, agent and replay memory hot paths are
+  timed (see instrumentation.py), and the times of every iteration are logged
+  and added to its statistics.
+  """
+  instrumentation.enable(instrument)
   tf.logging.info('Beginning training...')
   if num_iterations <= start_iteration:
     tf.logging.warning('num_iterations (%d) < start_iteration(%d)',
                        num_iterations, start_iteration)
     return
 
-  for iteration in range(start_iteration, num_iterations):
-    start_time = time.time()
-    statistics = run_one_iteration(agent, environment, obs_stacker, iteration,
-                                   training_steps)
-    tf.logging.info('Iteration %d took %d seconds', iteration,
-                    time.time() - start_time)
-    start_time = time.time()
-    log_experiment(experiment_logger, iteration, statistics,
-                   logging_file_prefix, log_every_n)
-    tf.logging.info('Logging iteration %d took %d seconds', iteration,
-                    time.time() - start_time)
-    start_time = time.time()
-    checkpoint_experiment(experiment_checkpointer, agent, experiment_logger,
-                          iteration, checkpoint_dir, checkpoint_every_n)
-    tf.logging.info('Checkpointing iteration %d took %d seconds', iteration,
-                    time.time() - start_time)
+  actor_pool = None
+  if num_actors > 0:
+    actor_pool = actor_learner.ActorPool(num_actors, gin_files, gin_bindings)
+    actor_pool.maybe_publish_weights(agent)
+    actor_pool.start()
+
+  try:
+    for iteration in range(start_iteration, num_iterations):
+      start_time = time.time()
+      statistics = run_one_iteration(agent, environment, obs_stacker,
+                                     iteration, training_steps,
+                                     actor_pool=actor_pool)
+      tf.logging.info('Iteration %d took %d seconds', iteration,
+                      time.time() - start_time)
+      start_time = time.time()
+      log_experiment(experiment_logger, iteration, statistics,
+                     logging_file_prefix, log_every_n)
+      tf.logging.info('Logging iteration %d took %d seconds', iteration,
+                      time.time() - start_time)
+      start_time = time.time()
+      checkpoint_experiment(experiment_checkpointer, agent, experiment_logger,
+                            iteration, checkpoint_dir, checkpoint_every_n)
+      tf.logging.info('Checkpointing iteration %d took %d seconds', iteration,
+                      time.time() - start_time)
+  finally:
+    if actor_pool is not None:
+      actor_pool.stop()
@@ -49,7 +49,9 @@ from __future__ import print_function
 
 import os
 import pickle
-import tensorflow as tf
+from hanabi_learning_environment import lazy_import
+
+tf = lazy_import.LazyModule('tensorflow')
 
 CHECKPOINT_DURATION = 4
 
@@ -92,7 +92,9 @@ def launch_experiment():
                                 obs_stacker,
                                 experiment_logger, experiment_checkpointer,
                                 checkpoint_dir,
-                                logging_file_prefix=FLAGS.logging_file_prefix)
+                                logging_file_prefix=FLAGS.logging_file_prefix,
+                                gin_files=FLAGS.gin_files,
+                                gin_bindings=FLAGS.gin_bindings)
 
 
 def main(unused_argv):
@@ -15,7 +15,8 @@ class RedRanger(Agent):
         """Initialize the agent."""
         game = args[0]
         playerIndex = args[1]
-        self.knowledge = Knowledge(config, game, playerIndex)
+        self.knowledge = Knowledge(config, game, playerIndex,
+                                   verbose=kwargs.get('verbose', True))
 
 
     def act(self, observation):
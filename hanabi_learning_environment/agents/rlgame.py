@@ -1,6 +1,7 @@
 from __future__ import print_function
 
 import numpy as np
+from hanabi_learning_environment import game_cache
 from hanabi_learning_environment import pyhanabi
 from hanabi_learning_environment import rl_env
 
@@ -71,12 +72,9 @@ def run_rlgame(config):
 
 
     ### Creating an instance of the Hanabi game
-    game = pyhanabi.HanabiGame(config)
+    game, obs_encoder = game_cache.acquire(
+        config, pyhanabi.ObservationEncoderType.CANONICAL)
     #print(game.parameter_string(), end="")
-    obs_encoder = pyhanabi.ObservationEncoder(
-      game,
-      enc_type=pyhanabi.ObservationEncoderType.CANONICAL
-    )
 
 
     ### Initialize players
@@ -85,13 +83,13 @@ def run_rlgame(config):
 
 
     ### Initialize the state of the Hanabi Game
-    state = game.new_initial_state()
+    state = game.new_initial_state(seed=game_cache.config_seed(config))
 
 
     ### Main loop of the game
     while not state.is_terminal():
         if state.cur_player() == pyhanabi.CHANCE_PLAYER_ID:
-          state.deal_random_card()
+          state.deal_pending_cards()
           continue
 
         active_player = players[state.cur_player()]
@@ -112,6 +110,7 @@ def run_rlgame(config):
     print(state)
     print("")
     print("score: {}".format(state.score()))
+    game_cache.release(config)
 
 
 if __name__ == "__main__":
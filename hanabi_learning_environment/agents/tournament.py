@@ -0,0 +1,317 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Headless tournament runner.
+
+Plays a number of games for every lineup of agents, over a pool of processes,
+and reports the score distribution of each lineup. Nothing is printed while
+games are played.
+
+Every lineup plays the same sequence of deals: game i is dealt from seed
+base_seed + i, so lineups are compared on common random numbers.
+
+Example, 1000 games of every 2 and 3 player lineup of two agents:
+
+  python tournament.py --agents=SimpleAgent,RedRanger --players=2,3 \
+      --num_games=1000 --output=results.json
+
+Or a single lineup, one agent per seat:
+
+  python tournament.py --lineup=ISMCTSAgent,SimpleAgent --num_games=100 \
+      --agent_config='{"mcts_iterations": 200}'
+"""
+
+from __future__ import print_function
+
+import getopt
+import itertools
+import json
+import math
+import random
+import sys
+
+from hanabi_learning_environment import pyhanabi
+from hanabi_learning_environment import rl_env
+from hanabi_learning_environment import worker_pool
+from hanabi_learning_environment.agents.random_agent import RandomAgent
+from hanabi_learning_environment.agents.simple_agent import SimpleAgent
+from ismcts_agent import ISMCTSAgent
+from red_ranger import RedRanger
+
+# Agents act either on the dict observations of rl_env ('rl_env'), or on
+# pyhanabi.HanabiObservation objects ('pyhanabi'). pyhanabi agents are built
+# with the game and their seat.
+AGENTS = {
+    'SimpleAgent': (SimpleAgent, 'rl_env'),
+    'RandomAgent': (RandomAgent, 'rl_env'),
+    'RedRanger': (RedRanger, 'pyhanabi'),
+    'ISMCTSAgent': (ISMCTSAgent, 'pyhanabi'),
+}
+
+# Game parameters of the 'Hanabi-Full' environment.
+DEFAULT_GAME_CONFIG = {
+    'colors': 5,
+    'ranks': 5,
+    'max_information_tokens': 8,
+    'max_life_tokens': 3,
+    'observation_type': pyhanabi.AgentObservationType.CARD_KNOWLEDGE.value,
+}
+
+# Number of games per task sent to a worker process.
+_CHUNK_SIZE = 50
+
+
+def _make_agents(lineup, config, agent_config, game):
+  """Returns an agent per seat of the lineup, for a new game."""
+  agents = []
+  for seat, name in enumerate(lineup):
+    agent_class, interface = AGENTS[name]
+    seat_config = dict(config, **agent_config)
+    if interface == 'pyhanabi':
+      agents.append(agent_class(seat_config, game, seat, verbose=False))
+    else:
+      agents.append(agent_class(seat_config))
+  return agents
+
+
+def _play_pyhanabi_game(game, agents, seed):
+  """Plays a game of agents acting on HanabiObservations.
+
+  Returns:
+    The terminal pyhanabi.HanabiState and the number of turns.
+  """
+  state = game.new_initial_state(seed=seed)
+  state.deal_pending_cards()
+  num_turns = 0
+  while not state.is_terminal():
+    move = None
+    for seat, agent in enumerate(agents):
+      # Waiting agents mostly read the last moves, not the legal moves.
+      action = agent.act(state.observation(seat, lazy=True))
+      if seat == state.cur_player():
+        move = action
+    state.apply_move(move)
+    state.deal_pending_cards()
+    num_turns += 1
+  return state, num_turns
+
+
+def _play_env_game(env, agents, interfaces, seed):
+  """Plays a game through rl_env, with any mix of agent interfaces.
+
+  Returns:
+    The terminal pyhanabi.HanabiState and the number of turns.
+  """
+  observations = env.reset(seed=seed)
+  num_turns = 0
+  done = False
+  while not done:
+    current_player = observations['current_player']
+    action = None
+    for seat, agent in enumerate(agents):
+      if interfaces[seat] == 'pyhanabi':
+        seat_action = agent.act(env.state.observation(seat))
+        if seat_action is not None:
+          seat_action = env.game.get_move_uid(seat_action)
+      else:
+        seat_action = agent.act(observations['player_observations'][seat])
+      if seat == current_player:
+        action = seat_action
+    observations, _, done, _ = env.step(action)
+    num_turns += 1
+  return env.state, num_turns
+
+
+def _play_games(task):
+  """Plays a chunk of games of a lineup, in a worker process.
+
+  Args:
+    task: tuple (lineup, config, agent_config, first_seed, num_games).
+
+  Returns:
+    A list of (score, bombed out, turns) per game.
+  """
+  lineup, config, agent_config, first_seed, num_games = task
+  interfaces = [AGENTS[name][1] for name in lineup]
+  if 'rl_env' in interfaces:
+    env = rl_env.HanabiEnv(config)
+    game = env.game
+  else:
+    env = None
+    # Built before forking when run in the tournament's worker pool.
+    game = worker_pool.preloaded_game(config)
+
+  results = []
+  for seed in range(first_seed, first_seed + num_games):
+    # Agents draw from the random module, seed it for reproducible games.
+    random.seed(seed)
+    agents = _make_agents(lineup, config, dict(agent_config, seed=seed), game)
+    if env is None:
+      state, num_turns = _play_pyhanabi_game(game, agents, seed)
+    else:
+      state, num_turns = _play_env_game(env, agents, interfaces, seed)
+    results.append((state.score(), state.life_tokens() == 0, num_turns))
+  return results
+
+
+def summarize(results, max_score):
+  """Returns the statistics of a list of game results.
+
+  Args:
+    results: list of (score, bombed out, turns), as returned by _play_games.
+    max_score: int, score of a perfect game.
+
+  Returns:
+    A dict with the number of games, the mean score with its standard
+    deviation and 95% confidence interval, the score histogram, the rates of
+    bombed out and perfect games, and the mean number of turns.
+  """
+  num_games = len(results)
+  scores = [score for score, _, _ in results]
+  mean = sum(scores) / float(num_games)
+  variance = sum((score - mean)**2 for score in scores) / num_games
+  std = math.sqrt(variance)
+  half_width = 1.96 * std / math.sqrt(num_games)
+  histogram = [0] * (max_score + 1)
+  for score in scores:
+    histogram[score] += 1
+  return {
+      'num_games': num_games,
+      'mean_score': mean,
+      'std_score': std,
+      'ci95': [mean - half_width, mean + half_width],
+      'score_histogram': histogram,
+      'bomb_rate': sum(1 for _, bombed, _ in results if bombed) /
+                   float(num_games),
+      'perfect_rate': sum(1 for score in scores if score == max_score) /
+                      float(num_games),
+      'mean_turns': sum(turns for _, _, turns in results) / float(num_games),
+  }
+
+
+def run_tournament(lineups, num_games, game_config=None, agent_config=None,
+                   base_seed=0, num_processes=None):
+  """Plays num_games games for each lineup.
+
+  Args:
+    lineups: list of lineups, each a tuple of agent names from AGENTS, one per
+      seat. The number of players is the length of the lineup.
+    num_games: int, number of games per lineup.
+    game_config: dict, game parameters overriding DEFAULT_GAME_CONFIG.
+    agent_config: dict, extra parameters passed to the agents.
+    base_seed: int, seed of the first game of every lineup.
+    num_processes: int, size of the process pool, defaults to the number of
+      CPUs. With 1, games are played in this process.
+
+  Returns:
+    A list of dicts, one per lineup, with the lineup, the game configuration
+    and the statistics returned by summarize.
+  """
+  agent_config = agent_config or {}
+  configs = []
+  tasks = []
+  for lineup in lineups:
+    config = dict(DEFAULT_GAME_CONFIG, **(game_config or {}))
+    config['players'] = len(lineup)
+    configs.append(config)
+    for first in range(0, num_games, _CHUNK_SIZE):
+      tasks.append((tuple(lineup), config, agent_config, base_seed + first,
+                    min(_CHUNK_SIZE, num_games - first)))
+
+  if num_processes == 1:
+    chunk_results = [_play_games(task) for task in tasks]
+  else:
+    # Workers are forked from a process that loaded pyhanabi and the games.
+    with worker_pool.WorkerPool(num_processes, game_configs=configs) as pool:
+      chunk_results = pool.map(_play_games, tasks)
+
+  # Tasks are in lineup order, chunks of a lineup in seed order.
+  results = []
+  chunks = iter(chunk_results)
+  for lineup, config in zip(lineups, configs):
+    games = []
+    for _ in range(0, num_games, _CHUNK_SIZE):
+      games.extend(next(chunks))
+    entry = {'lineup': list(lineup), 'config': config}
+    entry.update(summarize(games, config['colors'] * config['ranks']))
+    results.append(entry)
+  return results
+
+
+def make_lineups(agents, player_counts):
+  """Returns every lineup of the agents, up to seat order.
+
+  Args:
+    agents: list of agent names.
+    player_counts: list of numbers of players.
+  """
+  return [lineup for players in player_counts
+          for lineup in itertools.combinations_with_replacement(agents,
+                                                                players)]
+
+
+def print_summary(results):
+  """Prints a line per lineup."""
+  for entry in results:
+    print('{:<40} games: {:<8d} score: {:6.3f} +- {:.3f}  bomb: {:5.1%}  '
+          'perfect: {:5.1%}  turns: {:5.1f}'.format(
+              ','.join(entry['lineup']), entry['num_games'],
+              entry['mean_score'], entry['ci95'][1] - entry['mean_score'],
+              entry['bomb_rate'], entry['perfect_rate'], entry['mean_turns']))
+
+
+USAGE = """usage: tournament.py [options]
+--agents        comma separated agents, every lineup of them is played:
+                {}.
+--players       comma separated numbers of players, for --agents.
+--lineup        comma separated agents, one per seat, instead of --agents.
+--num_games     number of games per lineup.
+--base_seed     seed of the first game of every lineup.
+--processes     number of worker processes, 0 for the number of CPUs.
+--config        JSON dict of game parameters.
+--agent_config  JSON dict of agent parameters.
+--output        file to write the results to, as JSON."""
+
+
+if __name__ == '__main__':
+  flags = {'agents': 'SimpleAgent', 'players': '2', 'lineup': '',
+           'num_games': 1000, 'base_seed': 0, 'processes': 0,
+           'config': '{}', 'agent_config': '{}', 'output': ''}
+  options, arguments = getopt.getopt(sys.argv[1:], '',
+                                     [flag + '=' for flag in flags])
+  if arguments:
+    sys.exit(USAGE.format(', '.join(sorted(AGENTS))))
+  for flag, value in options:
+    flag = flag[2:]  # Strip leading --.
+    flags[flag] = type(flags[flag])(value)
+
+  if flags['lineup']:
+    lineups = [tuple(flags['lineup'].split(','))]
+  else:
+    lineups = make_lineups(flags['agents'].split(','),
+                           [int(p) for p in flags['players'].split(',')])
+  for name in set(itertools.chain.from_iterable(lineups)):
+    if name not in AGENTS:
+      sys.exit('Unknown agent {}, expected one of {}.'.format(
+          name, ', '.join(sorted(AGENTS))))
+
+  tournament_results = run_tournament(
+      lineups, flags['num_games'],
+      game_config=json.loads(flags['config']),
+      agent_config=json.loads(flags['agent_config']),
+      base_seed=flags['base_seed'],
+      num_processes=flags['processes'] or None)
+  print_summary(tournament_results)
+  if flags['output']:
+    with open(flags['output'], 'w') as output_file:
+      json.dump(tournament_results, output_file, indent=2)
@@ -0,0 +1,76 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Bounded transposition table for search agents.
+
+Entries are keyed by HanabiState.hash() and evicted in least recently used
+order once the table is full. A table can be shared by several agents, and
+kept across turns and games with the same parameters.
+"""
+
+import collections
+
+
+class TranspositionTable(object):
+  """Maps state hashes to search statistics, with LRU eviction."""
+
+  def __init__(self, capacity=100000):
+    """Initializes an empty table.
+
+    Args:
+      capacity: int, maximum number of entries.
+    """
+    self.capacity = capacity
+    self._entries = collections.OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key, default=None):
+    """Returns the entry for key and marks it as recently used.
+
+    Args:
+      key: int, a state hash.
+      default: value returned if key is not in the table.
+    """
+    try:
+      value = self._entries.pop(key)
+    except KeyError:
+      self.misses += 1
+      return default
+    self._entries[key] = value
+    self.hits += 1
+    return value
+
+  def put(self, key, value):
+    """Stores an entry, evicting the least recently used one if full.
+
+    Args:
+      key: int, a state hash.
+      value: the entry.
+    """
+    self._entries.pop(key, None)
+    self._entries[key] = value
+    if len(self._entries) > self.capacity:
+      self._entries.popitem(last=False)
+
+  def clear(self):
+    """Removes all entries and resets the hit counts."""
+    self._entries.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def __contains__(self, key):
+    return key in self._entries
+
+  def __len__(self):
+    return len(self._entries)
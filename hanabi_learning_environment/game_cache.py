@@ -0,0 +1,221 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Process-wide cache of HanabiGames and their ObservationEncoders.
+
+A HanabiGame and its encoders are immutable, apart from the game's random
+number generator, so every environment, agent and trial of a process playing
+the same game can share them. Games are keyed by their parameters with the
+"seed" removed: a cached game is built without a seed, and seeds are given
+per state instead, with HanabiGame.new_initial_state(seed=...).
+
+  game, encoder = game_cache.acquire(config)
+  state = game.new_initial_state(seed=game_cache.config_seed(config))
+  ...
+  game_cache.release(config)
+
+Parameters are normalized, so that configurations that only differ by
+parameters left at their default values share a game. Released games stay
+cached for the next acquire, until trim() or clear().
+
+The cache can be used from several threads.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import os
+import threading
+
+from hanabi_learning_environment import pyhanabi
+
+_lock = threading.Lock()
+# Normalized parameters to _Entry, and the keys given to acquire to the same
+# entries.
+_entries = {}
+_aliases = {}
+
+
+class _Entry(object):
+  """A cached game, its encoders by type, and its number of users."""
+
+  __slots__ = ["game", "encoders", "refcount"]
+
+  def __init__(self, game):
+    self.game = game
+    self.encoders = {}
+    self.refcount = 0
+
+  def encoder(self, encoder_type):
+    encoder = self.encoders.get(encoder_type)
+    if encoder is None:
+      encoder = self.encoders[encoder_type] = pyhanabi.ObservationEncoder(
+          self.game, encoder_type)
+    return encoder
+
+
+def _params_key(params):
+  """Returns the hashable key of a parameters dict, without the seed."""
+  return tuple(sorted((str(key), str(value))
+                      for key, value in (params or {}).items()
+                      if key != "seed"))
+
+
+def _game_key(game):
+  """Returns the key of every parameter of a game, without the seed."""
+  params = dict(line.split("=", 1)
+                for line in game.parameter_string().splitlines())
+  return _params_key(params)
+
+
+def config_seed(params):
+  """Returns the seed of a game configuration, for new_initial_state.
+
+  Args:
+    params: dict, game parameters, or None.
+
+  Returns:
+    The "seed" parameter as an int, or None if it is missing or -1, i.e. if
+    states should draw their seed from the game.
+  """
+  seed = (params or {}).get("seed", -1)
+  seed = int(seed)
+  return None if seed == -1 else seed
+
+
+def _get_entry(params):
+  key = _params_key(params)
+  entry = _aliases.get(key)
+  if entry is None:
+    game = pyhanabi.HanabiGame(
+        {k: v for k, v in (params or {}).items() if k != "seed"})
+    full_key = _game_key(game)
+    entry = _entries.get(full_key)
+    if entry is None:
+      entry = _entries[full_key] = _Entry(game)
+    _aliases[key] = entry
+  return entry
+
+
+def acquire(params=None,
+            encoder_type=pyhanabi.ObservationEncoderType.CANONICAL):
+  """Returns the shared game and encoder of a configuration.
+
+  Every acquire should be matched by a release once the game is not used
+  anymore.
+
+  Args:
+    params: dict, game parameters, as for pyhanabi.HanabiGame. The "seed" is
+      ignored, see config_seed.
+    encoder_type: pyhanabi.ObservationEncoderType of the encoder.
+
+  Returns:
+    A pair (pyhanabi.HanabiGame, pyhanabi.ObservationEncoder).
+  """
+  encoder_type = pyhanabi.ObservationEncoderType(encoder_type)
+  with _lock:
+    entry = _get_entry(params)
+    entry.refcount += 1
+    return entry.game, entry.encoder(encoder_type)
+
+
+def get_game(params=None):
+  """Returns the shared game of a configuration, without acquiring it."""
+  with _lock:
+    return _get_entry(params).game
+
+
+def get_encoder(params=None,
+                encoder_type=pyhanabi.ObservationEncoderType.CANONICAL):
+  """Returns the shared encoder of a configuration, without acquiring it."""
+  encoder_type = pyhanabi.ObservationEncoderType(encoder_type)
+  with _lock:
+    return _get_entry(params).encoder(encoder_type)
+
+
+def release(params=None):
+  """Releases a game returned by acquire.
+
+  The game stays cached, see trim. Releasing a game dropped by clear does
+  nothing.
+
+  Args:
+    params: dict, the game parameters given to acquire.
+
+  Raises:
+    ValueError: if the game of params is cached but not acquired.
+  """
+  with _lock:
+    entry = _aliases.get(_params_key(params))
+    if entry is None:
+      return
+    if entry.refcount == 0:
+      raise ValueError("Game not acquired: {}".format(params))
+    entry.refcount -= 1
+
+
+def refcount(params=None):
+  """Returns the number of unreleased acquires of a configuration's game."""
+  with _lock:
+    entry = _aliases.get(_params_key(params))
+    return 0 if entry is None else entry.refcount
+
+
+def size():
+  """Returns the number of cached games."""
+  with _lock:
+    return len(_entries)
+
+
+def reseed():
+  """Reseeds every cached game from the operating system's random source.
+
+  A process forked from another holding cached games inherits their random
+  number generators, and would deal the same games as its parent and
+  siblings.
+  """
+  with _lock:
+    for entry in _entries.values():
+      entry.game.set_seed(
+          int.from_bytes(os.urandom(4), "little") & 0x7fffffff)
+
+
+def _drop(entries):
+  for key in [key for key, entry in _entries.items() if entry in entries]:
+    del _entries[key]
+  for key in [key for key, entry in _aliases.items() if entry in entries]:
+    del _aliases[key]
+
+
+def trim():
+  """Drops the games that are not acquired.
+
+  Returns:
+    The number of games dropped.
+  """
+  with _lock:
+    unused = [entry for entry in _entries.values() if entry.refcount == 0]
+    _drop(unused)
+    return len(unused)
+
+
+def clear():
+  """Drops every game, acquired or not.
+
+  Games still referenced outside the cache, directly or by their states,
+  observations and encoders, stay valid, but are not shared with later
+  acquires anymore.
+  """
+  with _lock:
+    _entries.clear()
+    _aliases.clear()
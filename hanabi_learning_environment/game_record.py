@@ -0,0 +1,305 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Packed binary records of played games.
+
+A game record file holds the games of one game configuration. The games are
+appended by a GameRecordWriter as they finish, and read back by a
+GameRecordReader, which maps the file in memory and replays any game into a
+HanabiState, or into the encoded observations of its players:
+
+  with game_record.GameRecordWriter(path, config) as writer:
+    for seed in seeds:
+      state = game.new_initial_state(seed=seed)
+      ...  # Play the game.
+      writer.write(state, seed)
+
+  with game_record.GameRecordReader(path) as reader:
+    state = reader.replay(index)
+    for player, encoding, move_uid in reader.observations(index):
+      ...
+
+A game is recorded as its seed, its start player and its moves, one byte per
+move, see HanabiState.move_uids. Deals are recorded as moves too, and the
+moves start with the initial deal, so replaying does not depend on the seed.
+A game takes 7 bytes, plus one byte per move.
+
+File layout, little-endian:
+
+  header: magic "HANABIGR", uint16 version, uint32 size of the parameters,
+          parameters as JSON, without "seed".
+  games:  int32 seed or -1, uint8 start player, uint16 number of moves,
+          moves.
+
+Games are written whole, so a file cut short, e.g. by a crash, reads up to
+its last complete game.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import array
+import collections
+import json
+import mmap
+import struct
+
+from hanabi_learning_environment import game_cache
+from hanabi_learning_environment import pyhanabi
+
+MAGIC = b"HANABIGR"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sHI")
+_GAME_HEADER = struct.Struct("<iBH")
+_MAX_MOVES = 0xffff
+
+GameRecord = collections.namedtuple("GameRecord",
+                                    ["seed", "start_player", "move_uids"])
+
+
+def _record_params(params):
+  """Returns the parameters of a game as stored in a file, without the seed."""
+  return {str(key): str(value) for key, value in (params or {}).items()
+          if key != "seed"}
+
+
+class GameRecordWriter(object):
+  """Appends games to a new game record file."""
+
+  def __init__(self, path, params=None):
+    """Creates the file, and writes its header.
+
+    Args:
+      path: str, path of the file, replaced if it exists.
+      params: dict, parameters of the game of every recorded state, as for
+        pyhanabi.HanabiGame. The "seed" is not recorded, see write.
+
+    Raises:
+      ValueError: if the moves of the game do not fit in a byte.
+    """
+    self._params = _record_params(params)
+    game = game_cache.get_game(self._params)
+    if game.max_moves() > 256 or game.max_chance_outcomes() > 256:
+      raise ValueError("Moves of the game do not fit in a byte: {}".format(
+          params))
+    params_json = json.dumps(self._params, sort_keys=True).encode("utf-8")
+    self._file = open(path, "wb")
+    self._file.write(_HEADER.pack(MAGIC, VERSION, len(params_json)))
+    self._file.write(params_json)
+    self._num_games = 0
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused_exc_info):
+    self.close()
+
+  def num_games(self):
+    """Returns the number of games written."""
+    return self._num_games
+
+  def write(self, state, seed=None):
+    """Appends the game played so far in a state.
+
+    Args:
+      state: pyhanabi.HanabiState of the file's game, usually terminal. It
+        must hold its history from the start of the game, so search copies
+        cannot be written.
+      seed: int, seed the state was created with, or None if unknown. It is
+        only recorded for reference.
+
+    Raises:
+      ValueError: if the state's history is incomplete, the initial deal is
+        not done, or the game has more moves than a record holds.
+    """
+    if self._file is None:
+      raise ValueError("The game record file is closed.")
+    move_uids = state.move_uids()
+    start_player = state.start_player()
+    if start_player == pyhanabi.CHANCE_PLAYER_ID:
+      raise ValueError("Cannot record a game before its initial deal is done.")
+    if len(move_uids) > _MAX_MOVES:
+      raise ValueError("Game of {} moves is too long to record.".format(
+          len(move_uids)))
+    self._file.write(_GAME_HEADER.pack(
+        -1 if seed is None else seed, start_player, len(move_uids)))
+    self._file.write(move_uids)
+    self._num_games += 1
+
+  def flush(self):
+    """Writes the buffered games to the file."""
+    self._file.flush()
+
+  def close(self):
+    if self._file is not None:
+      self._file.close()
+      self._file = None
+
+
+class GameRecordReader(object):
+  """Reads and replays the games of a game record file."""
+
+  def __init__(self, path):
+    """Maps the file in memory, and reads its header.
+
+    Args:
+      path: str, path of a file written by a GameRecordWriter.
+
+    Raises:
+      ValueError: if the file is not a game record file of this version.
+    """
+    with open(path, "rb") as record_file:
+      self._data = mmap.mmap(record_file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(self._data) < _HEADER.size:
+      self.close()
+      raise ValueError("Not a game record file: {}".format(path))
+    magic, version, params_size = _HEADER.unpack_from(self._data)
+    if magic != MAGIC or version != VERSION:
+      self.close()
+      raise ValueError("Not a game record file of version {}: {}".format(
+          VERSION, path))
+    self._start = _HEADER.size + params_size
+    self._params = json.loads(
+        self._data[_HEADER.size:self._start].decode("utf-8"))
+    self._game = game_cache.get_game(self._params)
+    self._offsets = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused_exc_info):
+    self.close()
+
+  def params(self):
+    """Returns the parameters of the recorded game, without "seed"."""
+    return dict(self._params)
+
+  def game(self):
+    """Returns the pyhanabi.HanabiGame of the recorded games."""
+    return self._game
+
+  def _scan(self):
+    """Yields the offset of every complete game."""
+    data = self._data
+    offset = self._start
+    end = len(data) - _GAME_HEADER.size
+    while offset <= end:
+      num_moves = _GAME_HEADER.unpack_from(data, offset)[2]
+      if offset + _GAME_HEADER.size + num_moves > len(data):
+        break
+      yield offset
+      offset += _GAME_HEADER.size + num_moves
+
+  def _read(self, offset):
+    seed, start_player, num_moves = _GAME_HEADER.unpack_from(
+        self._data, offset)
+    offset += _GAME_HEADER.size
+    return GameRecord(seed, start_player,
+                      self._data[offset:offset + num_moves])
+
+  def __len__(self):
+    if self._offsets is None:
+      # Offsets of every game, built on the first random access.
+      self._offsets = array.array("q", self._scan())
+    return len(self._offsets)
+
+  def __getitem__(self, index):
+    """Returns the GameRecord of a game, by index in the file."""
+    if index < 0:
+      index += len(self)
+    if not 0 <= index < len(self):
+      raise IndexError("Game index out of range: {}".format(index))
+    return self._read(self._offsets[index])
+
+  def __iter__(self):
+    """Yields the GameRecord of every game, in order, without an index."""
+    for offset in self._scan():
+      yield self._read(offset)
+
+  def _new_state(self, record):
+    return pyhanabi.HanabiState(
+        self._game, seed=None if record.seed < 0 else record.seed,
+        start_player=record.start_player)
+
+  def initial_deal(self, index):
+    """Returns the hands dealt at the start of a game.
+
+    Args:
+      index: int, index of the game, or its GameRecord.
+
+    Returns:
+      A list with the hand of each player, as a list of pyhanabi.HanabiCard.
+    """
+    record = index if isinstance(index, GameRecord) else self[index]
+    hand_size = self._game.hand_size()
+    num_ranks = self._game.num_ranks()
+    # Hands are dealt one after the other, in player order.
+    return [[pyhanabi.HanabiCard(uid // num_ranks, uid % num_ranks)
+             for uid in record.move_uids[player * hand_size:
+                                         (player + 1) * hand_size]]
+            for player in range(self._game.num_players())]
+
+  def replay(self, index, num_moves=None):
+    """Returns the state of a game after its moves.
+
+    Args:
+      index: int, index of the game, or its GameRecord.
+      num_moves: int, number of moves to replay, deals included, or None to
+        replay every move.
+
+    Raises:
+      ValueError: if a move of the record is illegal.
+    """
+    record = index if isinstance(index, GameRecord) else self[index]
+    move_uids = record.move_uids[:num_moves]
+    state = self._new_state(record)
+    num_applied = state.apply_move_uids(move_uids)
+    if num_applied != len(move_uids):
+      raise ValueError("Move {} of the game record is illegal.".format(
+          num_applied))
+    return state
+
+  def observations(self, index,
+                   encoder_type=pyhanabi.ObservationEncoderType.CANONICAL):
+    """Yields the encoded observation of the player of each player's move.
+
+    Args:
+      index: int, index of the game, or its GameRecord.
+      encoder_type: pyhanabi.ObservationEncoderType of the encoding.
+
+    Yields:
+      Tuples (player, encoding, move_uid): the player to act, the encoding of
+      their observation before the move, and the uid of the move they made.
+
+    Raises:
+      ValueError: if a move of the record is illegal.
+    """
+    record = index if isinstance(index, GameRecord) else self[index]
+    encoder = game_cache.get_encoder(self._params, encoder_type)
+    move_uids = record.move_uids
+    state = self._new_state(record)
+    for move_index in range(len(move_uids)):
+      player = state.cur_player()
+      if player != pyhanabi.CHANCE_PLAYER_ID:
+        encoding = encoder.encode(state.observation(player, lazy=True))
+        yield player, encoding, move_uids[move_index]
+      if not state.apply_move_uids(move_uids[move_index:move_index + 1]):
+        raise ValueError("Move {} of the game record is illegal.".format(
+            move_index))
+
+  def close(self):
+    """Unmaps the file. States replayed from it stay valid."""
+    if self._data is not None:
+      self._data.close()
+      self._data = None
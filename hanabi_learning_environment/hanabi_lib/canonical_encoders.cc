@@ -16,9 +16,11 @@
 #include <cassert>
 #include <cstdlib>
 #include <iostream>
+#include <numeric>
 #include <vector>
 
 #include "canonical_encoders.h"
+#include "util.h"
 
 namespace hanabi_learning_env {
 
@@ -54,51 +56,64 @@ int HandsSectionLength(const HanabiGame& game) {
          game.NumPlayers();
 }
 
+int HandCardsLength(const HanabiGame& game) {
+  return game.HandSize() * BitsPerCard(game);
+}
+
+// Encodes the cards of another player's hand, as part of EncodeHands.
+// Returns the number of entries written to the encoding.
+template <typename Sink>
+int EncodeHandCards(const HanabiGame& game, const HanabiHand& hand,
+                    int start_offset, Sink* sink) {
+  int bits_per_card = BitsPerCard(game);
+  int num_ranks = game.NumRanks();
+
+  int offset = start_offset;
+  for (const HanabiCard& card : hand.Cards()) {
+    // Only a player's own cards can be invalid/unobserved.
+    assert(card.IsValid());
+    assert(card.Color() < game.NumColors());
+    assert(card.Rank() < num_ranks);
+    sink->Set(offset + CardIndex(card.Color(), card.Rank(), num_ranks));
+    offset += bits_per_card;
+  }
+
+  // A player's hand can have fewer cards than the initial hand size.
+  // Leave the bits for the absent cards empty.
+  return HandCardsLength(game);
+}
+
+// For each player, sets a bit if their hand is missing a card, as part of
+// EncodeHands. Returns the number of entries written to the encoding.
+template <typename Sink>
+int EncodeMissingCards(const HanabiGame& game, const HanabiObservation& obs,
+                       int start_offset, Sink* sink) {
+  const std::vector<HanabiHand>& hands = obs.Hands();
+  for (int player = 0; player < game.NumPlayers(); ++player) {
+    if (hands[player].Cards().size() < game.HandSize()) {
+      sink->Set(start_offset + player);
+    }
+  }
+  return game.NumPlayers();
+}
+
 // Enocdes cards in all other player's hands (excluding our unknown hand),
 // and whether the hand is missing a card for all players (when deck is empty.)
 // Each card in a hand is encoded with a one-hot representation using
 // <num_colors> * <num_ranks> bits (25 bits in a standard game) per card.
 // Returns the number of entries written to the encoding.
+template <typename Sink>
 int EncodeHands(const HanabiGame& game, const HanabiObservation& obs,
-                int start_offset, std::vector<int>* encoding) {
-  int bits_per_card = BitsPerCard(game);
-  int num_ranks = game.NumRanks();
+                int start_offset, Sink* sink) {
   int num_players = game.NumPlayers();
-  int hand_size = game.HandSize();
 
   int offset = start_offset;
   const std::vector<HanabiHand>& hands = obs.Hands();
   assert(hands.size() == num_players);
   for (int player = 1; player < num_players; ++player) {
-    const std::vector<HanabiCard>& cards = hands[player].Cards();
-    int num_cards = 0;
-
-    for (const HanabiCard& card : cards) {
-      // Only a player's own cards can be invalid/unobserved.
-      assert(card.IsValid());
-      assert(card.Color() < game.NumColors());
-      assert(card.Rank() < num_ranks);
-      (*encoding)[offset + CardIndex(card.Color(), card.Rank(), num_ranks)] = 1;
-
-      ++num_cards;
-      offset += bits_per_card;
-    }
-
-    // A player's hand can have fewer cards than the initial hand size.
-    // Leave the bits for the absent cards empty (adjust the offset to skip
-    // bits for the missing cards).
-    if (num_cards < hand_size) {
-      offset += (hand_size - num_cards) * bits_per_card;
-    }
-  }
-
-  // For each player, set a bit if their hand is missing a card.
-  for (int player = 0; player < num_players; ++player) {
-    if (hands[player].Cards().size() < game.HandSize()) {
-      (*encoding)[offset + player] = 1;
-    }
+    offset += EncodeHandCards(game, hands[player], offset, sink);
   }
-  offset += num_players;
+  offset += EncodeMissingCards(game, obs, offset, sink);
 
   assert(offset - start_offset == HandsSectionLength(game));
   return offset - start_offset;
@@ -120,8 +135,9 @@ int BoardSectionLength(const HanabiGame& game) {
 // We note several features use a thermometer representation instead of one-hot.
 // For example, life tokens could be: 000 (0), 100 (1), 110 (2), 111 (3).
 // Returns the number of entries written to the encoding.
+template <typename Sink>
 int EncodeBoard(const HanabiGame& game, const HanabiObservation& obs,
-                int start_offset, std::vector<int>* encoding) {
+                int start_offset, Sink* sink) {
   int num_colors = game.NumColors();
   int num_ranks = game.NumRanks();
   int num_players = game.NumPlayers();
@@ -131,7 +147,7 @@ int EncodeBoard(const HanabiGame& game, const HanabiObservation& obs,
   int offset = start_offset;
   // Encode the deck size
   for (int i = 0; i < obs.DeckSize(); ++i) {
-    (*encoding)[offset + i] = 1;
+    sink->Set(offset + i);
   }
   offset += (max_deck_size - hand_size * num_players);  // 40 in normal 2P game
 
@@ -141,7 +157,7 @@ int EncodeBoard(const HanabiGame& game, const HanabiObservation& obs,
     // fireworks[color] is the number of successfully played <color> cards.
     // If some were played, one-hot encode the highest (0-indexed) rank played
     if (fireworks[c] > 0) {
-      (*encoding)[offset + fireworks[c] - 1] = 1;
+      sink->Set(offset + fireworks[c] - 1);
     }
     offset += num_ranks;
   }
@@ -150,7 +166,7 @@ int EncodeBoard(const HanabiGame& game, const HanabiObservation& obs,
   assert(obs.InformationTokens() >= 0);
   assert(obs.InformationTokens() <= game.MaxInformationTokens());
   for (int i = 0; i < obs.InformationTokens(); ++i) {
-    (*encoding)[offset + i] = 1;
+    sink->Set(offset + i);
   }
   offset += game.MaxInformationTokens();
 
@@ -158,7 +174,7 @@ int EncodeBoard(const HanabiGame& game, const HanabiObservation& obs,
   assert(obs.LifeTokens() >= 0);
   assert(obs.LifeTokens() <= game.MaxLifeTokens());
   for (int i = 0; i < obs.LifeTokens(); ++i) {
-    (*encoding)[offset + i] = 1;
+    sink->Set(offset + i);
   }
   offset += game.MaxLifeTokens();
 
@@ -185,8 +201,9 @@ int DiscardSectionLength(const HanabiGame& game) { return game.MaxDeckSize(); }
 //   - one of the second highest rank have been discarded
 //   - the highest rank card has been discarded
 // Returns the number of entries written to the encoding.
+template <typename Sink>
 int EncodeDiscards(const HanabiGame& game, const HanabiObservation& obs,
-                   int start_offset, std::vector<int>* encoding) {
+                   int start_offset, Sink* sink) {
   int num_colors = game.NumColors();
   int num_ranks = game.NumRanks();
 
@@ -200,7 +217,7 @@ int EncodeDiscards(const HanabiGame& game, const HanabiObservation& obs,
     for (int r = 0; r < num_ranks; ++r) {
       int num_discarded = discard_counts[c * num_ranks + r];
       for (int i = 0; i < num_discarded; ++i) {
-        (*encoding)[offset + i] = 1;
+        sink->Set(offset + i);
       }
       offset += game.NumberCardInstances(c, r);
     }
@@ -233,8 +250,9 @@ int LastActionSectionLength(const HanabiGame& game) {
 //  - Position played/discarded (<hand_size> bits; one-hot)
 //  - Card played/discarded (<num_colors> * <num_ranks> bits; one-hot)
 // Returns the number of entries written to the encoding.
+template <typename Sink>
 int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
-                     int start_offset, std::vector<int>* encoding) {
+                     int start_offset, Sink* sink) {
   int num_colors = game.NumColors();
   int num_ranks = game.NumRanks();
   int num_players = game.NumPlayers();
@@ -250,22 +268,22 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
     // player_id
     // Note: no assertion here. At a terminal state, the last player could have
     // been me (player id 0).
-    (*encoding)[offset + last_move->player] = 1;
+    sink->Set(offset + last_move->player);
     offset += num_players;
 
     // move type
     switch (last_move_type) {
       case HanabiMove::Type::kPlay:
-        (*encoding)[offset] = 1;
+        sink->Set(offset);
         break;
       case HanabiMove::Type::kDiscard:
-        (*encoding)[offset + 1] = 1;
+        sink->Set(offset + 1);
         break;
       case HanabiMove::Type::kRevealColor:
-        (*encoding)[offset + 2] = 1;
+        sink->Set(offset + 2);
         break;
       case HanabiMove::Type::kRevealRank:
-        (*encoding)[offset + 3] = 1;
+        sink->Set(offset + 3);
         break;
       default:
         std::abort();
@@ -277,19 +295,19 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
         last_move_type == HanabiMove::Type::kRevealRank) {
       int8_t observer_relative_target =
           (last_move->player + last_move->move.TargetOffset()) % num_players;
-      (*encoding)[offset + observer_relative_target] = 1;
+      sink->Set(offset + observer_relative_target);
     }
     offset += num_players;
 
     // color (if hint action)
     if (last_move_type == HanabiMove::Type::kRevealColor) {
-      (*encoding)[offset + last_move->move.Color()] = 1;
+      sink->Set(offset + last_move->move.Color());
     }
     offset += num_colors;
 
     // rank (if hint action)
     if (last_move_type == HanabiMove::Type::kRevealRank) {
-      (*encoding)[offset + last_move->move.Rank()] = 1;
+      sink->Set(offset + last_move->move.Rank());
     }
     offset += num_ranks;
 
@@ -298,7 +316,7 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
         last_move_type == HanabiMove::Type::kRevealRank) {
       for (int i = 0, mask = 1; i < hand_size; ++i, mask <<= 1) {
         if ((last_move->reveal_bitmask & mask) > 0) {
-          (*encoding)[offset + i] = 1;
+          sink->Set(offset + i);
         }
       }
     }
@@ -307,7 +325,7 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
     // position (if play or discard action)
     if (last_move_type == HanabiMove::Type::kPlay ||
         last_move_type == HanabiMove::Type::kDiscard) {
-      (*encoding)[offset + last_move->move.CardIndex()] = 1;
+      sink->Set(offset + last_move->move.CardIndex());
     }
     offset += hand_size;
 
@@ -316,18 +334,18 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
         last_move_type == HanabiMove::Type::kDiscard) {
       assert(last_move->color >= 0);
       assert(last_move->rank >= 0);
-      (*encoding)[offset +
-                  CardIndex(last_move->color, last_move->rank, num_ranks)] = 1;
+      sink->Set(offset +
+                CardIndex(last_move->color, last_move->rank, num_ranks));
     }
     offset += BitsPerCard(game);
 
     // was successful and/or added information token (if play action)
     if (last_move_type == HanabiMove::Type::kPlay) {
       if (last_move->scored) {
-        (*encoding)[offset] = 1;
+        sink->Set(offset);
       }
       if (last_move->information_token) {
-        (*encoding)[offset + 1] = 1;
+        sink->Set(offset + 1);
       }
     }
     offset += 2;
@@ -337,11 +355,54 @@ int EncodeLastAction(const HanabiGame& game, const HanabiObservation& obs,
   return offset - start_offset;
 }
 
-int CardKnowledgeSectionLength(const HanabiGame& game) {
-  return game.NumPlayers() * game.HandSize() *
+int HandKnowledgeLength(const HanabiGame& game) {
+  return game.HandSize() *
          (BitsPerCard(game) + game.NumColors() + game.NumRanks());
 }
 
+int CardKnowledgeSectionLength(const HanabiGame& game) {
+  return game.NumPlayers() * HandKnowledgeLength(game);
+}
+
+// Encodes the knowledge of the cards of a hand, as part of
+// EncodeCardKnowledge. Returns the number of entries written to the encoding.
+template <typename Sink>
+int EncodeHandKnowledge(const HanabiGame& game, const HanabiHand& hand,
+                        int start_offset, Sink* sink) {
+  int bits_per_card = BitsPerCard(game);
+  int num_colors = game.NumColors();
+  int num_ranks = game.NumRanks();
+
+  int offset = start_offset;
+  for (const HanabiHand::CardKnowledge& card_knowledge : hand.Knowledge()) {
+    // Add bits for plausible card.
+    for (int color = 0; color < num_colors; ++color) {
+      if (card_knowledge.ColorPlausible(color)) {
+        for (int rank = 0; rank < num_ranks; ++rank) {
+          if (card_knowledge.RankPlausible(rank)) {
+            sink->Set(offset + CardIndex(color, rank, num_ranks));
+          }
+        }
+      }
+    }
+    offset += bits_per_card;
+
+    // Add bits for explicitly revealed colors and ranks.
+    if (card_knowledge.ColorHinted()) {
+      sink->Set(offset + card_knowledge.Color());
+    }
+    offset += num_colors;
+    if (card_knowledge.RankHinted()) {
+      sink->Set(offset + card_knowledge.Rank());
+    }
+    offset += num_ranks;
+  }
+
+  // A player's hand can have fewer cards than the initial hand size.
+  // Leave the bits for the absent cards empty.
+  return HandKnowledgeLength(game);
+}
+
 // Encode the common card knowledge.
 // For each card/position in each player's hand, including the observing player,
 // encode the possible cards that could be in that position and whether the
@@ -363,59 +424,88 @@ int CardKnowledgeSectionLength(const HanabiGame& game) {
 // Uses <num_players> * <hand_size> *
 // (<num_colors> * <num_ranks> + <num_colors> + <num_ranks>) bits.
 // Returns the number of entries written to the encoding.
+template <typename Sink>
 int EncodeCardKnowledge(const HanabiGame& game, const HanabiObservation& obs,
-                        int start_offset, std::vector<int>* encoding) {
-  int bits_per_card = BitsPerCard(game);
-  int num_colors = game.NumColors();
-  int num_ranks = game.NumRanks();
+                        int start_offset, Sink* sink) {
   int num_players = game.NumPlayers();
-  int hand_size = game.HandSize();
 
   int offset = start_offset;
   const std::vector<HanabiHand>& hands = obs.Hands();
   assert(hands.size() == num_players);
   for (int player = 0; player < num_players; ++player) {
-    const std::vector<HanabiHand::CardKnowledge>& knowledge =
-        hands[player].Knowledge();
-    int num_cards = 0;
-
-    for (const HanabiHand::CardKnowledge& card_knowledge : knowledge) {
-      // Add bits for plausible card.
-      for (int color = 0; color < num_colors; ++color) {
-        if (card_knowledge.ColorPlausible(color)) {
-          for (int rank = 0; rank < num_ranks; ++rank) {
-            if (card_knowledge.RankPlausible(rank)) {
-              (*encoding)[offset + CardIndex(color, rank, num_ranks)] = 1;
-            }
-          }
-        }
-      }
-      offset += bits_per_card;
+    offset += EncodeHandKnowledge(game, hands[player], offset, sink);
+  }
 
-      // Add bits for explicitly revealed colors and ranks.
-      if (card_knowledge.ColorHinted()) {
-        (*encoding)[offset + card_knowledge.Color()] = 1;
-      }
-      offset += num_colors;
-      if (card_knowledge.RankHinted()) {
-        (*encoding)[offset + card_knowledge.Rank()] = 1;
-      }
-      offset += num_ranks;
+  assert(offset - start_offset == CardKnowledgeSectionLength(game));
+  return offset - start_offset;
+}
 
-      ++num_cards;
-    }
+// Upper bound on the number of bits set by the encoders above.
+int CanonicalMaxActiveBits(const HanabiGame& game) {
+  int num_players = game.NumPlayers();
+  int hand_size = game.HandSize();
+  int max_active_bits =
+      (num_players - 1) * hand_size + num_players +  // hands
+      game.MaxDeckSize() - num_players * hand_size +  // deck
+      game.NumColors() +                              // fireworks
+      game.MaxInformationTokens() + game.MaxLifeTokens() +
+      DiscardSectionLength(game) +
+      // Last action: player and type, then target, color or rank, and outcome
+      // of a hint, or position, card and two flags of a play.
+      2 + std::max(2 + hand_size, 4);
+  if (game.ObservationType() != HanabiGame::kMinimal) {
+    // Plausible cards, revealed color and revealed rank.
+    max_active_bits += num_players * hand_size * (BitsPerCard(game) + 2);
+  }
+  return max_active_bits;
+}
 
-    // A player's hand can have fewer cards than the initial hand size.
-    // Leave the bits for the absent cards empty (adjust the offset to skip
-    // bits for the missing cards).
-    if (num_cards < hand_size) {
-      offset +=
-          (hand_size - num_cards) * (bits_per_card + num_colors + num_ranks);
-    }
+// Sinks receive the indices of the bits set by the section encoders, which
+// come in increasing order.
+
+// Sets bits in a zero-filled dense encoding.
+template <typename T>
+class DenseSink {
+ public:
+  explicit DenseSink(T* encoding) : encoding_(encoding) {}
+  void Set(int index) { encoding_[index] = 1; }
+
+ private:
+  T* encoding_;
+};
+
+// Lists the indices of the bits set, in an array of MaxActiveBits() entries.
+class SparseSink {
+ public:
+  explicit SparseSink(int16_t* indices) : indices_(indices) {}
+  void Set(int index) { indices_[count_++] = index; }
+  int Count() const { return count_; }
+
+ private:
+  int16_t* indices_;
+  int count_ = 0;
+};
+
+// Encodes all sections of the canonical encoding to sink, and returns the
+// encoding length.
+template <typename Sink>
+int EncodeSections(const HanabiGame& game, const HanabiObservation& obs,
+                   Sink* sink) {
+  // This offset is an index to the start of each section of the bit vector.
+  // It is incremented at the end of each section.
+  int offset = 0;
+  offset += EncodeHands(game, obs, offset, sink);
+  offset += EncodeBoard(game, obs, offset, sink);
+  offset += EncodeDiscards(game, obs, offset, sink);
+  offset += EncodeLastAction(game, obs, offset, sink);
+  if (game.ObservationType() != HanabiGame::kMinimal) {
+    offset += EncodeCardKnowledge(game, obs, offset, sink);
   }
+  return offset;
+}
 
-  assert(offset - start_offset == CardKnowledgeSectionLength(game));
-  return offset - start_offset;
+int BeliefSectionLength(const HanabiGame& game) {
+  return game.NumPlayers() * game.HandSize() * BitsPerCard(game);
 }
 
 }  // namespace
@@ -434,20 +524,227 @@ std::vector<int> CanonicalObservationEncoder::Encode(
     const HanabiObservation& obs) const {
   // Make an empty bit string of the proper size.
   std::vector<int> encoding(FlatLength(Shape()), 0);
+  DenseSink<int> sink(encoding.data());
+  int length = EncodeSections(*parent_game_, obs, &sink);
+  assert(length == encoding.size());
+  return encoding;
+}
 
-  // This offset is an index to the start of each section of the bit vector.
-  // It is incremented at the end of each section.
+void CanonicalObservationEncoder::EncodeInto(const HanabiObservation& obs,
+                                             float* encoding) const {
+  int size = FlatLength(Shape());
+  std::fill(encoding, encoding + size, 0.f);
+  DenseSink<float> sink(encoding);
+  int length = EncodeSections(*parent_game_, obs, &sink);
+  assert(length == size);
+}
+
+int CanonicalObservationEncoder::MaxActiveBits() const {
+  return CanonicalMaxActiveBits(*parent_game_);
+}
+
+int CanonicalObservationEncoder::EncodeSparse(const HanabiObservation& obs,
+                                              int16_t* indices) const {
+  SparseSink sink(indices);
+  EncodeSections(*parent_game_, obs, &sink);
+  assert(sink.Count() <= MaxActiveBits());
+  return sink.Count();
+}
+
+IncrementalCanonicalEncoder::IncrementalCanonicalEncoder(
+    const HanabiGame* parent_game)
+    : parent_game_(parent_game),
+      size_(CanonicalObservationEncoder(parent_game).Shape()[0]),
+      encodings_(parent_game->NumPlayers(), std::vector<uint8_t>(size_, 0)),
+      move_counts_(parent_game->NumPlayers(), -1) {
+  const HanabiGame& game = *parent_game_;
+  board_offset_ = HandsSectionLength(game);
+  discards_offset_ = board_offset_ + BoardSectionLength(game);
+  last_action_offset_ = discards_offset_ + DiscardSectionLength(game);
+  knowledge_offset_ = last_action_offset_ + LastActionSectionLength(game);
+}
+
+void IncrementalCanonicalEncoder::Reset() {
+  std::fill(move_counts_.begin(), move_counts_.end(), -1);
+}
+
+const uint8_t* IncrementalCanonicalEncoder::Encode(const HanabiObservation& obs,
+                                                   int player) {
+  const HanabiGame& game = *parent_game_;
+  int num_players = game.NumPlayers();
+  REQUIRE(player >= 0 && player < num_players);
+  uint8_t* encoding = encodings_[player].data();
+  DenseSink<uint8_t> sink(encoding);
+  int num_new_moves = obs.MoveCount() - move_counts_[player];
+  bool have_encoding = move_counts_[player] >= 0;
+  move_counts_[player] = obs.MoveCount();
+
+  const std::vector<HanabiHistoryItem>& last_moves = obs.LastMoves();
+  if (!have_encoding || num_new_moves <= 0 ||
+      num_new_moves > last_moves.size()) {
+    std::fill(encoding, encoding + size_, 0);
+    EncodeSections(game, obs, &sink);
+    return encoding;
+  }
+
+  // Hands that gained or lost a card, and hands that were hinted, relative
+  // to the observer.
+  std::vector<bool> cards_changed(num_players, false);
+  std::vector<bool> knowledge_changed(num_players, false);
+  bool discards_changed = false;
+  for (int i = 0; i < num_new_moves; ++i) {
+    const HanabiHistoryItem& item = last_moves[i];
+    switch (item.move.MoveType()) {
+      case HanabiMove::kDeal:
+        cards_changed[item.deal_to_player] = true;
+        break;
+      case HanabiMove::kPlay:
+      case HanabiMove::kDiscard:
+        cards_changed[item.player] = true;
+        discards_changed = discards_changed || !item.scored;
+        break;
+      case HanabiMove::kRevealColor:
+      case HanabiMove::kRevealRank:
+        knowledge_changed[(item.player + item.move.TargetOffset()) %
+                          num_players] = true;
+        break;
+      default:
+        std::abort();
+    }
+  }
+
+  const std::vector<HanabiHand>& hands = obs.Hands();
+  auto clear = [encoding](int offset, int length) {
+    std::fill(encoding + offset, encoding + offset + length, 0);
+  };
+  for (int player = 1; player < num_players; ++player) {
+    if (cards_changed[player]) {
+      int offset = (player - 1) * HandCardsLength(game);
+      clear(offset, HandCardsLength(game));
+      EncodeHandCards(game, hands[player], offset, &sink);
+    }
+  }
+  if (std::find(cards_changed.begin(), cards_changed.end(), true) !=
+      cards_changed.end()) {
+    int offset = (num_players - 1) * HandCardsLength(game);
+    clear(offset, num_players);
+    EncodeMissingCards(game, obs, offset, &sink);
+  }
+
+  clear(board_offset_, BoardSectionLength(game));
+  EncodeBoard(game, obs, board_offset_, &sink);
+  if (discards_changed) {
+    clear(discards_offset_, DiscardSectionLength(game));
+    EncodeDiscards(game, obs, discards_offset_, &sink);
+  }
+  clear(last_action_offset_, LastActionSectionLength(game));
+  EncodeLastAction(game, obs, last_action_offset_, &sink);
+
+  if (game.ObservationType() != HanabiGame::kMinimal) {
+    for (int player = 0; player < num_players; ++player) {
+      if (cards_changed[player] || knowledge_changed[player]) {
+        int offset = knowledge_offset_ + player * HandKnowledgeLength(game);
+        clear(offset, HandKnowledgeLength(game));
+        EncodeHandKnowledge(game, hands[player], offset, &sink);
+      }
+    }
+  }
+  return encoding;
+}
+
+std::vector<int> BeliefObservationEncoder::Shape() const {
+  return {canonical_encoder_.Shape()[0] + BeliefSectionLength(*parent_game_)};
+}
+
+void BeliefObservationEncoder::CardCounts(const HanabiObservation& obs,
+                                          std::vector<int>* counts) const {
+  const HanabiGame& game = *parent_game_;
+  int bits_per_card = BitsPerCard(game);
+  int num_colors = game.NumColors();
+  int num_ranks = game.NumRanks();
+  int num_players = game.NumPlayers();
+  int hand_size = game.HandSize();
+
+  // Copies of each card that the observer cannot see.
+  std::vector<int> unseen(bits_per_card);
+  for (int color = 0; color < num_colors; ++color) {
+    for (int rank = 0; rank < num_ranks; ++rank) {
+      unseen[CardIndex(color, rank, num_ranks)] =
+          game.NumberCardInstances(color, rank);
+    }
+  }
+  for (const HanabiCard& card : obs.DiscardPile()) {
+    --unseen[CardIndex(card.Color(), card.Rank(), num_ranks)];
+  }
+  const std::vector<int>& fireworks = obs.Fireworks();
+  for (int color = 0; color < num_colors; ++color) {
+    for (int rank = 0; rank < fireworks[color]; ++rank) {
+      --unseen[CardIndex(color, rank, num_ranks)];
+    }
+  }
+  const std::vector<HanabiHand>& hands = obs.Hands();
+  for (int player = 1; player < num_players; ++player) {
+    for (const HanabiCard& card : hands[player].Cards()) {
+      --unseen[CardIndex(card.Color(), card.Rank(), num_ranks)];
+    }
+  }
+
+  counts->assign(BeliefSectionLength(game), 0);
   int offset = 0;
-  offset += EncodeHands(*parent_game_, obs, offset, &encoding);
-  offset += EncodeBoard(*parent_game_, obs, offset, &encoding);
-  offset += EncodeDiscards(*parent_game_, obs, offset, &encoding);
-  offset += EncodeLastAction(*parent_game_, obs, offset, &encoding);
-  if (parent_game_->ObservationType() != HanabiGame::kMinimal) {
-    offset += EncodeCardKnowledge(*parent_game_, obs, offset, &encoding);
+  std::vector<int> player_unseen;
+  for (int player = 0; player < num_players; ++player) {
+    // A player does not see their own cards either.
+    player_unseen = unseen;
+    if (player > 0) {
+      for (const HanabiCard& card : hands[player].Cards()) {
+        ++player_unseen[CardIndex(card.Color(), card.Rank(), num_ranks)];
+      }
+    }
+    const std::vector<HanabiHand::CardKnowledge>& knowledge =
+        hands[player].Knowledge();
+    for (const HanabiHand::CardKnowledge& card_knowledge : knowledge) {
+      for (int color = 0; color < num_colors; ++color) {
+        if (!card_knowledge.ColorPlausible(color)) {
+          continue;
+        }
+        for (int rank = 0; rank < num_ranks; ++rank) {
+          if (card_knowledge.RankPlausible(rank)) {
+            int index = CardIndex(color, rank, num_ranks);
+            (*counts)[offset + index] = player_unseen[index];
+          }
+        }
+      }
+      offset += bits_per_card;
+    }
+    offset += (hand_size - knowledge.size()) * bits_per_card;
   }
+  assert(offset == counts->size());
+}
 
-  assert(offset == encoding.size());
+std::vector<int> BeliefObservationEncoder::Encode(
+    const HanabiObservation& obs) const {
+  std::vector<int> encoding = canonical_encoder_.Encode(obs);
+  std::vector<int> counts;
+  CardCounts(obs, &counts);
+  encoding.insert(encoding.end(), counts.begin(), counts.end());
   return encoding;
 }
 
+void BeliefObservationEncoder::EncodeInto(const HanabiObservation& obs,
+                                          float* encoding) const {
+  canonical_encoder_.EncodeInto(obs, encoding);
+  encoding += canonical_encoder_.Shape()[0];
+
+  std::vector<int> counts;
+  CardCounts(obs, &counts);
+  int bits_per_card = BitsPerCard(*parent_game_);
+  for (int start = 0; start < counts.size(); start += bits_per_card) {
+    int total = std::accumulate(counts.begin() + start,
+                                counts.begin() + start + bits_per_card, 0);
+    for (int i = start; i < start + bits_per_card; ++i) {
+      encoding[i] = total > 0 ? static_cast<float>(counts[i]) / total : 0.f;
+    }
+  }
+}
+
 }  // namespace hanabi_learning_env
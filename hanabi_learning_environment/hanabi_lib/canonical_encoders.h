@@ -18,6 +18,7 @@
 #ifndef __CANONICAL_ENCODERS_H__
 #define __CANONICAL_ENCODERS_H__
 
+#include <cstdint>
 #include <vector>
 
 #include "hanabi_game.h"
@@ -34,6 +35,15 @@ class CanonicalObservationEncoder : public ObservationEncoder {
 
   std::vector<int> Shape() const override;
   std::vector<int> Encode(const HanabiObservation& obs) const override;
+  void EncodeInto(const HanabiObservation& obs,
+                  float* encoding) const override;
+
+  // Upper bound on the number of bits set in an encoding.
+  int MaxActiveBits() const;
+  // Writes the indices of the bits set in the encoding, in increasing order,
+  // to indices, which must have room for MaxActiveBits() entries. Returns the
+  // number of indices written.
+  int EncodeSparse(const HanabiObservation& obs, int16_t* indices) const;
 
   ObservationEncoder::Type type() const override {
     return ObservationEncoder::Type::kCanonical;
@@ -43,6 +53,75 @@ class CanonicalObservationEncoder : public ObservationEncoder {
   const HanabiGame* parent_game_ = nullptr;
 };
 
+// Canonical encoder that keeps the last encoding of each player. Given the
+// next observation of a player, it only re-encodes the sections changed by the
+// moves made since their last encoding, which it finds in LastMoves(): the
+// board and last action always, the discard pile after discards and misplays,
+// and the cards and card knowledge of the hands that were dealt to, played or
+// discarded from, or hinted. Other observations are encoded in full.
+//
+// Observations of a player must come from a single game, as they are matched
+// by MoveCount() only. Call Reset() before encoding another game.
+class IncrementalCanonicalEncoder {
+ public:
+  explicit IncrementalCanonicalEncoder(const HanabiGame* parent_game);
+
+  // Length of an encoding, as CanonicalObservationEncoder::Shape()[0].
+  int Size() const { return size_; }
+  // Returns the canonical encoding of obs, observed by player, as Size()
+  // bytes of 0 or 1. The bytes are owned by the encoder, and hold the
+  // encoding until the next call for the same player or Reset().
+  const uint8_t* Encode(const HanabiObservation& obs, int player);
+  // Forgets the last encodings, so that the next ones are encoded in full.
+  void Reset();
+
+ private:
+  const HanabiGame* parent_game_ = nullptr;
+  int size_;
+  // Start of the sections of the encoding, after the hands.
+  int board_offset_;
+  int discards_offset_;
+  int last_action_offset_;
+  int knowledge_offset_;
+  // Last encoding of each player, and the move count of its observation, or
+  // -1 if there is none.
+  std::vector<std::vector<uint8_t>> encodings_;
+  std::vector<int> move_counts_;
+};
+
+// The canonical encoding, followed by a belief over the identity of every card
+// in every hand. For each player, relative to the observer, and each position
+// in their hand, <num_colors> * <num_ranks> values in color-major order give
+// the probability of each card being there, given the card knowledge and the
+// cards that both the observer and that player can see: the discard pile, the
+// fireworks, and the hands of the other players. Positions without a card are
+// all zero.
+//
+// Encode() gives the unnormalized beliefs, as the number of copies of each
+// card that could be there; EncodeInto() gives the probabilities.
+class BeliefObservationEncoder : public ObservationEncoder {
+ public:
+  explicit BeliefObservationEncoder(const HanabiGame* parent_game)
+      : parent_game_(parent_game), canonical_encoder_(parent_game) {}
+
+  std::vector<int> Shape() const override;
+  std::vector<int> Encode(const HanabiObservation& obs) const override;
+  void EncodeInto(const HanabiObservation& obs,
+                  float* encoding) const override;
+
+  ObservationEncoder::Type type() const override {
+    return ObservationEncoder::Type::kBelief;
+  }
+
+ private:
+  // Writes the number of copies of each card that could be at each position,
+  // as described above, to counts.
+  void CardCounts(const HanabiObservation& obs, std::vector<int>* counts) const;
+
+  const HanabiGame* parent_game_ = nullptr;
+  CanonicalObservationEncoder canonical_encoder_;
+};
+
 }  // namespace hanabi_learning_env
 
 #endif
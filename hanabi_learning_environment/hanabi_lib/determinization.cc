@@ -0,0 +1,161 @@
+// Copyright 2018 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    https://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "determinization.h"
+
+#include <algorithm>
+#include <limits>
+#include <numeric>
+
+#include "util.h"
+
+namespace hanabi_learning_env {
+
+namespace {
+// Number of times a hand is resampled from scratch when hints cannot be
+// satisfied by the cards left after the first draws.
+constexpr int kMaxHandAttempts = 100;
+
+// Returns index of a card type drawn with probability proportional to
+// weights, which must have a positive sum.
+int SampleIndex(const std::vector<double>& weights, double sum,
+                std::mt19937* rng) {
+  std::uniform_real_distribution<double> dist(0.0, sum);
+  double target = dist(*rng);
+  int last_positive = -1;
+  for (int index = 0; index < weights.size(); ++index) {
+    if (weights[index] > 0) {
+      last_positive = index;
+      target -= weights[index];
+      if (target < 0) {
+        return index;
+      }
+    }
+  }
+  // Rounding error.
+  return last_positive;
+}
+}  // namespace
+
+std::vector<HanabiCard> SampleObserverHand(
+    const HanabiObservation& observation,
+    const std::vector<double>* card_weights, std::mt19937* rng) {
+  const HanabiGame* game = observation.ParentGame();
+  const int num_colors = game->NumColors();
+  const int num_ranks = game->NumRanks();
+  const int num_card_types = num_colors * num_ranks;
+  const HanabiHand& hand = observation.Hands()[0];
+  const int hand_size = hand.Cards().size();
+  REQUIRE(card_weights == nullptr ||
+          card_weights->size() == hand_size * num_card_types);
+
+  // Instances of each card type not visible to the observer.
+  std::vector<int> unseen(num_card_types);
+  for (int color = 0; color < num_colors; ++color) {
+    for (int rank = 0; rank < num_ranks; ++rank) {
+      unseen[color * num_ranks + rank] =
+          game->NumberCardInstances(color, rank) -
+          (rank < observation.Fireworks()[color] ? 1 : 0);
+    }
+  }
+  for (const HanabiCard& card : observation.DiscardPile()) {
+    --unseen[card.Color() * num_ranks + card.Rank()];
+  }
+  for (int offset = 1; offset < observation.Hands().size(); ++offset) {
+    for (const HanabiCard& card : observation.Hands()[offset].Cards()) {
+      --unseen[card.Color() * num_ranks + card.Rank()];
+    }
+  }
+
+  // Per hand card, 1 for card types allowed by the hints and 0 otherwise.
+  std::vector<std::vector<double>> plausible(
+      hand_size, std::vector<double>(num_card_types, 0.0));
+  std::vector<int> num_plausible(hand_size, 0);
+  for (int index = 0; index < hand_size; ++index) {
+    const auto& knowledge = hand.Knowledge()[index];
+    for (int color = 0; color < num_colors; ++color) {
+      for (int rank = 0; rank < num_ranks; ++rank) {
+        if (knowledge.ColorPlausible(color) && knowledge.RankPlausible(rank)) {
+          plausible[index][color * num_ranks + rank] = 1.0;
+          ++num_plausible[index];
+        }
+      }
+    }
+  }
+  // Draw the most constrained cards first, they are the most likely to run
+  // out of candidates.
+  std::vector<int> order(hand_size);
+  std::iota(order.begin(), order.end(), 0);
+  std::stable_sort(order.begin(), order.end(), [&num_plausible](int a, int b) {
+    return num_plausible[a] < num_plausible[b];
+  });
+
+  std::vector<HanabiCard> cards(hand_size);
+  std::vector<double> weights(num_card_types);
+  for (int attempt = 0; attempt < kMaxHandAttempts; ++attempt) {
+    std::vector<int> remaining = unseen;
+    bool consistent = true;
+    for (int index : order) {
+      double sum = 0;
+      for (int type = 0; type < num_card_types; ++type) {
+        weights[type] = remaining[type] * plausible[index][type];
+        sum += weights[type];
+      }
+      if (sum <= 0) {
+        consistent = false;
+        break;
+      }
+      if (card_weights != nullptr) {
+        double weighted_sum = 0;
+        for (int type = 0; type < num_card_types; ++type) {
+          weighted_sum += weights[type] *
+                          (*card_weights)[index * num_card_types + type];
+        }
+        if (weighted_sum > 0) {
+          for (int type = 0; type < num_card_types; ++type) {
+            weights[type] *= (*card_weights)[index * num_card_types + type];
+          }
+          sum = weighted_sum;
+        }
+      }
+      int type = SampleIndex(weights, sum, rng);
+      --remaining[type];
+      cards[index] = HanabiCard(type / num_ranks, type % num_ranks);
+    }
+    if (consistent) {
+      return cards;
+    }
+  }
+  return std::vector<HanabiCard>();
+}
+
+std::vector<HanabiState> SampleDeterminizations(
+    const HanabiObservation& observation, int num_samples,
+    const std::vector<double>* card_weights, std::mt19937* rng) {
+  std::vector<HanabiState> states;
+  states.reserve(num_samples);
+  std::uniform_int_distribution<int> seed_dist(
+      0, std::numeric_limits<int>::max());
+  for (int i = 0; i < num_samples; ++i) {
+    std::vector<HanabiCard> hand =
+        SampleObserverHand(observation, card_weights, rng);
+    if (hand.size() != observation.Hands()[0].Cards().size()) {
+      break;
+    }
+    states.emplace_back(observation, hand, seed_dist(*rng));
+  }
+  return states;
+}
+
+}  // namespace hanabi_learning_env
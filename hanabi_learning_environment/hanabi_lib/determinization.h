@@ -0,0 +1,52 @@
+// Copyright 2018 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    https://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// Sampling of complete game states consistent with an agent's observation,
+// for search agents that need concrete worlds to play forward.
+
+#ifndef __DETERMINIZATION_H__
+#define __DETERMINIZATION_H__
+
+#include <random>
+#include <vector>
+
+#include "hanabi_card.h"
+#include "hanabi_observation.h"
+#include "hanabi_state.h"
+
+namespace hanabi_learning_env {
+
+// Sample the cards in the observing player's hand, oldest first.
+// Cards are drawn one at a time with probability proportional to the number
+// of unseen instances of the card, times 0 if the card contradicts the hints
+// received, times card_weights if it is not null. card_weights holds a
+// non-negative weight per hand card and card type, at index
+// (card_index * NumColors() + color) * NumRanks() + rank.
+// Weights that rule out every remaining plausible card for a hand card are
+// ignored for that card. Returns an empty vector if no consistent hand was
+// found, which only happens if the hints cannot all be satisfied.
+std::vector<HanabiCard> SampleObserverHand(
+    const HanabiObservation& observation,
+    const std::vector<double>* card_weights, std::mt19937* rng);
+
+// Sample up to num_samples states consistent with observation, see
+// SampleObserverHand and the HanabiState observation constructor. Each state
+// gets its own seed drawn from rng for dealing the rest of the deck.
+std::vector<HanabiState> SampleDeterminizations(
+    const HanabiObservation& observation, int num_samples,
+    const std::vector<double>* card_weights, std::mt19937* rng);
+
+}  // namespace hanabi_learning_env
+
+#endif
@@ -14,6 +14,9 @@
 
 #include "hanabi_game.h"
 
+#include <algorithm>
+#include <limits>
+
 #include "util.h"
 
 namespace hanabi_learning_env {
@@ -24,6 +27,8 @@ const int kDefaultPlayers = 2;
 const int kInformationTokens = 8;
 const int kLifeTokens = 3;
 const bool kDefaultRandomStart = false;
+// Seed of the Zobrist keys.
+const uint64_t kZobristSeed = 0x48616e6162690001;
 }  // namespace
 
 HanabiGame::HanabiGame(
@@ -64,6 +69,35 @@ HanabiGame::HanabiGame(
   for (int uid = 0; uid < MaxChanceOutcomes(); ++uid) {
     chance_outcomes_.push_back(ConstructChanceOutcome(uid));
   }
+  InitZobristKeys();
+}
+
+void HanabiGame::InitZobristKeys() {
+  // Fixed seed, so that keys do not depend on the game's "seed" parameter.
+  std::mt19937_64 key_rng(kZobristSeed);
+  auto fill = [&key_rng](int size, std::vector<uint64_t>* keys) {
+    keys->resize(size);
+    for (uint64_t& key : *keys) {
+      key = key_rng();
+    }
+  };
+  max_card_instances_ = 0;
+  for (int color = 0; color < num_colors_; ++color) {
+    for (int rank = 0; rank < num_ranks_; ++rank) {
+      max_card_instances_ =
+          std::max(max_card_instances_, NumberCardInstances(color, rank));
+    }
+  }
+  fill(num_players_ * hand_size_ * num_colors_ * num_ranks_,
+       &hand_card_keys_);
+  fill(num_players_ * hand_size_ * NumKnowledgeFeatures(), &knowledge_keys_);
+  fill(num_colors_ * (num_ranks_ + 1), &firework_keys_);
+  fill(max_information_tokens_ + 1, &information_tokens_keys_);
+  fill(max_life_tokens_ + 1, &life_tokens_keys_);
+  fill(num_colors_ * num_ranks_ * (max_card_instances_ + 1),
+       &deck_count_keys_);
+  fill(num_players_ + 1, &cur_player_keys_);
+  fill(num_players_ + 1, &turns_to_play_keys_);
 }
 
 int HanabiGame::MaxMoves() const {
@@ -106,9 +140,17 @@ int HanabiGame::GetChanceOutcomeUid(HanabiMove move) const {
 HanabiMove HanabiGame::PickRandomChance(
     const std::pair<std::vector<HanabiMove>, std::vector<double>>&
         chance_outcomes) const {
+  std::lock_guard<std::mutex> lock(rng_mutex_);
+  return PickRandomChance(chance_outcomes, &rng_);
+}
+
+HanabiMove HanabiGame::PickRandomChance(
+    const std::pair<std::vector<HanabiMove>, std::vector<double>>&
+        chance_outcomes,
+    std::mt19937* rng) const {
   std::discrete_distribution<std::mt19937::result_type> dist(
       chance_outcomes.second.begin(), chance_outcomes.second.end());
-  return chance_outcomes.first[dist(rng_)];
+  return chance_outcomes.first[dist(*rng)];
 }
 
 std::unordered_map<std::string, std::string> HanabiGame::Parameters() const {
@@ -136,14 +178,32 @@ int HanabiGame::NumberCardInstances(int color, int rank) const {
 }
 
 int HanabiGame::GetSampledStartPlayer() const {
+  std::lock_guard<std::mutex> lock(rng_mutex_);
+  return GetSampledStartPlayer(&rng_);
+}
+
+int HanabiGame::GetSampledStartPlayer(std::mt19937* rng) const {
   if (random_start_player_) {
     std::uniform_int_distribution<std::mt19937::result_type> dist(
         0, num_players_ - 1);
-    return dist(rng_);
+    return dist(*rng);
   }
   return 0;
 }
 
+int HanabiGame::SampleStateSeed() const {
+  std::lock_guard<std::mutex> lock(rng_mutex_);
+  // Seeds are non-negative ints, so that they can be passed around as "seed"
+  // parameter values.
+  std::uniform_int_distribution<int> dist(0, std::numeric_limits<int>::max());
+  return dist(rng_);
+}
+
+void HanabiGame::SetSeed(int seed) {
+  std::lock_guard<std::mutex> lock(rng_mutex_);
+  rng_.seed(seed);
+}
+
 int HanabiGame::HandSizeFromRules() const {
   if (num_players_ < 4) {
     return 5;
@@ -15,6 +15,8 @@
 #ifndef __HANABI_GAME_H__
 #define __HANABI_GAME_H__
 
+#include <cstdint>
+#include <mutex>
 #include <random>
 #include <string>
 #include <unordered_map>
@@ -60,6 +62,11 @@ class HanabiGame {
   HanabiMove PickRandomChance(
       const std::pair<std::vector<HanabiMove>, std::vector<double>>&
           chance_outcomes) const;
+  // As above, drawing from rng instead of the game's generator.
+  HanabiMove PickRandomChance(
+      const std::pair<std::vector<HanabiMove>, std::vector<double>>&
+          chance_outcomes,
+      std::mt19937* rng) const;
 
   std::unordered_map<std::string, std::string> Parameters() const;
   int MinPlayers() const { return 2; }
@@ -84,6 +91,51 @@ class HanabiGame {
 
   // Get the first player to act. Might be randomly generated at each call.
   int GetSampledStartPlayer() const;
+  // As above, drawing from rng instead of the game's generator.
+  int GetSampledStartPlayer(std::mt19937* rng) const;
+  // Draw a seed for a new state's random number generator. Seeds are drawn
+  // from the game's generator, so the sequence of seeds is determined by the
+  // "seed" parameter.
+  int SampleStateSeed() const;
+  // Reseed the game's generator, e.g. in a process forked from another
+  // process holding the game, which would otherwise draw the same numbers.
+  void SetSeed(int seed);
+
+  // Random keys for the Zobrist hash of HanabiState. Keys only depend on the
+  // game parameters other than "seed", so hashes can be compared between
+  // games and processes with the same rules.
+  uint64_t HandCardKey(int player, int position, int color, int rank) const {
+    return hand_card_keys_[((player * hand_size_ + position) * num_colors_ +
+                            color) * num_ranks_ + rank];
+  }
+  // Knowledge features are, in order: color c ruled out, rank r ruled out,
+  // color hinted, rank hinted.
+  int NumKnowledgeFeatures() const { return num_colors_ + num_ranks_ + 2; }
+  uint64_t KnowledgeKey(int player, int position, int feature) const {
+    return knowledge_keys_[(player * hand_size_ + position) *
+                               NumKnowledgeFeatures() + feature];
+  }
+  uint64_t FireworkKey(int color, int level) const {
+    return firework_keys_[color * (num_ranks_ + 1) + level];
+  }
+  uint64_t InformationTokensKey(int tokens) const {
+    return information_tokens_keys_[tokens];
+  }
+  uint64_t LifeTokensKey(int tokens) const { return life_tokens_keys_[tokens]; }
+  uint64_t DeckCountKey(int color, int rank, int count) const {
+    return deck_count_keys_[(color * num_ranks_ + rank) *
+                                (max_card_instances_ + 1) + count];
+  }
+  // Accepts kChancePlayerId.
+  uint64_t CurPlayerKey(int player) const {
+    return cur_player_keys_[player + 1];
+  }
+  uint64_t TurnsToPlayKey(int turns) const {
+    return turns_to_play_keys_[turns < 0 ? 0 : turns];
+  }
+
+  // All methods are safe to call concurrently from several threads: the game
+  // is immutable apart from its generator, which is guarded by a mutex.
 
  private:
   // Calculating max moves by move type.
@@ -95,6 +147,7 @@ class HanabiGame {
   int HandSizeFromRules() const;
   HanabiMove ConstructMove(int uid) const;
   HanabiMove ConstructChanceOutcome(int uid) const;
+  void InitZobristKeys();
 
   // Table of all possible moves in this game.
   std::vector<HanabiMove> moves_;
@@ -112,6 +165,17 @@ class HanabiGame {
   bool random_start_player_ = false;
   AgentObservationType observation_type_ = kCardKnowledge;
   mutable std::mt19937 rng_;
+  mutable std::mutex rng_mutex_;
+  // Zobrist keys, see HandCardKey and following.
+  int max_card_instances_ = -1;
+  std::vector<uint64_t> hand_card_keys_;
+  std::vector<uint64_t> knowledge_keys_;
+  std::vector<uint64_t> firework_keys_;
+  std::vector<uint64_t> information_tokens_keys_;
+  std::vector<uint64_t> life_tokens_keys_;
+  std::vector<uint64_t> deck_count_keys_;
+  std::vector<uint64_t> cur_player_keys_;
+  std::vector<uint64_t> turns_to_play_keys_;
 };
 
 }  // namespace hanabi_learning_env
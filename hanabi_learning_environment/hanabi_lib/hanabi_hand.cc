@@ -93,6 +93,19 @@ void HanabiHand::RemoveFromHand(int card_index,
   card_knowledge_.erase(card_knowledge_.begin() + card_index);
 }
 
+void HanabiHand::InsertCard(int card_index, HanabiCard card,
+                            const CardKnowledge& knowledge) {
+  REQUIRE(card.IsValid());
+  REQUIRE(card_index >= 0 && card_index <= cards_.size());
+  cards_.insert(cards_.begin() + card_index, card);
+  card_knowledge_.insert(card_knowledge_.begin() + card_index, knowledge);
+}
+
+void HanabiHand::SetKnowledge(const std::vector<CardKnowledge>& knowledge) {
+  REQUIRE(knowledge.size() == cards_.size());
+  card_knowledge_ = knowledge;
+}
+
 uint8_t HanabiHand::RevealColor(const int color) {
   uint8_t mask = 0;
   assert(cards_.size() <= 8);  // More than 8 cards is currently not supported.
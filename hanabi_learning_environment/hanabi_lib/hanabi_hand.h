@@ -105,6 +105,12 @@ class HanabiHand {
   // Remove card_index card from hand. Put in discard_pile if not nullptr
   // (pushes the card to the back of the discard_pile vector).
   void RemoveFromHand(int card_index, std::vector<HanabiCard>* discard_pile);
+  // Insert card at card_index, shifting newer cards up. Reverts
+  // RemoveFromHand, and AddCard when card_index is the hand size.
+  void InsertCard(int card_index, HanabiCard card,
+                  const CardKnowledge& knowledge);
+  // Replace the knowledge about all cards. Reverts a reveal move.
+  void SetKnowledge(const std::vector<CardKnowledge>& knowledge);
   // Make cards with the given rank visible.
   // Returns new information bitmask, bit_i set if card_i color was revealed
   // and was previously unknown.
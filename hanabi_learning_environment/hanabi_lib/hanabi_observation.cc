@@ -50,31 +50,72 @@ void ChangeHistoryItemToObserverRelative(int observer_pid, int num_players,
 }  // namespace
 
 HanabiObservation::HanabiObservation(const HanabiState& state,
-                                     int observing_player)
+                                     int observing_player, bool lazy)
     : cur_player_offset_(PlayerToOffset(state.CurPlayer(), observing_player,
                                         state.ParentGame()->NumPlayers())),
-      discard_pile_(state.DiscardPile()),
       fireworks_(state.Fireworks()),
       deck_size_(state.Deck().Size()),
       information_tokens_(state.InformationTokens()),
       life_tokens_(state.LifeTokens()),
-      legal_moves_(state.LegalMoves(observing_player)),
-      parent_game_(state.ParentGame()) {
+      move_count_(state.MoveCount()),
+      parent_game_(state.ParentGame()),
+      state_(&state),
+      observing_player_(observing_player),
+      hands_copied_(false),
+      discard_pile_copied_(false),
+      last_moves_copied_(false),
+      legal_moves_copied_(false) {
   REQUIRE(observing_player >= 0 &&
           observing_player < state.ParentGame()->NumPlayers());
-  hands_.reserve(state.Hands().size());
+  if (!lazy) {
+    Snapshot();
+  }
+}
+
+void HanabiObservation::Snapshot() {
+  if (state_ == nullptr) {
+    return;
+  }
+  Hands();
+  DiscardPile();
+  LastMoves();
+  LegalMoves();
+  state_ = nullptr;
+}
+
+const HanabiState& HanabiObservation::ObservedState() const {
+  REQUIRE(state_ != nullptr);
+  // Catches most changes: moves applied since, but not moves undone and
+  // replaced by as many others.
+  REQUIRE(state_->MoveCount() == move_count_);
+  return *state_;
+}
+
+void HanabiObservation::CopyHands() const {
+  const HanabiState& state = ObservedState();
+  const int num_players = parent_game_->NumPlayers();
   const bool hide_knowledge =
-      state.ParentGame()->ObservationType() == HanabiGame::kMinimal;
-  const bool show_cards = state.ParentGame()->ObservationType() == HanabiGame::kSeer;
-  hands_.push_back(
-      HanabiHand(state.Hands()[observing_player], !show_cards, hide_knowledge));
-  for (int offset = 1; offset < state.ParentGame()->NumPlayers(); ++offset) {
-    hands_.push_back(HanabiHand(state.Hands()[(observing_player + offset) %
-                                              state.ParentGame()->NumPlayers()],
-                                false, hide_knowledge));
+      parent_game_->ObservationType() == HanabiGame::kMinimal;
+  const bool show_cards = parent_game_->ObservationType() == HanabiGame::kSeer;
+  hands_.reserve(num_players);
+  hands_.push_back(HanabiHand(state.Hands()[observing_player_], !show_cards,
+                              hide_knowledge));
+  for (int offset = 1; offset < num_players; ++offset) {
+    hands_.push_back(
+        HanabiHand(state.Hands()[(observing_player_ + offset) % num_players],
+                   false, hide_knowledge));
   }
+  hands_copied_ = true;
+}
+
+void HanabiObservation::CopyDiscardPile() const {
+  discard_pile_ = ObservedState().DiscardPile();
+  discard_pile_copied_ = true;
+}
 
-  const auto& history = state.MoveHistory();
+void HanabiObservation::CopyLastMoves() const {
+  const bool show_cards = parent_game_->ObservationType() == HanabiGame::kSeer;
+  const auto& history = ObservedState().MoveHistory();
   auto start = std::find_if(history.begin(), history.end(),
                             [](const HanabiHistoryItem& item) {
                               return item.player != kChancePlayerId;
@@ -82,14 +123,19 @@ HanabiObservation::HanabiObservation(const HanabiState& state,
   std::reverse_iterator<decltype(start)> rend(start);
   for (auto it = history.rbegin(); it != rend; ++it) {
     last_moves_.push_back(*it);
-    ChangeHistoryItemToObserverRelative(observing_player,
-                                        state.ParentGame()->NumPlayers(),
-                                        show_cards,
+    ChangeHistoryItemToObserverRelative(observing_player_,
+                                        parent_game_->NumPlayers(), show_cards,
                                         &last_moves_.back());
-    if (it->player == observing_player) {
+    if (it->player == observing_player_) {
       break;
     }
   }
+  last_moves_copied_ = true;
+}
+
+void HanabiObservation::CopyLegalMoves() const {
+  legal_moves_ = ObservedState().LegalMoves(observing_player_);
+  legal_moves_copied_ = true;
 }
 
 std::string HanabiObservation::ToString() const {
@@ -102,19 +148,21 @@ std::string HanabiObservation::ToString() const {
     result += std::to_string(fireworks_[i]) + " ";
   }
   result += "\nHands:\n";
-  for (int i = 0; i < hands_.size(); ++i) {
+  const std::vector<HanabiHand>& hands = Hands();
+  for (int i = 0; i < hands.size(); ++i) {
     if (i > 0) {
       result += "-----\n";
     }
     if (i == CurPlayerOffset()) {
       result += "Cur player\n";
     }
-    result += hands_[i].ToString();
+    result += hands[i].ToString();
   }
   result += "Deck size: " + std::to_string(DeckSize()) + "\n";
   result += "Discards:";
-  for (int i = 0; i < discard_pile_.size(); ++i) {
-    result += " " + discard_pile_[i].ToString();
+  const std::vector<HanabiCard>& discard_pile = DiscardPile();
+  for (int i = 0; i < discard_pile.size(); ++i) {
+    result += " " + discard_pile[i].ToString();
   }
   return result;
 }
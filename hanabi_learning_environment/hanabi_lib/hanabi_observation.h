@@ -30,7 +30,17 @@ namespace hanabi_learning_env {
 // Agent observation of a HanabiState
 class HanabiObservation {
  public:
-  HanabiObservation(const HanabiState& state, int observing_player);
+  HanabiObservation(const HanabiState& state, int observing_player)
+      : HanabiObservation(state, observing_player, false) {}
+  // If lazy, the observation references state, and only copies the hands,
+  // discard pile, last moves and legal moves from it when they are first
+  // accessed. The state must outlive the observation and must not change,
+  // unless Snapshot() is called first.
+  HanabiObservation(const HanabiState& state, int observing_player, bool lazy);
+
+  // Copies from the state whatever was not copied yet, so that the
+  // observation no longer references it.
+  void Snapshot();
 
   std::string ToString() const;
 
@@ -39,9 +49,19 @@ class HanabiObservation {
   // observed hands are in relative order, with index 1 being the
   // first player clock-wise from observing_player. hands[0][] has
   // invalid cards as players don't see their own cards.
-  const std::vector<HanabiHand>& Hands() const { return hands_; }
+  const std::vector<HanabiHand>& Hands() const {
+    if (!hands_copied_) {
+      CopyHands();
+    }
+    return hands_;
+  }
   // The element at the back is the most recent discard.
-  const std::vector<HanabiCard>& DiscardPile() const { return discard_pile_; }
+  const std::vector<HanabiCard>& DiscardPile() const {
+    if (!discard_pile_copied_) {
+      CopyDiscardPile();
+    }
+    return discard_pile_;
+  }
   const std::vector<int>& Fireworks() const { return fireworks_; }
   int DeckSize() const { return deck_size_; }  // number of remaining cards
   const HanabiGame* ParentGame() const { return parent_game_; }
@@ -50,11 +70,21 @@ class HanabiObservation {
   // Move targets are relative to observing_player not acting_player.
   // Note that the deal moves are included in this vector.
   const std::vector<HanabiHistoryItem>& LastMoves() const {
+    if (!last_moves_copied_) {
+      CopyLastMoves();
+    }
     return last_moves_;
   }
   int InformationTokens() const { return information_tokens_; }
   int LifeTokens() const { return life_tokens_; }
-  const std::vector<HanabiMove>& LegalMoves() const { return legal_moves_; }
+  const std::vector<HanabiMove>& LegalMoves() const {
+    if (!legal_moves_copied_) {
+      CopyLegalMoves();
+    }
+    return legal_moves_;
+  }
+  // Number of moves made in the game so far, including chance moves.
+  int MoveCount() const { return move_count_; }
 
   // returns true if card with color and rank can be played on fireworks pile
   bool CardPlayableOnFireworks(int color, int rank) const;
@@ -63,16 +93,33 @@ class HanabiObservation {
   }
 
  private:
+  // Copy members of a lazy observation from the state.
+  void CopyHands() const;
+  void CopyDiscardPile() const;
+  void CopyLastMoves() const;
+  void CopyLegalMoves() const;
+  // Returns the observed state of a lazy observation, checking that it has
+  // not changed since the observation was built.
+  const HanabiState& ObservedState() const;
+
   int cur_player_offset_;  // offset of current_player from observing_player
-  std::vector<HanabiHand> hands_;         // observing player is element 0
-  std::vector<HanabiCard> discard_pile_;  // back is most recent discard
+  mutable std::vector<HanabiHand> hands_;  // observing player is element 0
+  mutable std::vector<HanabiCard> discard_pile_;  // back is most recent discard
   std::vector<int> fireworks_;
   int deck_size_;
-  std::vector<HanabiHistoryItem> last_moves_;
+  mutable std::vector<HanabiHistoryItem> last_moves_;
   int information_tokens_;
   int life_tokens_;
-  std::vector<HanabiMove> legal_moves_;  // list of legal moves
+  mutable std::vector<HanabiMove> legal_moves_;  // list of legal moves
+  int move_count_;
   const HanabiGame* parent_game_ = nullptr;
+  // Lazy observations only: the observed state, until Snapshot().
+  const HanabiState* state_ = nullptr;
+  int observing_player_;
+  mutable bool hands_copied_ = true;
+  mutable bool discard_pile_copied_ = true;
+  mutable bool last_moves_copied_ = true;
+  mutable bool legal_moves_copied_ = true;
 };
 
 }  // namespace hanabi_learning_env
@@ -18,6 +18,7 @@
 #include <cassert>
 #include <numeric>
 
+#include "hanabi_observation.h"
 #include "util.h"
 
 namespace hanabi_learning_env {
@@ -64,15 +65,27 @@ HanabiState::HanabiDeck::HanabiDeck(const HanabiGame& game)
 }
 
 HanabiCard HanabiState::HanabiDeck::DealCard(std::mt19937* rng) {
+  HanabiCard card = SampleCard(rng);
+  if (!card.IsValid()) {
+    return card;
+  }
+  return DealCard(card.Color(), card.Rank());
+}
+
+HanabiCard HanabiState::HanabiDeck::SampleCard(std::mt19937* rng) const {
   if (Empty()) {
     return HanabiCard();
   }
-  std::discrete_distribution<std::mt19937::result_type> dist(
-      card_count_.begin(), card_count_.end());
-  int index = dist(*rng);
+  // Pick one of the remaining card instances, then find its card type by
+  // walking the counts. Avoids building a distribution for every deal.
+  std::uniform_int_distribution<int> dist(0, total_count_ - 1);
+  int instance = dist(*rng);
+  int index = 0;
+  while (instance >= card_count_[index]) {
+    instance -= card_count_[index];
+    ++index;
+  }
   assert(card_count_[index] > 0);
-  --card_count_[index];
-  --total_count_;
   return HanabiCard(IndexToColor(index), IndexToRank(index));
 }
 
@@ -87,19 +100,150 @@ HanabiCard HanabiState::HanabiDeck::DealCard(int color, int rank) {
   return HanabiCard(IndexToColor(index), IndexToRank(index));
 }
 
-HanabiState::HanabiState(const HanabiGame* parent_game, int start_player)
+void HanabiState::HanabiDeck::ReturnCard(HanabiCard card) {
+  REQUIRE(card.IsValid());
+  ++card_count_[CardToIndex(card.Color(), card.Rank())];
+  ++total_count_;
+}
+
+HanabiState::HanabiState(const HanabiGame* parent_game, int start_player,
+                         int seed)
     : parent_game_(parent_game),
       deck_(*parent_game),
       hands_(parent_game->NumPlayers()),
       cur_player_(kChancePlayerId),
-      next_non_chance_player_(start_player >= 0 &&
-                                      start_player < parent_game->NumPlayers()
-                                  ? start_player
-                                  : parent_game->GetSampledStartPlayer()),
       information_tokens_(parent_game->MaxInformationTokens()),
       life_tokens_(parent_game->MaxLifeTokens()),
       fireworks_(parent_game->NumColors(), 0),
-      turns_to_play_(parent_game->NumPlayers()) {}
+      turns_to_play_(parent_game->NumPlayers()) {
+  if (seed >= 0) {
+    rng_.seed(seed);
+  } else {
+    rng_.seed(parent_game->SampleStateSeed());
+  }
+  if (start_player >= 0 && start_player < parent_game->NumPlayers()) {
+    next_non_chance_player_ = start_player;
+  } else if (seed >= 0) {
+    next_non_chance_player_ = parent_game->GetSampledStartPlayer(&rng_);
+  } else {
+    next_non_chance_player_ = parent_game->GetSampledStartPlayer();
+  }
+  hash_ = ComputeHash();
+}
+
+HanabiState::HanabiState(const HanabiObservation& observation,
+                         const std::vector<HanabiCard>& observer_hand,
+                         int seed)
+    : parent_game_(observation.ParentGame()),
+      deck_(*observation.ParentGame()),
+      discard_pile_(observation.DiscardPile()),
+      hands_(observation.Hands()),
+      cur_player_(observation.CurPlayerOffset()),
+      information_tokens_(observation.InformationTokens()),
+      life_tokens_(observation.LifeTokens()),
+      fireworks_(observation.Fireworks()),
+      turns_to_play_(observation.ParentGame()->NumPlayers()) {
+  REQUIRE(cur_player_ >= 0);
+  REQUIRE(observer_hand.size() == hands_[0].Cards().size());
+  next_non_chance_player_ = (cur_player_ + 1) % hands_.size();
+
+  HanabiHand observer;
+  for (int i = 0; i < observer_hand.size(); ++i) {
+    observer.AddCard(observer_hand[i], hands_[0].Knowledge()[i]);
+  }
+  hands_[0] = observer;
+
+  // Remove every card that is not in the deck.
+  for (int color = 0; color < fireworks_.size(); ++color) {
+    for (int rank = 0; rank < fireworks_[color]; ++rank) {
+      REQUIRE(deck_.DealCard(color, rank).IsValid());
+    }
+  }
+  for (const HanabiCard& card : discard_pile_) {
+    REQUIRE(deck_.DealCard(card.Color(), card.Rank()).IsValid());
+  }
+  for (const HanabiHand& hand : hands_) {
+    for (const HanabiCard& card : hand.Cards()) {
+      REQUIRE(deck_.DealCard(card.Color(), card.Rank()).IsValid());
+    }
+  }
+  REQUIRE(deck_.Size() == observation.DeckSize());
+
+  // Last moves are most recent first, and already observer-relative.
+  const auto& last_moves = observation.LastMoves();
+  move_history_.assign(last_moves.rbegin(), last_moves.rend());
+  move_count_ = observation.MoveCount();
+  if (deck_.Empty()) {
+    // Every move since the last deal was played with an empty deck.
+    for (const HanabiHistoryItem& item : last_moves) {
+      if (item.move.MoveType() == HanabiMove::kDeal) {
+        break;
+      }
+      --turns_to_play_;
+    }
+  }
+
+  while (seed < 0) {
+    seed = std::random_device()() & 0x7fffffff;
+  }
+  rng_.seed(seed);
+  hash_ = ComputeHash();
+}
+
+uint64_t HanabiState::ComputeHash() const {
+  uint64_t hash = ScalarHash();
+  for (int player = 0; player < hands_.size(); ++player) {
+    hash ^= HandHash(player);
+  }
+  for (int color = 0; color < ParentGame()->NumColors(); ++color) {
+    for (int rank = 0; rank < ParentGame()->NumRanks(); ++rank) {
+      hash ^= DeckCardHash(color, rank);
+    }
+  }
+  return hash;
+}
+
+uint64_t HanabiState::HandHash(int player) const {
+  const HanabiGame* game = ParentGame();
+  const int num_colors = game->NumColors();
+  const int num_ranks = game->NumRanks();
+  const auto& cards = hands_[player].Cards();
+  const auto& knowledge = hands_[player].Knowledge();
+  uint64_t hash = 0;
+  for (int position = 0; position < cards.size(); ++position) {
+    hash ^= game->HandCardKey(player, position, cards[position].Color(),
+                              cards[position].Rank());
+    for (int color = 0; color < num_colors; ++color) {
+      if (!knowledge[position].ColorPlausible(color)) {
+        hash ^= game->KnowledgeKey(player, position, color);
+      }
+    }
+    for (int rank = 0; rank < num_ranks; ++rank) {
+      if (!knowledge[position].RankPlausible(rank)) {
+        hash ^= game->KnowledgeKey(player, position, num_colors + rank);
+      }
+    }
+    if (knowledge[position].ColorHinted()) {
+      hash ^= game->KnowledgeKey(player, position, num_colors + num_ranks);
+    }
+    if (knowledge[position].RankHinted()) {
+      hash ^= game->KnowledgeKey(player, position, num_colors + num_ranks + 1);
+    }
+  }
+  return hash;
+}
+
+uint64_t HanabiState::ScalarHash() const {
+  const HanabiGame* game = ParentGame();
+  uint64_t hash = game->InformationTokensKey(information_tokens_) ^
+                  game->LifeTokensKey(life_tokens_) ^
+                  game->CurPlayerKey(cur_player_) ^
+                  game->TurnsToPlayKey(turns_to_play_);
+  for (int color = 0; color < fireworks_.size(); ++color) {
+    hash ^= game->FireworkKey(color, fireworks_[color]);
+  }
+  return hash;
+}
 
 void HanabiState::AdvanceToNextPlayer() {
   if (!deck_.Empty() && PlayerToDeal() >= 0) {
@@ -218,8 +362,55 @@ bool HanabiState::MoveIsLegal(HanabiMove move) const {
   return true;
 }
 
+HanabiState HanabiState::SearchCopy() const {
+  HanabiState copy(*this);
+  copy.history_window_ = 2 * ParentGame()->NumPlayers();
+  if (copy.move_history_.size() > copy.history_window_) {
+    copy.move_history_.erase(
+        copy.move_history_.begin(),
+        copy.move_history_.end() - copy.history_window_);
+  }
+  copy.track_undo_ = true;
+  copy.undo_records_.clear();
+  copy.dropped_history_.clear();
+  return copy;
+}
+
 void HanabiState::ApplyMove(HanabiMove move) {
   REQUIRE(MoveIsLegal(move));
+  if (track_undo_) {
+    undo_records_.push_back({cur_player_, next_non_chance_player_,
+                             information_tokens_, life_tokens_,
+                             turns_to_play_, hash_, {}, false});
+    UndoRecord& record = undo_records_.back();
+    if (move.MoveType() == HanabiMove::kPlay ||
+        move.MoveType() == HanabiMove::kDiscard) {
+      record.knowledge.push_back(
+          hands_[cur_player_].Knowledge()[move.CardIndex()]);
+    } else if (move.MoveType() == HanabiMove::kRevealColor ||
+               move.MoveType() == HanabiMove::kRevealRank) {
+      record.knowledge = HandByOffset(move.TargetOffset())->Knowledge();
+    }
+    if (history_window_ > 0 && move_history_.size() >= history_window_) {
+      dropped_history_.push_back(move_history_.front());
+      move_history_.erase(move_history_.begin());
+      record.dropped_history = true;
+    }
+  }
+  // Hash out the parts of the state the move changes, then back in below.
+  int changed_hand = cur_player_;
+  if (move.MoveType() == HanabiMove::kDeal) {
+    changed_hand = PlayerToDeal();
+  } else if (move.MoveType() == HanabiMove::kRevealColor ||
+             move.MoveType() == HanabiMove::kRevealRank) {
+    changed_hand = (cur_player_ + move.TargetOffset()) % hands_.size();
+  }
+  uint64_t changed_hash = ScalarHash() ^ HandHash(changed_hand);
+  if (move.MoveType() == HanabiMove::kDeal) {
+    changed_hash ^= DeckCardHash(move.Color(), move.Rank());
+  }
+  hash_ ^= changed_hash;
+
   if (deck_.Empty()) {
     --turns_to_play_;
   }
@@ -271,7 +462,63 @@ void HanabiState::ApplyMove(HanabiMove move) {
       std::abort();  // Should not be possible.
   }
   move_history_.push_back(history);
+  ++move_count_;
   AdvanceToNextPlayer();
+
+  changed_hash = ScalarHash() ^ HandHash(changed_hand);
+  if (move.MoveType() == HanabiMove::kDeal) {
+    changed_hash ^= DeckCardHash(move.Color(), move.Rank());
+  }
+  hash_ ^= changed_hash;
+}
+
+bool HanabiState::UndoMove() {
+  if (undo_records_.empty()) {
+    return false;
+  }
+  const UndoRecord& record = undo_records_.back();
+  const HanabiHistoryItem& history = move_history_.back();
+  const HanabiMove& move = history.move;
+  cur_player_ = record.cur_player;
+  next_non_chance_player_ = record.next_non_chance_player;
+  information_tokens_ = record.information_tokens;
+  life_tokens_ = record.life_tokens;
+  turns_to_play_ = record.turns_to_play;
+  hash_ = record.hash;
+  switch (move.MoveType()) {
+    case HanabiMove::kDeal: {
+      HanabiHand& hand = hands_[history.deal_to_player];
+      int newest = hand.Cards().size() - 1;
+      deck_.ReturnCard(hand.Cards()[newest]);
+      hand.RemoveFromHand(newest, nullptr);
+      break;
+    }
+    case HanabiMove::kPlay:
+    case HanabiMove::kDiscard:
+      if (history.scored) {
+        --fireworks_[history.color];
+      } else {
+        discard_pile_.pop_back();
+      }
+      hands_[cur_player_].InsertCard(move.CardIndex(),
+                                     HanabiCard(history.color, history.rank),
+                                     record.knowledge[0]);
+      break;
+    case HanabiMove::kRevealColor:
+    case HanabiMove::kRevealRank:
+      HandByOffset(move.TargetOffset())->SetKnowledge(record.knowledge);
+      break;
+    default:
+      std::abort();  // Should not be possible.
+  }
+  move_history_.pop_back();
+  --move_count_;
+  if (record.dropped_history) {
+    move_history_.insert(move_history_.begin(), dropped_history_.back());
+    dropped_history_.pop_back();
+  }
+  undo_records_.pop_back();
+  return true;
 }
 
 double HanabiState::ChanceOutcomeProb(HanabiMove move) const {
@@ -280,9 +527,16 @@ double HanabiState::ChanceOutcomeProb(HanabiMove move) const {
 }
 
 void HanabiState::ApplyRandomChance() {
-  auto chance_outcomes = ChanceOutcomes();
-  REQUIRE(!chance_outcomes.second.empty());
-  ApplyMove(ParentGame()->PickRandomChance(chance_outcomes));
+  REQUIRE(cur_player_ == kChancePlayerId && !deck_.Empty());
+  HanabiCard card = deck_.SampleCard(&rng_);
+  ApplyMove(HanabiMove(HanabiMove::kDeal, /*card_index=*/-1,
+                       /*target_offset=*/-1, card.Color(), card.Rank()));
+}
+
+void HanabiState::ApplyPendingRandomChance() {
+  while (cur_player_ == kChancePlayerId) {
+    ApplyRandomChance();
+  }
 }
 
 std::vector<HanabiMove> HanabiState::LegalMoves(int player) const {
@@ -15,6 +15,7 @@
 #ifndef __HANABI_STATE_H__
 #define __HANABI_STATE_H__
 
+#include <cstdint>
 #include <random>
 #include <string>
 #include <vector>
@@ -29,6 +30,8 @@ namespace hanabi_learning_env {
 
 constexpr int kChancePlayerId = -1;
 
+class HanabiObservation;
+
 class HanabiState {
  public:
   class HanabiDeck {
@@ -36,7 +39,12 @@ class HanabiState {
     explicit HanabiDeck(const HanabiGame& game);
     // DealCard returns invalid card on failure.
     HanabiCard DealCard(int color, int rank);
+    // Put a dealt card back in the deck.
+    void ReturnCard(HanabiCard card);
     HanabiCard DealCard(std::mt19937* rng);
+    // Sample a card uniformly from the remaining cards, without removing it.
+    // Returns invalid card if the deck is empty.
+    HanabiCard SampleCard(std::mt19937* rng) const;
     int Size() const { return total_count_; }
     bool Empty() const { return total_count_ == 0; }
     int CardCount(int color, int rank) const {
@@ -68,12 +76,34 @@ class HanabiState {
   // Construct a HanabiState, initialised to the start of the game.
   // If start_player >= 0, the game-provided start player is overridden
   // and the first player after chance is start_player.
-  explicit HanabiState(const HanabiGame* parent_game, int start_player = -1);
+  // Each state draws its chance outcomes from its own random number generator.
+  // If seed >= 0 the generator is seeded with seed, and a random start player
+  // is also drawn from it, so that the whole game is determined by seed and
+  // the moves applied. Otherwise the seed is drawn from parent_game.
+  explicit HanabiState(const HanabiGame* parent_game, int start_player = -1,
+                       int seed = -1);
+  // Construct a HanabiState consistent with an observation, given the cards
+  // in the observing player's hand (oldest first). Players are seated
+  // relative to the observer, so the observer is player 0 of the new state.
+  // The deck holds every card not visible in the observation or the given
+  // hand. The move history only holds the observation's last moves.
+  // The observation must not be taken while a chance player is to act.
+  HanabiState(const HanabiObservation& observation,
+              const std::vector<HanabiCard>& observer_hand, int seed = -1);
   // Copy constructor for recursive game traversals using copy + apply-move.
   HanabiState(const HanabiState& state) = default;
+  // Returns a copy meant for tree search. The copy only keeps the most recent
+  // 2 * NumPlayers() history items, which is enough to build observations,
+  // and older items are dropped as moves are applied. Moves applied to the
+  // copy can be reverted with UndoMove.
+  HanabiState SearchCopy() const;
 
   bool MoveIsLegal(HanabiMove move) const;
   void ApplyMove(HanabiMove move);
+  // Revert the most recent move applied since SearchCopy, including chance
+  // moves. Returns false if there is no such move. The random number
+  // generator is not rewound.
+  bool UndoMove();
   // Legal moves for state. Moves point into an unchanging list in parent_game.
   std::vector<HanabiMove> LegalMoves(int player) const;
   // Returns true if card with color and rank can be played on fireworks pile.
@@ -85,6 +115,10 @@ class HanabiState {
   double ChanceOutcomeProb(HanabiMove move) const;
   void ApplyChanceOutcome(HanabiMove move) { ApplyMove(move); }
   void ApplyRandomChance();
+  // Apply random chance outcomes until a non-chance player is to act.
+  void ApplyPendingRandomChance();
+  // Reseed the generator used by ApplyRandomChance.
+  void SetSeed(int seed) { rng_.seed(seed); }
   // Get the valid chance moves, and associated probabilities.
   // Guaranteed that moves.size() == probabilities.size().
   std::pair<std::vector<HanabiMove>, std::vector<double>> ChanceOutcomes()
@@ -93,6 +127,10 @@ class HanabiState {
   bool IsTerminal() const { return EndOfGameStatus() != kNotFinished; }
   int Score() const;
   std::string ToString() const;
+  // Zobrist hash of the hands, card knowledge, fireworks, tokens, deck
+  // contents, current player and turns left. The move history, discard order
+  // and random number generator are not included. Maintained incrementally.
+  uint64_t Hash() const { return hash_; }
 
   int CurPlayer() const { return cur_player_; }
   int LifeTokens() const { return life_tokens_; }
@@ -107,8 +145,28 @@ class HanabiState {
   const std::vector<HanabiHistoryItem>& MoveHistory() const {
     return move_history_;
   }
+  // Number of moves applied since the start of the game, including chance
+  // moves. Unlike MoveHistory().size(), it counts the moves of search copies
+  // and of states built from observations from the start of the game.
+  int MoveCount() const { return move_count_; }
 
  private:
+  // What ApplyMove changed, beyond the history item it appended.
+  struct UndoRecord {
+    int cur_player;
+    int next_non_chance_player;
+    int information_tokens;
+    int life_tokens;
+    int turns_to_play;
+    uint64_t hash;
+    // Knowledge of the card removed by a play or discard, or of the whole
+    // target hand before a reveal.
+    std::vector<HanabiHand::CardKnowledge> knowledge;
+    // True if the oldest history item was dropped to keep the history window.
+    // The item is at the back of dropped_history_.
+    bool dropped_history;
+  };
+
   // Add card to table if possible, if not lose a life token.
   // Returns <scored,information_token_added>
   // success is true iff card was successfully added to fireworks.
@@ -127,6 +185,14 @@ class HanabiState {
   bool IncrementInformationTokens();
   void DecrementInformationTokens();
   void DecrementLifeTokens();
+  // Hash components, see Hash().
+  uint64_t ComputeHash() const;
+  uint64_t HandHash(int player) const;
+  uint64_t ScalarHash() const;  // Tokens, fireworks, player and turns left.
+  uint64_t DeckCardHash(int color, int rank) const {
+    return parent_game_->DeckCountKey(color, rank,
+                                      deck_.CardCount(color, rank));
+  }
 
   const HanabiGame* parent_game_ = nullptr;
   HanabiDeck deck_;
@@ -134,12 +200,21 @@ class HanabiState {
   std::vector<HanabiCard> discard_pile_;
   std::vector<HanabiHand> hands_;
   std::vector<HanabiHistoryItem> move_history_;
+  int move_count_ = 0;
   int cur_player_ = -1;
   int next_non_chance_player_ = -1;  // Next non-chance player to act.
   int information_tokens_ = -1;
   int life_tokens_ = -1;
   std::vector<int> fireworks_;
   int turns_to_play_ = -1;  // Number of turns to play once deck is empty.
+  std::mt19937 rng_;        // Source of chance outcomes for this state.
+  uint64_t hash_ = 0;
+  // Search copies only: maximum history length, and undo records of the moves
+  // applied since the copy, most recent at the back.
+  int history_window_ = 0;  // 0 if the whole history is kept.
+  bool track_undo_ = false;
+  std::vector<UndoRecord> undo_records_;
+  std::vector<HanabiHistoryItem> dropped_history_;
 };
 
 }  // namespace hanabi_learning_env
@@ -18,6 +18,7 @@
 #ifndef __OBSERVATION_ENCODER_H__
 #define __OBSERVATION_ENCODER_H__
 
+#include <algorithm>
 #include <vector>
 
 #include "hanabi_observation.h"
@@ -26,7 +27,7 @@ namespace hanabi_learning_env {
 
 class ObservationEncoder {
  public:
-  enum Type { kCanonical = 0 };
+  enum Type { kCanonical = 0, kBelief = 1 };
   virtual ~ObservationEncoder() = default;
 
   // Returns the shape (dimension sizes of the tensor).
@@ -36,6 +37,14 @@ class ObservationEncoder {
   // change this if we want something more general (e.g. floats or doubles).
   virtual std::vector<int> Encode(const HanabiObservation& obs) const = 0;
 
+  // Writes the encoding of obs as floats to encoding, which must have room
+  // for the product of Shape(). Encoders with non-binary features, like the
+  // belief encoder, only give their exact values through this method.
+  virtual void EncodeInto(const HanabiObservation& obs, float* encoding) const {
+    std::vector<int> int_encoding = Encode(obs);
+    std::copy(int_encoding.begin(), int_encoding.end(), encoding);
+  }
+
   // Return the type of this encoder.
   virtual Type type() const = 0;
 };
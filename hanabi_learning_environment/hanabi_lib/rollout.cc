@@ -0,0 +1,113 @@
+// Copyright 2018 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    https://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include "rollout.h"
+
+#include <numeric>
+
+#include "util.h"
+
+namespace hanabi_learning_env {
+
+namespace {
+// Returns a uniformly random legal move among the moves of the given types,
+// by reservoir sampling over the game's move list, or an invalid move.
+template <typename TypeFilter>
+HanabiMove RandomLegalMove(const HanabiState& state, TypeFilter filter,
+                           std::mt19937* rng) {
+  const HanabiGame* game = state.ParentGame();
+  HanabiMove chosen(HanabiMove::kInvalid, -1, -1, -1, -1);
+  int num_legal = 0;
+  for (int uid = 0; uid < game->MaxMoves(); ++uid) {
+    HanabiMove move = game->GetMove(uid);
+    if (!filter(move.MoveType()) || !state.MoveIsLegal(move)) {
+      continue;
+    }
+    ++num_legal;
+    if (std::uniform_int_distribution<int>(0, num_legal - 1)(*rng) == 0) {
+      chosen = move;
+    }
+  }
+  return chosen;
+}
+
+HanabiMove SimpleMove(const HanabiState& state, std::mt19937* rng) {
+  const auto& cards = state.Hands()[state.CurPlayer()].Cards();
+  const auto& fireworks = state.Fireworks();
+  for (int index = 0; index < cards.size(); ++index) {
+    if (cards[index].Rank() == fireworks[cards[index].Color()]) {
+      return HanabiMove(HanabiMove::kPlay, index, -1, -1, -1);
+    }
+  }
+  if (state.InformationTokens() < state.ParentGame()->MaxInformationTokens()) {
+    int discard_index = 0;
+    for (int index = 0; index < cards.size(); ++index) {
+      if (cards[index].Rank() < fireworks[cards[index].Color()]) {
+        discard_index = index;
+        break;
+      }
+    }
+    return HanabiMove(HanabiMove::kDiscard, discard_index, -1, -1, -1);
+  }
+  return RandomLegalMove(
+      state,
+      [](HanabiMove::Type type) {
+        return type == HanabiMove::kRevealColor ||
+               type == HanabiMove::kRevealRank;
+      },
+      rng);
+}
+}  // namespace
+
+RolloutStats RolloutToTerminal(HanabiState* state, RolloutPolicy policy,
+                               std::mt19937* rng) {
+  REQUIRE(state != nullptr);
+  RolloutStats stats;
+  state->ApplyPendingRandomChance();
+  while (!state->IsTerminal()) {
+    HanabiMove move =
+        policy == kSimpleRollout
+            ? SimpleMove(*state, rng)
+            : RandomLegalMove(
+                  *state, [](HanabiMove::Type) { return true; }, rng);
+    REQUIRE(move.MoveType() != HanabiMove::kInvalid);
+    switch (move.MoveType()) {
+      case HanabiMove::kPlay: {
+        int life_tokens = state->LifeTokens();
+        state->ApplyMove(move);
+        if (state->LifeTokens() < life_tokens) {
+          ++stats.num_bombs;
+        } else {
+          ++stats.num_plays;
+        }
+        break;
+      }
+      case HanabiMove::kDiscard:
+        state->ApplyMove(move);
+        ++stats.num_discards;
+        break;
+      default:
+        state->ApplyMove(move);
+        ++stats.num_hints;
+    }
+    ++stats.num_moves;
+    state->ApplyPendingRandomChance();
+  }
+  stats.score = state->Score();
+  stats.fireworks =
+      std::accumulate(state->Fireworks().begin(), state->Fireworks().end(), 0);
+  return stats;
+}
+
+}  // namespace hanabi_learning_env
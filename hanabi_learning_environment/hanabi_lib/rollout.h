@@ -0,0 +1,56 @@
+// Copyright 2018 Google LLC
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//    https://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// Playouts of a game to the end with built-in policies, for simulation-heavy
+// agents that would otherwise step the game one move at a time.
+
+#ifndef __ROLLOUT_H__
+#define __ROLLOUT_H__
+
+#include <random>
+
+#include "hanabi_state.h"
+
+namespace hanabi_learning_env {
+
+enum RolloutPolicy {
+  // Uniformly random legal moves.
+  kRandomRollout = 0,
+  // The current player sees every card: play a playable card if any,
+  // otherwise discard a card that can no longer be played, or the oldest
+  // card, otherwise give a random hint.
+  kSimpleRollout = 1
+};
+
+struct RolloutStats {
+  int score = 0;        // Final score, 0 if all life tokens were lost.
+  int fireworks = 0;    // Cards on the fireworks at the end.
+  int num_moves = 0;    // Non-chance moves played.
+  int num_plays = 0;    // Successful plays.
+  int num_bombs = 0;    // Plays that lost a life token.
+  int num_discards = 0;
+  int num_hints = 0;
+};
+
+// Number of ints in RolloutStats, in declaration order.
+constexpr int kNumRolloutStats = 7;
+
+// Play state to the end of the game, drawing policy decisions from rng and
+// chance outcomes from the state's own generator.
+RolloutStats RolloutToTerminal(HanabiState* state, RolloutPolicy policy,
+                               std::mt19937* rng);
+
+}  // namespace hanabi_learning_env
+
+#endif
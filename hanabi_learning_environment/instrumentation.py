@@ -0,0 +1,217 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Opt-in timing of hot code sections.
+
+Sections are timed with the `timed` decorator or the `section` context
+manager, and events are counted with `count`. Nothing is recorded until
+`enable()` is called; when disabled, a timed function costs one extra call
+and a flag check.
+
+Every section keeps its number of calls, total, minimum and maximum time, and
+a histogram of times with log2 buckets: bucket 0 counts calls under 1us and
+bucket k > 0 calls in [2^(k-1), 2^k) us.
+
+  from hanabi_learning_environment import instrumentation
+
+  instrumentation.enable()
+  ...
+  print(instrumentation.summary())
+  instrumentation.reset()
+
+Statistics are kept per process.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import functools
+import threading
+import time
+
+_NUM_BUCKETS = 32
+
+_enabled = False
+_lock = threading.Lock()
+_sections = {}
+_counters = {}
+
+
+class _Section(object):
+  """Statistics of a timed section."""
+
+  __slots__ = ['count', 'total', 'min', 'max', 'histogram']
+
+  def __init__(self):
+    self.count = 0
+    self.total = 0.
+    self.min = float('inf')
+    self.max = 0.
+    self.histogram = [0] * _NUM_BUCKETS
+
+  def add(self, seconds):
+    self.count += 1
+    self.total += seconds
+    self.min = min(self.min, seconds)
+    self.max = max(self.max, seconds)
+    bucket = min(int(seconds * 1e6).bit_length(), _NUM_BUCKETS - 1)
+    self.histogram[bucket] += 1
+
+
+def enable(enabled=True):
+  """Turns recording on or off. Recorded statistics are kept."""
+  global _enabled
+  _enabled = enabled
+
+
+def is_enabled():
+  return _enabled
+
+
+def record(name, seconds):
+  """Adds a time to a section, if recording is enabled.
+
+  Args:
+    name: str, name of the section.
+    seconds: float, time spent in the section.
+  """
+  if not _enabled:
+    return
+  with _lock:
+    section_stats = _sections.get(name)
+    if section_stats is None:
+      section_stats = _sections[name] = _Section()
+    section_stats.add(seconds)
+
+
+def count(name, value=1):
+  """Adds value to a counter, if recording is enabled."""
+  if not _enabled:
+    return
+  with _lock:
+    _counters[name] = _counters.get(name, 0) + value
+
+
+class section(object):  # pylint: disable=invalid-name
+  """Context manager timing its body as a section.
+
+    with instrumentation.section('replay.add'):
+      memory.add(...)
+  """
+
+  __slots__ = ['_name', '_start']
+
+  def __init__(self, name):
+    self._name = name
+    self._start = None
+
+  def __enter__(self):
+    if _enabled:
+      self._start = time.perf_counter()
+    return self
+
+  def __exit__(self, *unused_exc_info):
+    if self._start is not None:
+      record(self._name, time.perf_counter() - self._start)
+      self._start = None
+
+
+def timed(name):
+  """Decorator timing every call of a function as a section.
+
+  Args:
+    name: str, name of the section.
+
+  Returns:
+    The decorator.
+  """
+
+  def decorator(function):
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+      if not _enabled:
+        return function(*args, **kwargs)
+      start = time.perf_counter()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        record(name, time.perf_counter() - start)
+
+    return wrapper
+
+  return decorator
+
+
+def summary():
+  """Returns the recorded statistics.
+
+  Returns:
+    A dict with two keys: 'sections', mapping section names to dicts with the
+    number of calls 'count', the total time in seconds 'total_s', the mean,
+    minimum and maximum times in microseconds 'mean_us', 'min_us' and
+    'max_us', and the log2 bucket counts 'histogram' (trailing empty buckets
+    removed); and 'counters', mapping counter names to their values.
+  """
+  with _lock:
+    sections = {}
+    for name, stats in _sections.items():
+      histogram = list(stats.histogram)
+      while histogram and not histogram[-1]:
+        histogram.pop()
+      sections[name] = {
+          'count': stats.count,
+          'total_s': stats.total,
+          'mean_us': 1e6 * stats.total / stats.count,
+          'min_us': 1e6 * stats.min,
+          'max_us': 1e6 * stats.max,
+          'histogram': histogram,
+      }
+    return {'sections': sections, 'counters': dict(_counters)}
+
+
+def flat_summary(prefix='time_'):
+  """Returns the recorded statistics as a flat dict of numbers.
+
+  Suited to IterationStatistics: for every section, '<prefix><name>_count',
+  '<prefix><name>_total_s', '<prefix><name>_mean_us' and
+  '<prefix><name>_max_us'; and for every counter, 'count_<name>'.
+  """
+  stats = summary()
+  flat = {}
+  for name, section_stats in stats['sections'].items():
+    for key in ('count', 'total_s', 'mean_us', 'max_us'):
+      flat['{}{}_{}'.format(prefix, name, key)] = section_stats[key]
+  for name, value in stats['counters'].items():
+    flat['count_{}'.format(name)] = value
+  return flat
+
+
+def format_summary():
+  """Returns a table of the sections, by decreasing total time."""
+  stats = summary()['sections']
+  lines = ['{:<40} {:>10} {:>10} {:>12} {:>12}'.format(
+      'section', 'calls', 'total s', 'mean us', 'max us')]
+  for name in sorted(stats, key=lambda name: -stats[name]['total_s']):
+    section_stats = stats[name]
+    lines.append('{:<40} {:>10d} {:>10.3f} {:>12.2f} {:>12.2f}'.format(
+        name, section_stats['count'], section_stats['total_s'],
+        section_stats['mean_us'], section_stats['max_us']))
+  return '\n'.join(lines)
+
+
+def reset():
+  """Clears the recorded statistics."""
+  with _lock:
+    _sections.clear()
+    _counters.clear()
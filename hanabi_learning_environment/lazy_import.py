@@ -0,0 +1,55 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Deferred imports of heavy modules.
+
+  tf = lazy_import.LazyModule('tensorflow')
+
+binds tf to a placeholder, and only imports TensorFlow when an attribute of
+tf is first read. Modules that only use tf inside functions can then be
+imported, and their functions that do not need TensorFlow used, without
+paying for importing it.
+
+Reading an attribute at module level, e.g. in a default argument value,
+imports the module right away.
+"""
+
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+  """Module imported on first attribute access."""
+
+  def __init__(self, name):
+    """Initializes the placeholder.
+
+    Args:
+      name: str, absolute name of the module, e.g. 'tensorflow.contrib.slim'.
+    """
+    super(LazyModule, self).__init__(name)
+    self._module = None
+
+  def _load(self):
+    if self._module is None:
+      self._module = importlib.import_module(self.__name__)
+      # Later reads of the module's attributes skip __getattr__.
+      self.__dict__.update(self._module.__dict__)
+    return self._module
+
+  def __getattr__(self, attribute):
+    return getattr(self._load(), attribute)
+
+  def __dir__(self):
+    return dir(self._load())
+
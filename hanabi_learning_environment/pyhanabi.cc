@@ -14,6 +14,7 @@
 
 #include "pyhanabi.h"
 
+#include <algorithm>
 #include <cstdlib>
 #include <cstring>
 #include <iostream>
@@ -22,15 +23,52 @@
 #include <unordered_map>
 
 #include "hanabi_lib/canonical_encoders.h"
+#include "hanabi_lib/determinization.h"
 #include "hanabi_lib/hanabi_card.h"
 #include "hanabi_lib/hanabi_game.h"
 #include "hanabi_lib/hanabi_history_item.h"
 #include "hanabi_lib/hanabi_move.h"
 #include "hanabi_lib/hanabi_observation.h"
 #include "hanabi_lib/hanabi_state.h"
+#include "hanabi_lib/rollout.h"
 #include "hanabi_lib/observation_encoder.h"
 #include "hanabi_lib/util.h"
 
+namespace {
+
+// Copies values into an array of C API structs, e.g. pyhanabi_move_t, whose
+// pointer field is selected by member. The C++ objects of slots filled by a
+// previous call are reused, so that arrays recycled by pyhanabi.py do not
+// allocate. Returns the number of values, at most capacity slots are filled.
+template <typename T, typename Slot>
+int FillSlots(const std::vector<T>& values, Slot* slots, int capacity,
+              void* Slot::*member) {
+  int size = values.size();
+  REQUIRE(slots != nullptr || capacity == 0);
+  for (int i = 0; i < std::min(size, capacity); ++i) {
+    void*& pointer = slots[i].*member;
+    if (pointer == nullptr) {
+      pointer = new T(values[i]);
+    } else {
+      *static_cast<T*>(pointer) = values[i];
+    }
+  }
+  return size;
+}
+
+// Deletes the C++ objects of filled slots.
+template <typename T, typename Slot>
+void DeleteSlots(Slot* slots, int count, void* Slot::*member) {
+  REQUIRE(slots != nullptr);
+  for (int i = 0; i < count; ++i) {
+    void*& pointer = slots[i].*member;
+    delete static_cast<T*>(pointer);
+    pointer = nullptr;
+  }
+}
+
+}  // namespace
+
 extern "C" {
 
 /* Helpers. */
@@ -131,6 +169,11 @@ void DeleteMove(pyhanabi_move_t* move) {
   move->move = nullptr;
 }
 
+void DeleteMoves(pyhanabi_move_t* moves, int count) {
+  DeleteSlots<hanabi_learning_env::HanabiMove>(moves, count,
+                                               &pyhanabi_move_t::move);
+}
+
 char* MoveToString(pyhanabi_move_t* move) {
   REQUIRE(move != nullptr);
   REQUIRE(move->move != nullptr);
@@ -203,6 +246,11 @@ void DeleteHistoryItem(pyhanabi_history_item_t* item) {
   item->item = nullptr;
 }
 
+void DeleteHistoryItems(pyhanabi_history_item_t* items, int count) {
+  DeleteSlots<hanabi_learning_env::HanabiHistoryItem>(
+      items, count, &pyhanabi_history_item_t::item);
+}
+
 char* HistoryItemToString(pyhanabi_history_item_t* item) {
   REQUIRE(item != nullptr);
   REQUIRE(item->item != nullptr);
@@ -223,6 +271,15 @@ void HistoryItemMove(pyhanabi_history_item_t* item, pyhanabi_move_t* move) {
           ->move);
 }
 
+void HistoryItemMoveRef(pyhanabi_history_item_t* item, pyhanabi_move_t* move) {
+  REQUIRE(item != nullptr);
+  REQUIRE(item->item != nullptr);
+  REQUIRE(move != nullptr);
+  move->move =
+      &reinterpret_cast<hanabi_learning_env::HanabiHistoryItem*>(item->item)
+           ->move;
+}
+
 int HistoryItemPlayer(pyhanabi_history_item_t* item) {
   REQUIRE(item != nullptr);
   REQUIRE(item->item != nullptr);
@@ -296,6 +353,16 @@ void NewState(pyhanabi_game_t* game, pyhanabi_state_t* state) {
       static_cast<hanabi_learning_env::HanabiGame*>(game->game));
 }
 
+void NewSeededState(pyhanabi_game_t* game, int start_player, int seed,
+                    pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(game != nullptr);
+  REQUIRE(game->game != nullptr);
+  state->state = new hanabi_learning_env::HanabiState(
+      static_cast<hanabi_learning_env::HanabiGame*>(game->game), start_player,
+      seed);
+}
+
 void CopyState(const pyhanabi_state_t* src, pyhanabi_state_t* dest) {
   REQUIRE(src != nullptr);
   REQUIRE(src->state != nullptr);
@@ -304,6 +371,15 @@ void CopyState(const pyhanabi_state_t* src, pyhanabi_state_t* dest) {
       *static_cast<hanabi_learning_env::HanabiState*>(src->state));
 }
 
+void CopyStateForSearch(const pyhanabi_state_t* src, pyhanabi_state_t* dest) {
+  REQUIRE(src != nullptr);
+  REQUIRE(src->state != nullptr);
+  REQUIRE(dest != nullptr);
+  dest->state = new hanabi_learning_env::HanabiState(
+      static_cast<hanabi_learning_env::HanabiState*>(src->state)
+          ->SearchCopy());
+}
+
 void DeleteState(pyhanabi_state_t* state) {
   REQUIRE(state != nullptr);
   REQUIRE(state->state != nullptr);
@@ -346,6 +422,57 @@ void StateDealRandomCard(pyhanabi_state_t* state) {
   hanabi_state->ApplyRandomChance();
 }
 
+bool StateUndoMove(pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  return hanabi_state->UndoMove();
+}
+
+void StateDealPendingCards(pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  hanabi_state->ApplyPendingRandomChance();
+}
+
+int StateRolloutToTerminal(pyhanabi_state_t* state, int policy, int seed,
+                           int* stats) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  REQUIRE(policy == hanabi_learning_env::kRandomRollout ||
+          policy == hanabi_learning_env::kSimpleRollout);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  std::mt19937 rng;
+  rng.seed(seed >= 0 ? seed : std::random_device()());
+  hanabi_learning_env::RolloutStats result =
+      hanabi_learning_env::RolloutToTerminal(
+          hanabi_state,
+          static_cast<hanabi_learning_env::RolloutPolicy>(policy), &rng);
+  if (stats != nullptr) {
+    const int values[hanabi_learning_env::kNumRolloutStats] = {
+        result.score,     result.fireworks,    result.num_moves,
+        result.num_plays, result.num_bombs,    result.num_discards,
+        result.num_hints};
+    std::copy(values, values + hanabi_learning_env::kNumRolloutStats, stats);
+  }
+  return result.score;
+}
+
+void StateSetSeed(pyhanabi_state_t* state, int seed) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  if (seed < 0) {
+    seed = hanabi_state->ParentGame()->SampleStateSeed();
+  }
+  hanabi_state->SetSeed(seed);
+}
+
 int StateDeckSize(pyhanabi_state_t* state) {
   REQUIRE(state != nullptr);
   REQUIRE(state->state != nullptr);
@@ -432,6 +559,16 @@ void* StateLegalMoves(pyhanabi_state_t* state) {
   return static_cast<void*>(list);
 }
 
+int StateLegalMovesInto(pyhanabi_state_t* state, pyhanabi_move_t* moves,
+                        int capacity) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  return FillSlots(hanabi_state->LegalMoves(hanabi_state->CurPlayer()), moves,
+                   capacity, &pyhanabi_move_t::move);
+}
+
 int StateLifeTokens(pyhanabi_state_t* state) {
   REQUIRE(state != nullptr);
   REQUIRE(state->state != nullptr);
@@ -454,6 +591,20 @@ int StateScore(pyhanabi_state_t* state) {
       ->Score();
 }
 
+uint64_t StateHash(pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state)
+      ->Hash();
+}
+
+int StateMoveCount(pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state)
+      ->MoveCount();
+}
+
 char* StateToString(pyhanabi_state_t* state) {
   REQUIRE(state != nullptr);
   REQUIRE(state->state != nullptr);
@@ -496,6 +647,84 @@ void StateGetMoveHistory(pyhanabi_state_t* state, int index,
           .at(index));
 }
 
+int StateMoveHistoryInto(pyhanabi_state_t* state,
+                         pyhanabi_history_item_t* items, int capacity) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  return FillSlots(
+      reinterpret_cast<const hanabi_learning_env::HanabiState*>(state->state)
+          ->MoveHistory(),
+      items, capacity, &pyhanabi_history_item_t::item);
+}
+
+int StateMoveUidsInto(pyhanabi_state_t* state, unsigned char* uids,
+                      int capacity) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  REQUIRE(uids != nullptr || capacity == 0);
+  auto hanabi_state =
+      reinterpret_cast<const hanabi_learning_env::HanabiState*>(state->state);
+  auto hanabi_game = hanabi_state->ParentGame();
+  const auto& history = hanabi_state->MoveHistory();
+  if (history.size() != hanabi_state->MoveCount()) {
+    return -1;
+  }
+  int count = std::min<int>(history.size(), capacity);
+  for (int i = 0; i < count; ++i) {
+    const hanabi_learning_env::HanabiMove& move = history[i].move;
+    int uid = move.MoveType() == hanabi_learning_env::HanabiMove::kDeal
+                  ? hanabi_game->GetChanceOutcomeUid(move)
+                  : hanabi_game->GetMoveUid(move);
+    REQUIRE(uid >= 0 && uid <= 255);
+    uids[i] = static_cast<unsigned char>(uid);
+  }
+  return history.size();
+}
+
+int StateStartPlayer(pyhanabi_state_t* state) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  auto hanabi_state =
+      reinterpret_cast<const hanabi_learning_env::HanabiState*>(state->state);
+  const auto& history = hanabi_state->MoveHistory();
+  if (history.size() != hanabi_state->MoveCount()) {
+    return -1;
+  }
+  for (const auto& item : history) {
+    if (item.move.MoveType() != hanabi_learning_env::HanabiMove::kDeal) {
+      return item.player;
+    }
+  }
+  // No player moved yet: the player to act, or -1 while dealing.
+  return hanabi_state->CurPlayer();
+}
+
+int StateApplyMoveUids(pyhanabi_state_t* state, const unsigned char* uids,
+                       int count) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  REQUIRE(uids != nullptr || count == 0);
+  auto hanabi_state =
+      reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state);
+  auto hanabi_game = hanabi_state->ParentGame();
+  for (int i = 0; i < count; ++i) {
+    hanabi_learning_env::HanabiMove move(
+        hanabi_learning_env::HanabiMove::kInvalid, -1, -1, -1, -1);
+    if (hanabi_state->CurPlayer() == hanabi_learning_env::kChancePlayerId) {
+      if (uids[i] < hanabi_game->MaxChanceOutcomes()) {
+        move = hanabi_game->GetChanceOutcome(uids[i]);
+      }
+    } else if (uids[i] < hanabi_game->MaxMoves()) {
+      move = hanabi_game->GetMove(uids[i]);
+    }
+    if (!hanabi_state->MoveIsLegal(move)) {
+      return i;
+    }
+    hanabi_state->ApplyMove(move);
+  }
+  return count;
+}
+
 /* Wrapper definitions for HanabiGame. */
 void DeleteGame(pyhanabi_game_t* game) {
   REQUIRE(game != nullptr);
@@ -537,6 +766,13 @@ char* GameParamString(pyhanabi_game_t* game) {
   return strdup(str.c_str());
 }
 
+void GameSetSeed(pyhanabi_game_t* game, int seed) {
+  REQUIRE(game != nullptr);
+  REQUIRE(game->game != nullptr);
+  REQUIRE(seed >= 0);
+  reinterpret_cast<hanabi_learning_env::HanabiGame*>(game->game)->SetSeed(seed);
+}
+
 int NumPlayers(pyhanabi_game_t* game) {
   return reinterpret_cast<hanabi_learning_env::HanabiGame*>(game->game)
       ->NumPlayers();
@@ -599,6 +835,13 @@ int MaxMoves(pyhanabi_game_t* game) {
       ->MaxMoves();
 }
 
+int MaxChanceOutcomes(pyhanabi_game_t* game) {
+  REQUIRE(game != nullptr);
+  REQUIRE(game->game != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiGame*>(game->game)
+      ->MaxChanceOutcomes();
+}
+
 /* Wrapper definitions for HanabiObservation. */
 void NewObservation(pyhanabi_state_t* state, int player,
                     pyhanabi_observation_t* observation) {
@@ -614,6 +857,24 @@ void NewObservation(pyhanabi_state_t* state, int player,
   REQUIRE(observation->observation != nullptr);
 }
 
+void NewLazyObservation(pyhanabi_state_t* state, int player,
+                        pyhanabi_observation_t* observation) {
+  REQUIRE(state != nullptr);
+  REQUIRE(state->state != nullptr);
+  REQUIRE(observation != nullptr);
+  observation->observation = new hanabi_learning_env::HanabiObservation(
+      *reinterpret_cast<hanabi_learning_env::HanabiState*>(state->state),
+      player, /*lazy=*/true);
+}
+
+void ObsSnapshot(pyhanabi_observation_t* observation) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+      observation->observation)
+      ->Snapshot();
+}
+
 void DeleteObservation(pyhanabi_observation_t* observation) {
   REQUIRE(observation != nullptr);
   REQUIRE(observation->observation != nullptr);
@@ -689,6 +950,24 @@ void ObsGetHandCardKnowledge(pyhanabi_observation_t* observation, int pid,
             .at(index));
 }
 
+int ObsHandCardKnowledgeInto(pyhanabi_observation_t* observation, int pid,
+                             pyhanabi_card_knowledge_t* knowledge,
+                             int capacity) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  const auto& hand_knowledge =
+      reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+          observation->observation)
+          ->Hands()
+          .at(pid)
+          .Knowledge();
+  int size = hand_knowledge.size();
+  for (int i = 0; i < std::min(size, capacity); ++i) {
+    knowledge[i].knowledge = &hand_knowledge[i];
+  }
+  return size;
+}
+
 int ObsDiscardPileSize(pyhanabi_observation_t* observation) {
   return reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
              observation->observation)
@@ -727,6 +1006,14 @@ int ObsDeckSize(pyhanabi_observation_t* observation) {
       ->DeckSize();
 }
 
+int ObsMoveCount(pyhanabi_observation_t* observation) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  return reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+             observation->observation)
+      ->MoveCount();
+}
+
 int ObsNumLastMoves(pyhanabi_observation_t* observation) {
   REQUIRE(observation != nullptr);
   REQUIRE(observation->observation != nullptr);
@@ -748,6 +1035,16 @@ void ObsGetLastMove(pyhanabi_observation_t* observation, int index,
           .at(index));
 }
 
+int ObsLastMovesInto(pyhanabi_observation_t* observation,
+                     pyhanabi_history_item_t* items, int capacity) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  return FillSlots(reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+                       observation->observation)
+                       ->LastMoves(),
+                   items, capacity, &pyhanabi_history_item_t::item);
+}
+
 int ObsInformationTokens(pyhanabi_observation_t* observation) {
   REQUIRE(observation != nullptr);
   REQUIRE(observation->observation != nullptr);
@@ -785,6 +1082,16 @@ void ObsGetLegalMove(pyhanabi_observation_t* observation, int index,
            .at(index)));
 }
 
+int ObsLegalMovesInto(pyhanabi_observation_t* observation,
+                      pyhanabi_move_t* moves, int capacity) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  return FillSlots(reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+                       observation->observation)
+                       ->LegalMoves(),
+                   moves, capacity, &pyhanabi_move_t::move);
+}
+
 bool ObsCardPlayableOnFireworks(const pyhanabi_observation_t* observation,
                                 int color, int rank) {
   return reinterpret_cast<const hanabi_learning_env::HanabiObservation*>(
@@ -792,6 +1099,35 @@ bool ObsCardPlayableOnFireworks(const pyhanabi_observation_t* observation,
       ->CardPlayableOnFireworks(color, rank);
 }
 
+int ObsSampleDeterminizations(pyhanabi_observation_t* observation,
+                              int num_samples, const double* card_weights,
+                              int seed, pyhanabi_state_t* states) {
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  REQUIRE(num_samples >= 0);
+  REQUIRE(states != nullptr || num_samples == 0);
+  auto hanabi_observation =
+      reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+          observation->observation);
+  std::vector<double> weights;
+  if (card_weights != nullptr) {
+    const hanabi_learning_env::HanabiGame* game =
+        hanabi_observation->ParentGame();
+    weights.assign(card_weights,
+                   card_weights + hanabi_observation->Hands()[0].Cards().size() *
+                                      game->NumColors() * game->NumRanks());
+  }
+  std::mt19937 rng;
+  rng.seed(seed >= 0 ? seed : std::random_device()());
+  auto samples = hanabi_learning_env::SampleDeterminizations(
+      *hanabi_observation, num_samples,
+      card_weights != nullptr ? &weights : nullptr, &rng);
+  for (int i = 0; i < samples.size(); ++i) {
+    states[i].state = new hanabi_learning_env::HanabiState(samples[i]);
+  }
+  return samples.size();
+}
+
 void NewObservationEncoder(pyhanabi_observation_encoder_t* encoder,
                            pyhanabi_game_t* game, int type) {
   REQUIRE(encoder != nullptr);
@@ -805,6 +1141,10 @@ void NewObservationEncoder(pyhanabi_observation_encoder_t* encoder,
       encoder->encoder = static_cast<hanabi_learning_env::ObservationEncoder*>(
           new hanabi_learning_env::CanonicalObservationEncoder(hanabi_game));
       break;
+    case hanabi_learning_env::ObservationEncoder::Type::kBelief:
+      encoder->encoder = static_cast<hanabi_learning_env::ObservationEncoder*>(
+          new hanabi_learning_env::BeliefObservationEncoder(hanabi_game));
+      break;
     default:
       std::cerr << "Encoder type not recognized." << std::endl;
       encoder->encoder = nullptr;
@@ -857,4 +1197,95 @@ char* EncodeObservation(pyhanabi_observation_encoder_t* encoder,
   return strdup(obs_str.c_str());
 }
 
+void EncodeObservationInto(pyhanabi_observation_encoder_t* encoder,
+                           pyhanabi_observation_t* observation,
+                           float* encoding) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  REQUIRE(encoding != nullptr);
+  auto obs_enc = reinterpret_cast<hanabi_learning_env::ObservationEncoder*>(
+      encoder->encoder);
+  auto obs = reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+      observation->observation);
+  obs_enc->EncodeInto(*obs, encoding);
+}
+
+int ObservationMaxActiveBits(pyhanabi_observation_encoder_t* encoder) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  auto obs_enc = reinterpret_cast<hanabi_learning_env::ObservationEncoder*>(
+      encoder->encoder);
+  REQUIRE(obs_enc->type() ==
+          hanabi_learning_env::ObservationEncoder::Type::kCanonical);
+  return static_cast<hanabi_learning_env::CanonicalObservationEncoder*>(
+             obs_enc)->MaxActiveBits();
+}
+
+int EncodeObservationSparse(pyhanabi_observation_encoder_t* encoder,
+                            pyhanabi_observation_t* observation,
+                            int16_t* indices) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  REQUIRE(indices != nullptr);
+  auto obs_enc = reinterpret_cast<hanabi_learning_env::ObservationEncoder*>(
+      encoder->encoder);
+  REQUIRE(obs_enc->type() ==
+          hanabi_learning_env::ObservationEncoder::Type::kCanonical);
+  auto obs = reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+      observation->observation);
+  return static_cast<hanabi_learning_env::CanonicalObservationEncoder*>(
+             obs_enc)->EncodeSparse(*obs, indices);
+}
+
+void NewIncrementalEncoder(pyhanabi_incremental_encoder_t* encoder,
+                           pyhanabi_game_t* game) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(game != nullptr);
+  REQUIRE(game->game != nullptr);
+  encoder->encoder = new hanabi_learning_env::IncrementalCanonicalEncoder(
+      reinterpret_cast<hanabi_learning_env::HanabiGame*>(game->game));
+}
+
+void DeleteIncrementalEncoder(pyhanabi_incremental_encoder_t* encoder) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  delete reinterpret_cast<hanabi_learning_env::IncrementalCanonicalEncoder*>(
+      encoder->encoder);
+  encoder->encoder = nullptr;
+}
+
+int IncrementalEncoderSize(pyhanabi_incremental_encoder_t* encoder) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  return reinterpret_cast<hanabi_learning_env::IncrementalCanonicalEncoder*>(
+             encoder->encoder)
+      ->Size();
+}
+
+const uint8_t* EncodeObservationIncremental(
+    pyhanabi_incremental_encoder_t* encoder,
+    pyhanabi_observation_t* observation, int player) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  REQUIRE(observation != nullptr);
+  REQUIRE(observation->observation != nullptr);
+  auto obs = reinterpret_cast<hanabi_learning_env::HanabiObservation*>(
+      observation->observation);
+  return reinterpret_cast<hanabi_learning_env::IncrementalCanonicalEncoder*>(
+             encoder->encoder)
+      ->Encode(*obs, player);
+}
+
+void ResetIncrementalEncoder(pyhanabi_incremental_encoder_t* encoder) {
+  REQUIRE(encoder != nullptr);
+  REQUIRE(encoder->encoder != nullptr);
+  reinterpret_cast<hanabi_learning_env::IncrementalCanonicalEncoder*>(
+      encoder->encoder)
+      ->Reset();
+}
+
 } /* extern "C" */
@@ -21,6 +21,8 @@
  * The set of functions below is referred to as the 'cdef' throughout the code.
  */
 
+#include <stdint.h>
+
 extern "C" {
 
 typedef struct PyHanabiCard {
@@ -63,6 +65,11 @@ typedef struct PyHanabiObservationEncoder {
   void* encoder;
 } pyhanabi_observation_encoder_t;
 
+typedef struct PyHanabiIncrementalEncoder {
+  /* Points to a hanabi_learning_env::IncrementalCanonicalEncoder. */
+  void* encoder;
+} pyhanabi_incremental_encoder_t;
+
 /* Utility Functions. */
 void DeleteString(char* str);
 
@@ -83,6 +90,8 @@ void DeleteMoveList(void* movelist);
 int NumMoves(void* movelist);
 void GetMove(void* movelist, int index, pyhanabi_move_t* move);
 void DeleteMove(pyhanabi_move_t* move);
+/* Deletes the moves of the first count slots, filled by a *Into function. */
+void DeleteMoves(pyhanabi_move_t* moves, int count);
 char* MoveToString(pyhanabi_move_t* move);
 int MoveType(pyhanabi_move_t* move);
 int CardIndex(pyhanabi_move_t* move);
@@ -96,8 +105,12 @@ bool GetRevealRankMove(int target_offset, int rank, pyhanabi_move_t* move);
 
 /* HistoryItem functions. */
 void DeleteHistoryItem(pyhanabi_history_item_t* item);
+/* Deletes the items of the first count slots, filled by a *Into function. */
+void DeleteHistoryItems(pyhanabi_history_item_t* items, int count);
 char* HistoryItemToString(pyhanabi_history_item_t* item);
 void HistoryItemMove(pyhanabi_history_item_t* item, pyhanabi_move_t* move);
+/* Points move to the item's move, valid while the item is. */
+void HistoryItemMoveRef(pyhanabi_history_item_t* item, pyhanabi_move_t* move);
 int HistoryItemPlayer(pyhanabi_history_item_t* item);
 int HistoryItemScored(pyhanabi_history_item_t* item);
 int HistoryItemInformationToken(pyhanabi_history_item_t* item);
@@ -109,12 +122,23 @@ int HistoryItemDealToPlayer(pyhanabi_history_item_t* item);
 
 /* State functions. */
 void NewState(pyhanabi_game_t* game, pyhanabi_state_t* state);
+void NewSeededState(pyhanabi_game_t* game, int start_player, int seed,
+                    pyhanabi_state_t* state);
 void CopyState(const pyhanabi_state_t* src, pyhanabi_state_t* dest);
+void CopyStateForSearch(const pyhanabi_state_t* src, pyhanabi_state_t* dest);
 void DeleteState(pyhanabi_state_t* state);
 const void* StateParentGame(pyhanabi_state_t* state);
 void StateApplyMove(pyhanabi_state_t* state, pyhanabi_move_t* move);
+bool StateUndoMove(pyhanabi_state_t* state);
 int StateCurPlayer(pyhanabi_state_t* state);
 void StateDealRandomCard(pyhanabi_state_t* state);
+void StateDealPendingCards(pyhanabi_state_t* state);
+/* Plays state to the end, returns the score. If stats is not null, it
+ * receives score, fireworks, moves, plays, bombs, discards and hints. */
+int StateRolloutToTerminal(pyhanabi_state_t* state, int policy, int seed,
+                           int* stats);
+/* Reseeds the state's generator, with a seed drawn from its game if seed < 0. */
+void StateSetSeed(pyhanabi_state_t* state, int seed);
 int StateDeckSize(pyhanabi_state_t* state);
 int StateFireworks(pyhanabi_state_t* state, int color);
 int StateDiscardPileSize(pyhanabi_state_t* state);
@@ -125,9 +149,16 @@ void StateGetHandCard(pyhanabi_state_t* state, int pid, int index,
 int StateEndOfGameStatus(pyhanabi_state_t* state);
 int StateInformationTokens(pyhanabi_state_t* state);
 void* StateLegalMoves(pyhanabi_state_t* state);
+/* The *Into functions copy a list into at most capacity slots, and return its
+   size. Slots whose pointer is not NULL hold an object of an earlier call,
+   which is reused. */
+int StateLegalMovesInto(pyhanabi_state_t* state, pyhanabi_move_t* moves,
+                        int capacity);
 int StateLifeTokens(pyhanabi_state_t* state);
 int StateNumPlayers(pyhanabi_state_t* state);
 int StateScore(pyhanabi_state_t* state);
+uint64_t StateHash(pyhanabi_state_t* state);
+int StateMoveCount(pyhanabi_state_t* state);
 char* StateToString(pyhanabi_state_t* state);
 bool MoveIsLegal(const pyhanabi_state_t* state, const pyhanabi_move_t* move);
 bool CardPlayableOnFireworks(const pyhanabi_state_t* state, int color,
@@ -135,12 +166,27 @@ bool CardPlayableOnFireworks(const pyhanabi_state_t* state, int color,
 int StateLenMoveHistory(pyhanabi_state_t* state);
 void StateGetMoveHistory(pyhanabi_state_t* state, int index,
                          pyhanabi_history_item_t* item);
+int StateMoveHistoryInto(pyhanabi_state_t* state,
+                         pyhanabi_history_item_t* items, int capacity);
+/* Packs the moves of the history into at most capacity bytes: the move uid
+   of a player's move, or the chance outcome uid of a deal. Returns the number
+   of moves, or -1 if the history does not start at the start of the game. */
+int StateMoveUidsInto(pyhanabi_state_t* state, unsigned char* uids,
+                      int capacity);
+/* Returns the first player to act, or -1 if it is not known yet. */
+int StateStartPlayer(pyhanabi_state_t* state);
+/* Applies count moves packed by StateMoveUidsInto, up to the first illegal
+   one. Returns the number of moves applied. */
+int StateApplyMoveUids(pyhanabi_state_t* state, const unsigned char* uids,
+                       int count);
 
 /* Game functions. */
 void DeleteGame(pyhanabi_game_t* game);
 void NewDefaultGame(pyhanabi_game_t* game);
 void NewGame(pyhanabi_game_t* game, int list_length, const char** param_list);
 char* GameParamString(pyhanabi_game_t* game);
+/* Reseeds the generator the game's states draw their seeds from. */
+void GameSetSeed(pyhanabi_game_t* game, int seed);
 int NumPlayers(pyhanabi_game_t* game);
 int NumColors(pyhanabi_game_t* game);
 int NumRanks(pyhanabi_game_t* game);
@@ -152,10 +198,16 @@ int NumCards(pyhanabi_game_t* game, int color, int rank);
 int GetMoveUid(pyhanabi_game_t* game, pyhanabi_move_t* move);
 void GetMoveByUid(pyhanabi_game_t* game, int move_uid, pyhanabi_move_t* move);
 int MaxMoves(pyhanabi_game_t* game);
+int MaxChanceOutcomes(pyhanabi_game_t* game);
 
 /* Observation functions. */
 void NewObservation(pyhanabi_state_t* state, int player,
                     pyhanabi_observation_t* observation);
+/* A lazy observation references the state, which must not change nor be
+ * deleted until ObsSnapshot is called. */
+void NewLazyObservation(pyhanabi_state_t* state, int player,
+                        pyhanabi_observation_t* observation);
+void ObsSnapshot(pyhanabi_observation_t* observation);
 void DeleteObservation(pyhanabi_observation_t* observation);
 char* ObsToString(pyhanabi_observation_t* observation);
 int ObsCurPlayerOffset(pyhanabi_observation_t* observation);
@@ -165,21 +217,32 @@ void ObsGetHandCard(pyhanabi_observation_t* observation, int pid, int index,
                     pyhanabi_card_t* card);
 void ObsGetHandCardKnowledge(pyhanabi_observation_t* observation, int pid,
                              int index, pyhanabi_card_knowledge_t* knowledge);
+int ObsHandCardKnowledgeInto(pyhanabi_observation_t* observation, int pid,
+                             pyhanabi_card_knowledge_t* knowledge,
+                             int capacity);
 int ObsDiscardPileSize(pyhanabi_observation_t* observation);
 void ObsGetDiscard(pyhanabi_observation_t* observation, int index,
                    pyhanabi_card_t* card);
 int ObsFireworks(pyhanabi_observation_t* observation, int color);
 int ObsDeckSize(pyhanabi_observation_t* observation);
+int ObsMoveCount(pyhanabi_observation_t* observation);
 int ObsNumLastMoves(pyhanabi_observation_t* observation);
 void ObsGetLastMove(pyhanabi_observation_t* observation, int index,
                     pyhanabi_history_item_t* item);
+int ObsLastMovesInto(pyhanabi_observation_t* observation,
+                     pyhanabi_history_item_t* items, int capacity);
 int ObsInformationTokens(pyhanabi_observation_t* observation);
 int ObsLifeTokens(pyhanabi_observation_t* observation);
 int ObsNumLegalMoves(pyhanabi_observation_t* observation);
 void ObsGetLegalMove(pyhanabi_observation_t* observation, int index,
                      pyhanabi_move_t* move);
+int ObsLegalMovesInto(pyhanabi_observation_t* observation,
+                      pyhanabi_move_t* moves, int capacity);
 bool ObsCardPlayableOnFireworks(const pyhanabi_observation_t* observation,
                                 int color, int rank);
+int ObsSampleDeterminizations(pyhanabi_observation_t* observation,
+                              int num_samples, const double* card_weights,
+                              int seed, pyhanabi_state_t* states);
 
 /* ObservationEncoder functions. */
 void NewObservationEncoder(pyhanabi_observation_encoder_t* encoder,
@@ -188,6 +251,30 @@ void DeleteObservationEncoder(pyhanabi_observation_encoder_t* encoder);
 char* ObservationShape(pyhanabi_observation_encoder_t* encoder);
 char* EncodeObservation(pyhanabi_observation_encoder_t* encoder,
                         pyhanabi_observation_t* observation);
+/* Writes the encoding as floats to encoding, which must have room for the
+ * product of the observation shape. */
+void EncodeObservationInto(pyhanabi_observation_encoder_t* encoder,
+                           pyhanabi_observation_t* observation,
+                           float* encoding);
+/* Sparse encodings, for the canonical encoder: the indices of the bits set,
+ * in increasing order. indices must have room for ObservationMaxActiveBits
+ * entries. Returns the number of indices written. */
+int ObservationMaxActiveBits(pyhanabi_observation_encoder_t* encoder);
+int EncodeObservationSparse(pyhanabi_observation_encoder_t* encoder,
+                            pyhanabi_observation_t* observation,
+                            int16_t* indices);
+
+/* IncrementalCanonicalEncoder functions. */
+void NewIncrementalEncoder(pyhanabi_incremental_encoder_t* encoder,
+                           pyhanabi_game_t* game);
+void DeleteIncrementalEncoder(pyhanabi_incremental_encoder_t* encoder);
+int IncrementalEncoderSize(pyhanabi_incremental_encoder_t* encoder);
+/* Returns the canonical encoding as bytes of 0 or 1, owned by the encoder and
+ * valid until the next call for the same player or reset. */
+const uint8_t* EncodeObservationIncremental(
+    pyhanabi_incremental_encoder_t* encoder,
+    pyhanabi_observation_t* observation, int player);
+void ResetIncrementalEncoder(pyhanabi_incremental_encoder_t* encoder);
 
 } /* extern "C" */
 
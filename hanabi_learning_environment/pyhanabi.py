@@ -12,13 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Python interface to Hanabi code."""
+"""Python interface to Hanabi code.
+
+The C API is bound through the compiled extension built by pyhanabi_build.py
+if it is available (cffi API mode), and otherwise by parsing pyhanabi.h and
+loading libpyhanabi.so at run time (cffi ABI mode). In both modes, the GIL is
+released during every call to the library, so that states, observations and
+encoders can be used from several threads, one thread per object.
+
+The bindings are loaded on first use, rather than on import. In ABI mode, the
+parsed header is cached in cdef_cache_dir(), keyed by a hash of the header.
+"""
+import hashlib
+import importlib.util
 import os
-import re
-import cffi
 import enum
 import sys
 
+from hanabi_learning_environment import instrumentation
+from hanabi_learning_environment import pyhanabi_build
+
 DEFAULT_CDEF_PREFIXES = (None, ".", os.path.dirname(__file__), "/include")
 DEFAULT_LIB_PREFIXES = (None, ".", os.path.dirname(__file__), "/lib")
 PYHANABI_HEADER = "pyhanabi.h"
@@ -26,10 +39,9 @@ PYHANABI_LIB = ["libpyhanabi.so", "libpyhanabi.dylib"]
 COLOR_CHAR = ["R", "Y", "G", "W", "B"]  # consistent with hanabi_lib/util.cc
 CHANCE_PLAYER_ID = -1
 
-ffi = cffi.FFI()
-lib = None
 cdef_loaded_flag = False
 lib_loaded_flag = False
+api_mode_flag = False
 
 
 if sys.version_info < (3,):
@@ -39,6 +51,72 @@ else:
   def encode_ffi_string(x):
     return str(ffi.string(x), 'ascii')
 
+class _LazyBinding(object):
+  """Stands for ffi or lib until the bindings are loaded.
+
+  The first attribute access loads the bindings with load(), which replaces
+  the placeholders with the loaded ffi and lib.
+  """
+
+  __slots__ = ["_name"]
+
+  def __init__(self, name):
+    self._name = name
+
+  def __getattr__(self, attribute):
+    if not load():
+      raise ImportError("Could not load the pyhanabi library.")
+    return getattr(globals()[self._name], attribute)
+
+
+ffi = _LazyBinding("ffi")
+lib = _LazyBinding("lib")
+
+
+def cdef_cache_dir():
+  """Returns the directory of the cached headers of ABI mode.
+
+  $PYHANABI_CACHE_DIR if set, or hanabi_learning_environment in the user's
+  cache directory.
+  """
+  cache_dir = os.environ.get("PYHANABI_CACHE_DIR")
+  if cache_dir:
+    return cache_dir
+  cache_home = (os.environ.get("XDG_CACHE_HOME") or
+                os.path.join(os.path.expanduser("~"), ".cache"))
+  return os.path.join(cache_home, "hanabi_learning_environment")
+
+
+def _load_cdef(cdef_file):
+  """Returns an FFI with the declarations of a header, cached if possible."""
+  import _cffi_backend  # pylint: disable=g-import-not-at-top
+  with open(cdef_file, "rb") as header:
+    header_bytes = header.read()
+  # The cached module is specific to the cffi version that wrote it.
+  key = hashlib.sha1(header_bytes + _cffi_backend.__version__.encode())
+  module_name = "_pyhanabi_cdef_" + key.hexdigest()[:16]
+  path = os.path.join(cdef_cache_dir(), module_name + ".py")
+  if os.path.exists(path):
+    try:
+      spec = importlib.util.spec_from_file_location(module_name, path)
+      module = importlib.util.module_from_spec(spec)
+      spec.loader.exec_module(module)
+      return module.ffi
+    except Exception:  # pylint: disable=broad-except
+      pass  # Unreadable cache, parse the header again.
+  cdef_string = pyhanabi_build.extract_cdef(header_bytes.decode("ascii"))
+  try:
+    if not os.path.isdir(cdef_cache_dir()):
+      os.makedirs(cdef_cache_dir())
+    return pyhanabi_build.emit_cdef_module(cdef_string, module_name, path)
+  except OSError:
+    # The cache is not writable, parse the header without caching it.
+    import cffi  # pylint: disable=g-import-not-at-top
+    cdef_ffi = cffi.FFI()
+    cdef_ffi.cdef(cdef_string)
+    return cdef_ffi
+
+
 def try_cdef(header=PYHANABI_HEADER, prefixes=DEFAULT_CDEF_PREFIXES):
   """Try parsing library header file. Must be called before any pyhanabi calls.
 
@@ -49,24 +127,12 @@ def try_cdef(header=PYHANABI_HEADER, prefixes=DEFAULT_CDEF_PREFIXES):
     True if header was successfully parsed, False on failure.
   """
   global cdef_loaded_flag
+  global ffi
   if cdef_loaded_flag: return True
   for prefix in prefixes:
     try:
       cdef_file = header if prefix is None else prefix + "/" + header
-      lines = open(cdef_file).readlines()
-      reading_cdef = False
-      cdef_string = ""
-      for line in lines:
-        line = line.rstrip()
-        if re.match("extern *\"C\" *{", line):
-          reading_cdef = True
-          continue
-        elif re.match("} */[*] *extern *\"C\" *[*]/", line):
-          reading_cdef = False
-          continue
-        if reading_cdef:
-          cdef_string = cdef_string + line + "\n"
-      ffi.cdef(cdef_string)
+      ffi = _load_cdef(cdef_file)
       cdef_loaded_flag = True
       return True
     except IOError:
@@ -104,14 +170,68 @@ def try_load(library=None, prefixes=DEFAULT_LIB_PREFIXES):
   return False
 
 
+def try_load_api_mode():
+  """Try importing the compiled extension built by pyhanabi_build.py.
+
+  On success, ffi and lib are those of the extension, and the header and
+  library count as loaded. Must be called before any pyhanabi calls.
+
+  Returns:
+    True if the extension was imported, False on failure.
+  """
+  global ffi
+  global lib
+  global cdef_loaded_flag
+  global lib_loaded_flag
+  global api_mode_flag
+  if api_mode_flag: return True
+  if cdef_loaded_flag or lib_loaded_flag: return False
+  try:
+    from hanabi_learning_environment import _pyhanabi_cffi  # pylint: disable=g-import-not-at-top
+  except ImportError:
+    return False
+  ffi = _pyhanabi_cffi.ffi
+  lib = _pyhanabi_cffi.lib
+  cdef_loaded_flag = True
+  lib_loaded_flag = True
+  api_mode_flag = True
+  return True
+
+
+def api_mode():
+  """Return True if pyhanabi uses the compiled extension."""
+  return api_mode_flag
+
+
+def load():
+  """Loads the bindings, unless they are loaded already.
+
+  Uses the compiled extension if possible, and otherwise the header and the
+  library from their default locations. Called on first use of ffi or lib.
+
+  Returns:
+    True if the bindings are loaded, False on failure.
+  """
+  if lib_loaded_flag: return True
+  if try_load_api_mode(): return True
+  return try_cdef() and try_load()
+
+
 def cdef_loaded():
-  """Return True if pyhanabi header has been successfully parsed."""
+  """Return True if pyhanabi header has been successfully parsed.
+
+  Loads the bindings if they were not loaded yet.
+  """
+  load()
   return cdef_loaded_flag
 
 
 def lib_loaded():
-  """Return True if pyhanabi library has been successfully loaded."""
-  return lib_loaded_flag
+  """Return True if pyhanabi library has been successfully loaded.
+
+  Loads the bindings if they were not loaded yet.
+  """
+  return load()
 
 
 def color_idx_to_char(color_idx):
@@ -200,6 +320,104 @@ class HanabiCard(object):
     return {"color": color_idx_to_char(self.color()), "rank": self.rank()}
 
 
+class _SlotBlock(object):
+  """Array of C API structs lent by a _SlotPool.
+
+  Wrappers of the slots keep a reference to the block, and the block to the
+  object the slots point into, if any. The array goes back to its pool once
+  the block is unreferenced, with the C++ objects of its slots, which the next
+  fill reuses.
+  """
+
+  __slots__ = ["slots", "_pool", "_capacity", "_owner"]
+
+  def __init__(self, pool, slots, capacity, owner):
+    self.slots = slots
+    self._pool = pool
+    self._capacity = capacity
+    self._owner = owner
+
+  def __del__(self):
+    try:
+      self._pool.give_back(self.slots, self._capacity)
+    except (AttributeError, TypeError):
+      pass  # The module is torn down at exit.
+
+
+class _SlotPool(object):
+  """Free arrays of a C API struct, by capacity.
+
+  The lists returned by legal_moves, last_moves, card_knowledge and
+  move_history are flyweights over the slots of one array from a pool, rather
+  than a struct and a C++ object allocated, and freed, per element.
+  """
+
+  _MIN_CAPACITY = 16
+
+  def __init__(self, ctype, deleter=None, max_free=16):
+    """Initializes the pool. No array is allocated until needed.
+
+    Args:
+      ctype: str, C type of the structs.
+      deleter: str, name of the lib function deleting the C++ objects of the
+        first count slots of an array, or None if slots do not own objects.
+      max_free: int, number of free arrays kept per capacity.
+    """
+    self._ctype = ctype + "[]"
+    self._deleter = deleter
+    self._max_free = max_free
+    self._free = {}
+
+  def take(self, size, owner=None):
+    """Returns a _SlotBlock of at least size slots.
+
+    Args:
+      size: int, number of slots needed.
+      owner: object the slots will point into, kept alive by the block.
+    """
+    capacity = self._MIN_CAPACITY
+    while capacity < size:
+      capacity *= 2
+    # list.pop and list.append are atomic, so threads can share the pool. A
+    # list can be emptied by another thread after any check, so pop first.
+    try:
+      slots = self._free[capacity].pop()
+    except (KeyError, IndexError):
+      slots = ffi.new(self._ctype, capacity)
+    return _SlotBlock(self, slots, capacity, owner)
+
+  def give_back(self, slots, capacity):
+    free = self._free.setdefault(capacity, [])
+    if len(free) < self._max_free:
+      free.append(slots)
+    elif self._deleter is not None:
+      getattr(lib, self._deleter)(slots, capacity)
+
+
+_move_pool = _SlotPool("pyhanabi_move_t", "DeleteMoves")
+_history_item_pool = _SlotPool("pyhanabi_history_item_t", "DeleteHistoryItems")
+_card_knowledge_pool = _SlotPool("pyhanabi_card_knowledge_t")
+
+
+def _fill_from_pool(pool, fill, size, owner=None):
+  """Fills a block of a pool, and returns it with the number of values.
+
+  Args:
+    pool: _SlotPool of the slots.
+    fill: function (slots, capacity) returning the number of values, of a
+      *Into function of the C API.
+    size: int, expected number of values, or an estimate. If it is too small,
+      a larger block is filled again.
+    owner: object the slots point into.
+  """
+  block = pool.take(size, owner)
+  count = fill(block.slots, block._capacity)  # pylint: disable=protected-access
+  if count > block._capacity:  # pylint: disable=protected-access
+    block = pool.take(count, owner)
+    fill(block.slots, count)
+  return block, count
+
+
 class HanabiCardKnowledge(object):
   """Accumulated knowledge about color and rank of an initially unknown card.
 
@@ -226,8 +444,15 @@ class HanabiCardKnowledge(object):
   Python wrapper of C++ HanabiHand::CardKnowledge class.
   """
 
-  def __init__(self, knowledge):
+  def __init__(self, knowledge, owner=None):
+    """Wraps a pyhanabi_card_knowledge_t.
+
+    Args:
+      knowledge: pyhanabi_card_knowledge_t*, pointing into an observation.
+      owner: object kept alive while the wrapper is, e.g. the observation.
+    """
     self._knowledge = knowledge
+    self._owner = owner
 
   def color(self):
     """Returns color index if exact color was revealed, or None otherwise.
@@ -299,9 +524,18 @@ class HanabiMove(object):
   Python wrapper of C++ HanabiMove class.
   """
 
-  def __init__(self, move):
+  def __init__(self, move, owner=None):
+    """Wraps a pyhanabi_move_t.
+
+    Args:
+      move: pyhanabi_move_t*. Its C++ move is deleted with the wrapper, unless
+        owner is given.
+      owner: object owning the C++ move, kept alive while the wrapper is,
+        e.g. a _SlotBlock or a HanabiHistoryItem.
+    """
     assert move is not None
     self._move = move
+    self._owner = owner
 
   @property
   def c_move(self):
@@ -362,9 +596,9 @@ class HanabiMove(object):
     return self.__str__()
 
   def __del__(self):
-    if self._move is not None:
+    if self._move is not None and self._owner is None:
       lib.DeleteMove(self._move)
-      self._move = None
+    self._move = None
     del self
 
   def to_dict(self):
@@ -407,13 +641,22 @@ class HanabiHistoryItem(object):
   Python wrapper of C++ HanabiHistoryItem class.
   """
 
-  def __init__(self, item):
+  def __init__(self, item, owner=None):
+    """Wraps a pyhanabi_history_item_t.
+
+    Args:
+      item: pyhanabi_history_item_t*. Its C++ item is deleted with the
+        wrapper, unless owner is given.
+      owner: object owning the C++ item, kept alive while the wrapper is.
+    """
     self._item = item
+    self._owner = owner
 
   def move(self):
+    """Returns the move, a view of this item's."""
     c_move = ffi.new("pyhanabi_move_t*")
-    lib.HistoryItemMove(self._item, c_move)
-    return HanabiMove(c_move)
+    lib.HistoryItemMoveRef(self._item, c_move)
+    return HanabiMove(c_move, self)
 
   def player(self):
     return lib.HistoryItemPlayer(self._item)
@@ -478,9 +721,9 @@ class HanabiHistoryItem(object):
     return self.__str__()
 
   def __del__(self):
-    if self._item is not None:
+    if self._item is not None and self._owner is None:
       lib.DeleteHistoryItem(self._item)
-      self._item = None
+    self._item = None
     del self
 
 
@@ -492,6 +735,35 @@ class HanabiEndOfGameType(enum.IntEnum):
   COMPLETED_FIREWORKS = 3
 
 
+def _wrap_c_state(c_state_pointer, c_game, parent_game):
+  """Returns a HanabiState owning an already allocated C++ state.
+
+  Args:
+    c_state_pointer: pointer to a C++ HanabiState, deleted with the wrapper.
+    c_game: pyhanabi_game_t of the state's game.
+    parent_game: HanabiGame of the state, kept alive by the state.
+  """
+  state = HanabiState.__new__(HanabiState)
+  state._game = c_game
+  state._parent_game = parent_game
+  state._state = ffi.new("pyhanabi_state_t*")
+  state._state.state = c_state_pointer
+  return state
+
+
+class RolloutPolicy(enum.IntEnum):
+  """Built-in playout policies, consistent with rollout.h."""
+  # Uniformly random legal moves.
+  RANDOM = 0
+  # Play a playable card, else discard a dead or the oldest card, else hint.
+  # The policy sees every card, including the current player's.
+  SIMPLE = 1
+
+
+ROLLOUT_STATS = ["score", "fireworks", "num_moves", "num_plays", "num_bombs",
+                 "num_discards", "num_hints"]
+
+
 class HanabiState(object):
   """Current environment state for an active Hanabi game.
 
@@ -502,35 +774,101 @@ class HanabiState(object):
   Python wrapper of C++ HanabiState class.
   """
 
-  def __init__(self, game, c_state=None):
+  def __init__(self, game, c_state=None, seed=None, start_player=None):
     """Returns a new state.
 
+    Every state draws its chance events from its own random number generator,
+    so states can be stepped concurrently from several threads.
+
     Args:
       game: HanabiGame describing the parameters for a game of Hanabi.
       c_state: C++ state to copy, or None for a new state.
-
-    NOTE: If c_state is supplied, game is ignored and c_state game is used.
+      seed: int >= 0, seed of the new state's random number generator. If
+        None, the seed is drawn from the game's random number generator.
+      start_player: int, first player to act after the initial deal. If None,
+        the start player is chosen as configured by the game.
+
+    NOTE: If c_state is supplied, game and start_player are ignored and
+    c_state game is used. The copy is reseeded with seed, as for copy. game
+    should still be the HanabiGame of c_state, so that the state keeps it
+    alive.
     """
     self._state = ffi.new("pyhanabi_state_t*")
+    # The C state points to the C game, which the HanabiGame frees.
+    self._parent_game = game
     if c_state is None:
       self._game = game.c_game
-      lib.NewState(self._game, self._state)
+      if seed is None and start_player is None:
+        lib.NewState(self._game, self._state)
+      else:
+        lib.NewSeededState(self._game,
+                           -1 if start_player is None else start_player,
+                           -1 if seed is None else seed, self._state)
     else:
       self._game = lib.StateParentGame(c_state)
       lib.CopyState(c_state, self._state)
+      lib.StateSetSeed(self._state, -1 if seed is None else seed)
+
+  def copy(self, search=False, seed=None, keep_rng=False):
+    """Returns a copy of the state.
+
+    The copy's random number generator is reseeded, so that copies of a state
+    deal different cards, unless keep_rng is True.
+
+    Args:
+      search: bool, if True return a copy meant for tree search. It only keeps
+        the recent history needed to build observations, and moves applied to
+        it can be reverted with undo_move.
+      seed: int >= 0, seed of the copy's random number generator. If None, the
+        seed is drawn from the game's random number generator.
+      keep_rng: bool, if True the copy keeps a copy of this state's random
+        number generator, and deals the same cards as this state would.
+    """
+    if keep_rng and seed is not None:
+      raise ValueError("A seed cannot be given with keep_rng=True.")
+    state = HanabiState.__new__(HanabiState)
+    # Keep the Python-level game, the C state only knows the C++ game.
+    state._game = self._game
+    state._parent_game = self._parent_game
+    state._state = ffi.new("pyhanabi_state_t*")
+    if search:
+      lib.CopyStateForSearch(self._state, state._state)
+    else:
+      lib.CopyState(self._state, state._state)
+    if not keep_rng:
+      lib.StateSetSeed(state._state, -1 if seed is None else seed)
+    return state
 
-  def copy(self):
-    """Returns a copy of the state."""
-    return HanabiState(None, self._state)
+  def observation(self, player, lazy=False):
+    """Returns player's observed view of current environment state.
 
-  def observation(self, player):
-    """Returns player's observed view of current environment state."""
-    return HanabiObservation(self._state, self._game, player)
+    Args:
+      player: int, index of the observing player.
+      lazy: bool, if True the observation is a view of this state, which only
+        copies the hands, discard pile, last moves and legal moves when they
+        are first read. It is cheaper when only some of them are read, but
+        must not be read after the state changes, unless snapshot() was
+        called first. Reading it then raises ValueError.
+    """
+    return HanabiObservation(self._state, self._game, player, lazy=lazy,
+                             owner=self, parent_game=self._parent_game)
 
   def apply_move(self, move):
     """Advance the environment state by making move for acting player."""
     lib.StateApplyMove(self._state, move.c_move)
 
+  def undo_move(self):
+    """Reverts the most recent move applied since copy(search=True).
+
+    Chance moves count as moves, so undoing a play or discard also requires
+    undoing the deal that followed it. The random number generator used by
+    deal_random_card is not rewound.
+
+    Returns:
+      True if a move was reverted, False if there is no move to revert.
+    """
+    return lib.StateUndoMove(self._state)
+
   def cur_player(self):
     """Returns index of next player to act.
 
@@ -542,6 +880,49 @@ class HanabiState(object):
     """Returns number of cards left in the deck."""
     return lib.StateDeckSize(self._state)
 
+  def move_count(self):
+    """Returns the number of moves applied so far, including chance moves."""
+    return lib.StateMoveCount(self._state)
+
+  def move_uids(self):
+    """Returns the moves made so far packed as bytes, one byte per move.
+
+    A player's move is packed as its uid, see HanabiGame.get_move_uid, and a
+    deal as its chance outcome uid, color * num_ranks + rank. Which of the
+    two a byte holds follows from the player to act, so the bytes can be
+    replayed with apply_move_uids from a state with the same start player.
+
+    Raises:
+      ValueError: if the state does not hold its history from the start of
+        the game, e.g. if it is a search copy.
+    """
+    size = lib.StateLenMoveHistory(self._state)
+    uids = ffi.new("unsigned char[]", size)
+    if lib.StateMoveUidsInto(self._state, uids, size) < 0:
+      raise ValueError("The state's move history is incomplete.")
+    return ffi.buffer(uids, size)[:]
+
+  def start_player(self):
+    """Returns the first player to act after the initial deal.
+
+    Returns CHANCE_PLAYER_ID during the initial deal, when it is not known
+    yet, or if the state does not hold its history from the start of the
+    game.
+    """
+    return lib.StateStartPlayer(self._state)
+
+  def apply_move_uids(self, uids):
+    """Applies moves packed by move_uids, up to the first illegal one.
+
+    Args:
+      uids: bytes-like object, moves packed by move_uids.
+
+    Returns:
+      The number of moves applied, len(uids) unless a move is illegal.
+    """
+    return lib.StateApplyMoveUids(
+        self._state, ffi.from_buffer("unsigned char[]", uids), len(uids))
+
   def discard_pile(self):
     """Returns a list of all discarded cards, in order they were discarded."""
     discards = []
@@ -568,6 +949,45 @@ class HanabiState(object):
     """If cur_player == CHANCE_PLAYER_ID, make a random card-deal move."""
     lib.StateDealRandomCard(self._state)
 
+  def deal_pending_cards(self):
+    """Makes random card-deal moves until a non-chance player is to act.
+
+    Equivalent to calling deal_random_card while cur_player is
+    CHANCE_PLAYER_ID, in a single call.
+    """
+    lib.StateDealPendingCards(self._state)
+
+  def rollout_to_terminal(self, policy=RolloutPolicy.RANDOM, seed=None,
+                          return_stats=False):
+    """Plays the game to the end in place with a built-in policy.
+
+    The whole playout, including the deals, runs in a single library call.
+
+    Args:
+      policy: RolloutPolicy choosing the moves.
+      seed: int >= 0, seed of the policy's random choices, or None. Cards are
+        dealt with the state's own generator, see set_seed.
+      return_stats: bool, whether to also return playout statistics.
+
+    Returns:
+      The final score, or if return_stats is True, a dict with the keys in
+      ROLLOUT_STATS.
+    """
+    c_stats = ffi.new("int[]", len(ROLLOUT_STATS)) if return_stats else ffi.NULL
+    score = lib.StateRolloutToTerminal(self._state, policy,
+                                       -1 if seed is None else seed, c_stats)
+    if not return_stats:
+      return score
+    return dict(zip(ROLLOUT_STATS, c_stats))
+
+  def set_seed(self, seed):
+    """Reseeds the random number generator used by deal_random_card.
+
+    Args:
+      seed: int >= 0.
+    """
+    lib.StateSetSeed(self._state, seed)
+
   def player_hands(self):
     """Returns a list of all hands, with cards ordered oldest to newest."""
     hand_list = []
@@ -596,15 +1016,13 @@ class HanabiState(object):
 
   def legal_moves(self):
     """Returns list of legal moves for currently acting player."""
-    moves = []
-    c_movelist = lib.StateLegalMoves(self._state)
-    num_moves = lib.NumMoves(c_movelist)
-    for i in range(num_moves):
-      c_move = ffi.new("pyhanabi_move_t*")
-      lib.GetMove(c_movelist, i, c_move)
-      moves.append(HanabiMove(c_move))
-    lib.DeleteMoveList(c_movelist)
-    return moves
+    block, num_moves = _fill_from_pool(
+        _move_pool,
+        lambda slots, capacity: lib.StateLegalMovesInto(
+            self._state, slots, capacity),
+        _move_pool._MIN_CAPACITY)  # pylint: disable=protected-access
+    slots = block.slots
+    return [HanabiMove(slots + i, block) for i in range(num_moves)]
 
   def move_is_legal(self, move):
     """Returns true if and only if move is legal for active agent."""
@@ -634,15 +1052,26 @@ class HanabiState(object):
     """
     return lib.StateScore(self._state)
 
+  def hash(self):
+    """Returns a 64-bit hash of the state.
+
+    The hash covers the hands, card knowledge, fireworks, tokens, deck
+    contents, current player and remaining turns, so states reached through
+    different move orders have the same hash. It is maintained incrementally
+    and costs nothing to read. States of games with the same parameters, other
+    than the seed, hash consistently across games and processes.
+    """
+    return lib.StateHash(self._state)
+
   def move_history(self):
     """Returns list of moves made, from oldest to most recent."""
-    history = []
-    history_len = lib.StateLenMoveHistory(self._state)
-    for i in range(history_len):
-      c_history_item = ffi.new("pyhanabi_history_item_t*")
-      lib.StateGetMoveHistory(self._state, i, c_history_item)
-      history.append(HanabiHistoryItem(c_history_item))
-    return history
+    block, history_len = _fill_from_pool(
+        _history_item_pool,
+        lambda slots, capacity: lib.StateMoveHistoryInto(
+            self._state, slots, capacity),
+        lib.StateLenMoveHistory(self._state))
+    slots = block.slots
+    return [HanabiHistoryItem(slots + i, block) for i in range(history_len)]
 
   def __str__(self):
     c_string = lib.StateToString(self._state)
@@ -711,8 +1140,15 @@ class HanabiGame(object):
       self._game = ffi.new("pyhanabi_game_t*")
       lib.NewGame(self._game, len(param_list), c_array)
 
-  def new_initial_state(self):
-    return HanabiState(self)
+  def new_initial_state(self, seed=None):
+    """Returns a new state at the start of a game.
+
+    Args:
+      seed: int >= 0, seed of the state's random number generator, which
+        determines the deal and, if random, the start player. If None, the
+        seed is drawn from this game's random number generator.
+    """
+    return HanabiState(self, seed=seed)
 
   @property
   def c_game(self):
@@ -725,6 +1161,14 @@ class HanabiGame(object):
       self._game = None
     del self
 
+  def set_seed(self, seed):
+    """Reseeds the generator that states created without a seed draw from.
+
+    Args:
+      seed: int >= 0.
+    """
+    lib.GameSetSeed(self._game, seed)
+
   def parameter_string(self):
     """Returns string with all parameter choices."""
     c_string = lib.GameParamString(self._game)
@@ -773,6 +1217,10 @@ class HanabiGame(object):
     """Returns number of instances of Card(color, rank) in the initial deck."""
     return lib.NumCards(self._game, color, rank)
 
+  def max_chance_outcomes(self):
+    """Returns the number of different card-deal moves."""
+    return lib.MaxChanceOutcomes(self._game)
+
   def get_move_uid(self, move):
     """Returns a unique ID describing a legal move, or -1 for invalid move."""
     return lib.GetMoveUid(self._game, move.c_move)
@@ -795,13 +1243,34 @@ class HanabiObservation(object):
   Python wrapper of C++ HanabiObservation class.
   """
 
-  def __init__(self, state, game, player):
-    """Construct using HanabiState.observation(player)."""
+  def __init__(self, state, game, player, lazy=False, owner=None,
+               parent_game=None):
+    """Construct using HanabiState.observation(player).
+
+    Args:
+      state: pyhanabi_state_t*, the C state.
+      game: pyhanabi_game_t*, the C game.
+      player: int, index of the observing player.
+      lazy: bool, whether to build a lazy view of the state.
+      owner: HanabiState owning the C state, kept alive by a lazy observation
+        until snapshot(). Reading a lazy observation after its move count
+        changed raises ValueError.
+      parent_game: HanabiGame owning the C game, kept alive by the
+        observation.
+    """
     self._observation = ffi.new("pyhanabi_observation_t*")
     self._game = game
-    lib.NewObservation(state, player, self._observation)
+    self._parent_game = parent_game
+    self._owner = None
+    if lazy:
+      lib.NewLazyObservation(state, player, self._observation)
+      self._owner = owner
+      self._move_count = lib.ObsMoveCount(self._observation)
+    else:
+      lib.NewObservation(state, player, self._observation)
 
   def __str__(self):
+    self._check_state()
     c_string = lib.ObsToString(self._observation)
     string = encode_ffi_string(c_string)
     lib.DeleteString(c_string)
@@ -816,10 +1285,32 @@ class HanabiObservation(object):
       self._observation = None
     del self
 
+  def _check_state(self):
+    """Raises ValueError if a lazy observation's state changed since."""
+    if (self._owner is not None and
+        self._owner.move_count() != self._move_count):
+      raise ValueError("The state changed since this lazy observation was "
+                       "made, call snapshot() before changing it.")
+
   def observation(self):
     """Returns the C++ HanabiObservation object."""
+    self._check_state()
     return self._observation
 
+  def snapshot(self):
+    """Copies what a lazy observation did not read yet from its state.
+
+    The observation can then be used after the state changes or is deleted.
+    Does nothing for observations that are not lazy.
+
+    Returns:
+      self.
+    """
+    if self._owner is not None:
+      lib.ObsSnapshot(self._observation)
+      self._owner = None
+    return self
+
   def cur_player_offset(self):
     """Returns the player index of the acting player, relative to observer."""
     return lib.ObsCurPlayerOffset(self._observation)
@@ -833,6 +1324,7 @@ class HanabiObservation(object):
 
      The observing player's cards are always invalid.
     """
+    self._check_state()
     hand_list = []
     c_card = ffi.new("pyhanabi_card_t*")
     for pid in range(self.num_players()):
@@ -851,19 +1343,27 @@ class HanabiObservation(object):
     Each HanabiCardKnowledge for a card gives the knowledge about the cards
     accumulated over all past reveal actions.
     """
+    self._check_state()
+    num_players = self.num_players()
+    hand_sizes = [lib.ObsGetHandSize(self._observation, pid)
+                  for pid in range(num_players)]
+    # The knowledge structs point into this observation.
+    block = _card_knowledge_pool.take(sum(hand_sizes), self)
+    slots = block.slots
     card_knowledge_list = []
-    for pid in range(self.num_players()):
-      player_card_knowledge = []
-      hand_size = lib.ObsGetHandSize(self._observation, pid)
-      for i in range(hand_size):
-        c_knowledge = ffi.new("pyhanabi_card_knowledge_t*")
-        lib.ObsGetHandCardKnowledge(self._observation, pid, i, c_knowledge)
-        player_card_knowledge.append(HanabiCardKnowledge(c_knowledge))
-      card_knowledge_list.append(player_card_knowledge)
+    start = 0
+    for pid in range(num_players):
+      hand_size = lib.ObsHandCardKnowledgeInto(
+          self._observation, pid, slots + start, hand_sizes[pid])
+      card_knowledge_list.append(
+          [HanabiCardKnowledge(slots + i, block)
+           for i in range(start, start + hand_size)])
+      start += hand_size
     return card_knowledge_list
 
   def discard_pile(self):
     """Returns a list of all discarded cards, in order they were discarded."""
+    self._check_state()
     discards = []
     c_card = ffi.new("pyhanabi_card_t*")
     for index in range(lib.ObsDiscardPileSize(self._observation)):
@@ -883,6 +1383,10 @@ class HanabiObservation(object):
     """Returns number of cards left in the deck."""
     return lib.ObsDeckSize(self._observation)
 
+  def move_count(self):
+    """Returns the number of moves made so far, including chance moves."""
+    return lib.ObsMoveCount(self._observation)
+
   def last_moves(self):
     """Returns moves made since observing player last acted.
 
@@ -890,12 +1394,14 @@ class HanabiObservation(object):
     move to oldest.  Oldest move is the last action made by observing
     player. Skips initial chance moves to deal hands.
     """
-    history_items = []
-    for i in range(lib.ObsNumLastMoves(self._observation)):
-      history_item = ffi.new("pyhanabi_history_item_t*")
-      lib.ObsGetLastMove(self._observation, i, history_item)
-      history_items.append(HanabiHistoryItem(history_item))
-    return history_items
+    self._check_state()
+    block, num_items = _fill_from_pool(
+        _history_item_pool,
+        lambda slots, capacity: lib.ObsLastMovesInto(
+            self._observation, slots, capacity),
+        lib.ObsNumLastMoves(self._observation))
+    slots = block.slots
+    return [HanabiHistoryItem(slots + i, block) for i in range(num_items)]
 
   def information_tokens(self):
     """Returns the number of information tokens remaining."""
@@ -910,12 +1416,17 @@ class HanabiObservation(object):
 
     List is empty if cur_player() != 0 (observer is not currently acting).
     """
-    moves = []
-    for i in range(lib.ObsNumLegalMoves(self._observation)):
-      move = ffi.new("pyhanabi_move_t*")
-      lib.ObsGetLegalMove(self._observation, i, move)
-      moves.append(HanabiMove(move))
-    return moves
+    self._check_state()
+    num_moves = lib.ObsNumLegalMoves(self._observation)
+    if not num_moves:
+      return []
+    block, num_moves = _fill_from_pool(
+        _move_pool,
+        lambda slots, capacity: lib.ObsLegalMovesInto(
+            self._observation, slots, capacity),
+        num_moves)
+    slots = block.slots
+    return [HanabiMove(slots + i, block) for i in range(num_moves)]
 
   def card_playable_on_fireworks(self, color, rank):
     """Returns true if and only if card can be successfully played.
@@ -926,10 +1437,52 @@ class HanabiObservation(object):
     """
     return lib.ObsCardPlayableOnFireworks(self._observation, color, rank)
 
+  def sample_determinizations(self, num_samples, card_weights=None, seed=None):
+    """Returns complete game states consistent with this observation.
+
+    The observing player's cards are drawn according to the number of unseen
+    copies of each card and the hints received, optionally weighted by
+    card_weights. The rest of the unseen cards form the deck. In the returned
+    states, players are seated relative to the observing player, who is
+    player 0, and the move history only holds the observation's last moves.
+
+    Args:
+      num_samples: int, number of states to sample.
+      card_weights: optional non-negative weights, indexed by
+        [card_index][color][rank] for each card in the observing player's hand,
+        e.g. beliefs about the hand. Weights that rule out every plausible card
+        are ignored for that card.
+      seed: int >= 0, seed for the sampling, or None for a random seed.
+
+    Returns:
+      A list of up to num_samples HanabiState objects. It is only shorter if
+      the hints cannot all be satisfied.
+    """
+    self._check_state()
+    c_weights = ffi.NULL
+    if card_weights is not None:
+      c_weights = ffi.new("double[]", [float(weight)
+                                       for card in card_weights
+                                       for color in card
+                                       for weight in color])
+    c_states = ffi.new("pyhanabi_state_t[]", num_samples)
+    num_sampled = lib.ObsSampleDeterminizations(
+        self._observation, num_samples, c_weights,
+        -1 if seed is None else seed, c_states)
+    return [_wrap_c_state(c_states[i].state, self._game, self._parent_game)
+            for i in range(num_sampled)]
+
 
 class ObservationEncoderType(enum.IntEnum):
-  """Encoder types, consistent with observation_encoder.h."""
+  """Encoder types, consistent with observation_encoder.h.
+
+  CANONICAL encodings are bits. BELIEF encodings are the canonical bits
+  followed by, for every card in every hand, the probability of each
+  (color, rank), given the card knowledge and the cards visible to both the
+  observer and the holder of the card.
+  """
   CANONICAL = 0
+  BELIEF = 1
 
 
 class ObservationEncoder(object):
@@ -943,8 +1496,12 @@ class ObservationEncoder(object):
   def __init__(self, game, enc_type=ObservationEncoderType.CANONICAL):
     """Construct using HanabiState.observation(player)."""
     self._game = game.c_game
+    self._parent_game = game
+    self._type = ObservationEncoderType(enc_type)
     self._encoder = ffi.new("pyhanabi_observation_encoder_t*")
     lib.NewObservationEncoder(self._encoder, self._game, enc_type)
+    self._size = None
+    self._max_active_bits = None
 
   def __del__(self):
     if self._encoder is not None:
@@ -960,8 +1517,25 @@ class ObservationEncoder(object):
     shape = [int(x) for x in shape_string.split(",")]
     return shape
 
+  def type(self):
+    return self._type
+
+  def size(self):
+    """Returns the number of values of an encoding."""
+    if self._size is None:
+      self._size = 1
+      for dimension in self.shape():
+        self._size *= dimension
+    return self._size
+
+  @instrumentation.timed('encoder.encode')
   def encode(self, observation):
-    """Encode the observation as a sequence of bits."""
+    """Encode the observation as a list of bits, or of floats for BELIEF."""
+    if self._type != ObservationEncoderType.CANONICAL:
+      c_encoding = ffi.new("float[]", self.size())
+      lib.EncodeObservationInto(self._encoder, observation.observation(),
+                                c_encoding)
+      return list(c_encoding)
     c_encoding_str = lib.EncodeObservation(self._encoder,
                                            observation.observation())
     encoding_string = encode_ffi_string(c_encoding_str)
@@ -971,7 +1545,143 @@ class ObservationEncoder(object):
     encoding = [int(x) for x in encoding_string.split(",")]
     return encoding
 
+  @instrumentation.timed('encoder.encode')
+  def encode_into(self, observation, out):
+    """Writes the encoding of the observation to a buffer of floats.
+
+    Avoids building a Python list, e.g. to encode straight into a row of a
+    numpy array.
+
+    Args:
+      observation: HanabiObservation to encode.
+      out: writable C-contiguous buffer of at least size() float32 values,
+        such as a numpy array of dtype float32.
+
+    Returns:
+      out.
+
+    Raises:
+      ValueError: if out is not a float32 buffer of at least size() values.
+    """
+    if getattr(out, "dtype", "float32") != "float32":
+      raise ValueError("Expected a float32 buffer, got {}.".format(out.dtype))
+    c_encoding = ffi.from_buffer("float[]", out, require_writable=True)
+    if len(c_encoding) < self.size():
+      raise ValueError("Buffer of {} values, the encoding has {}.".format(
+          len(c_encoding), self.size()))
+    lib.EncodeObservationInto(self._encoder, observation.observation(),
+                              c_encoding)
+    return out
+
+  def max_active_bits(self):
+    """Returns the maximum number of bits set in a CANONICAL encoding.
+
+    Raises:
+      ValueError: if the encoder is not CANONICAL.
+    """
+    if self._type != ObservationEncoderType.CANONICAL:
+      raise ValueError("Sparse encodings are CANONICAL, the encoder is "
+                       "{}.".format(self._type.name))
+    if self._max_active_bits is None:
+      self._max_active_bits = lib.ObservationMaxActiveBits(self._encoder)
+    return self._max_active_bits
+
+  @instrumentation.timed('encoder.encode_sparse')
+  def encode_sparse(self, observation):
+    """Returns the indices of the bits set in a CANONICAL encoding.
+
+    Indices are in increasing order. Encodings are mostly zeros, so this is
+    much shorter than encode(), and cheaper to get.
+
+    Raises:
+      ValueError: if the encoder is not CANONICAL.
+    """
+    c_indices = ffi.new("int16_t[]", self.max_active_bits())
+    count = lib.EncodeObservationSparse(self._encoder,
+                                        observation.observation(), c_indices)
+    return ffi.unpack(c_indices, count)
+
+  @instrumentation.timed('encoder.encode_sparse')
+  def encode_sparse_into(self, observation, out):
+    """Writes the indices of the bits set in a CANONICAL encoding to a buffer.
+
+    Args:
+      observation: HanabiObservation to encode.
+      out: writable C-contiguous buffer of at least max_active_bits() int16
+        values, such as a numpy array of dtype int16.
+
+    Returns:
+      The number of indices written, in increasing order, at the start of out.
+
+    Raises:
+      ValueError: if the encoder is not CANONICAL, or out is not an int16
+        buffer of max_active_bits() values.
+    """
+    max_active_bits = self.max_active_bits()
+    if getattr(out, "dtype", "int16") != "int16":
+      raise ValueError("Expected an int16 buffer, got {}.".format(out.dtype))
+    c_indices = ffi.from_buffer("int16_t[]", out, require_writable=True)
+    if len(c_indices) < max_active_bits:
+      raise ValueError("Buffer of {} values, a sparse encoding has up to "
+                       "{}.".format(len(c_indices), max_active_bits))
+    return lib.EncodeObservationSparse(self._encoder,
+                                       observation.observation(), c_indices)
+
+
+class IncrementalObservationEncoder(object):
+  """Stateful CANONICAL encoder, for consecutive observations of a game.
+
+  Keeps the last encoding of every player, and only re-encodes the sections
+  changed by the moves made since: the board and last action, and when needed
+  the discard pile and the cards and card knowledge of the hands that changed.
+  Encodings are equal to those of ObservationEncoder.
+
+  Observations of a player must come from a single game, in order. Call
+  reset() before encoding observations of another game.
+  """
+
+  def __init__(self, game):
+    self._game = game.c_game
+    self._parent_game = game
+    self._encoder = ffi.new("pyhanabi_incremental_encoder_t*")
+    lib.NewIncrementalEncoder(self._encoder, self._game)
+    self._size = lib.IncrementalEncoderSize(self._encoder)
+
+  def __del__(self):
+    if self._encoder is not None:
+      lib.DeleteIncrementalEncoder(self._encoder)
+      self._encoder = None
+      self._game = None
+    del self
+
+  def shape(self):
+    return [self._size]
+
+  def size(self):
+    return self._size
+
+  def reset(self):
+    """Forgets the last encodings, the next ones are encoded in full."""
+    lib.ResetIncrementalEncoder(self._encoder)
+
+  @instrumentation.timed('encoder.encode_incremental')
+  def encode(self, observation, player):
+    """Returns the encoding of an observation of player, as a list of bits.
+
+    Args:
+      observation: HanabiObservation to encode.
+      player: int, absolute index of the observing player.
+    """
+    return ffi.unpack(self.encode_buffer(observation, player), self._size)
+
+  def encode_buffer(self, observation, player):
+    """Returns the encoding of an observation of player, without copying it.
+
+    Returns:
+      A cffi pointer to size() uint8_t bits, owned by the encoder. It holds
+      the encoding until the next encode of the same player or reset(), and
+      can be wrapped with numpy.frombuffer(ffi.buffer(pointer, size())).
+    """
+    return lib.EncodeObservationIncremental(self._encoder,
+                                            observation.observation(), player)
 
-try_cdef()
-if cdef_loaded():
-  try_load()
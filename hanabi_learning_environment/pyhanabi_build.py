@@ -0,0 +1,192 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Builds the compiled cffi extension of pyhanabi.
+
+pyhanabi.py binds the C API of pyhanabi.h in one of two ways. If the
+_pyhanabi_cffi extension built by this script can be imported, it is used:
+the bindings are compiled (cffi API mode), so importing parses nothing and
+calls skip the libffi marshalling. Otherwise pyhanabi.py parses pyhanabi.h
+and loads libpyhanabi.so at run time (cffi ABI mode), as before.
+
+The extension links against libpyhanabi.so, so build the library first, then
+run this script to build the extension next to it:
+
+  cmake . && make
+  python hanabi_learning_environment/pyhanabi_build.py
+
+The CMake build runs it with --optional, so that a missing compiler or
+Python headers only leave the ABI mode fallback.
+
+In ABI mode, pyhanabi.py caches the parsed header as a Python module written
+by emit_cdef_module, keyed by a hash of the header, so that the header is
+only parsed once per version.
+
+pyhanabi.py imports this module on every import, so its own imports are kept
+to the standard library and made when needed.
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+
+PYHANABI_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_NAME = "_pyhanabi_cffi"
+
+
+def read_cdef(header_file):
+  """Returns the declarations of the extern "C" block of pyhanabi.h.
+
+  Args:
+    header_file: path of the header.
+  """
+  with open(header_file) as header:
+    return extract_cdef(header.read())
+
+
+def extract_cdef(header_text):
+  """Returns the declarations of the extern "C" block of a header's text."""
+  reading_cdef = False
+  cdef_string = ""
+  for line in header_text.splitlines():
+    line = line.rstrip()
+    if re.match("extern *\"C\" *{", line):
+      reading_cdef = True
+      continue
+    elif re.match("} */[*] *extern *\"C\" *[*]/", line):
+      reading_cdef = False
+      continue
+    if reading_cdef:
+      cdef_string = cdef_string + line + "\n"
+  return cdef_string
+
+
+def emit_cdef_module(cdef_string, module_name, path):
+  """Parses declarations, and writes them as a cffi out-of-line ABI module.
+
+  Importing the module gives an `ffi` with the declarations, without parsing
+  them again. The module is written atomically, so that processes can share
+  a cache directory.
+
+  Args:
+    cdef_string: str, C declarations.
+    module_name: str, name of the module.
+    path: str, path of the module file to write.
+
+  Returns:
+    A cffi.FFI with the declarations.
+  """
+  import cffi  # pylint: disable=g-import-not-at-top
+  from cffi import recompiler  # pylint: disable=g-import-not-at-top
+  builder = cffi.FFI()
+  builder.cdef(cdef_string)
+  temporary_path = "{}.{}.tmp".format(path, os.getpid())
+  # As FFI.emit_python_code, without printing the file name.
+  recompiler.make_py_source(builder, module_name, temporary_path)
+  os.replace(temporary_path, path)
+  return builder
+
+
+def make_builder(include_dir=PYHANABI_DIR, lib_dir=PYHANABI_DIR):
+  """Returns the cffi.FFI builder of the extension.
+
+  Args:
+    include_dir: directory of pyhanabi.h.
+    lib_dir: directory of libpyhanabi.so.
+  """
+  import cffi  # pylint: disable=g-import-not-at-top
+  builder = cffi.FFI()
+  builder.cdef(read_cdef(os.path.join(include_dir, "pyhanabi.h")))
+  # pyhanabi.h declares its functions in an extern "C" block, so the
+  # extension is compiled as C++. Installed, the extension sits next to
+  # libpyhanabi.so, hence the $ORIGIN run path.
+  builder.set_source(
+      MODULE_NAME, '#include "pyhanabi.h"',
+      source_extension=".cpp",
+      include_dirs=[include_dir],
+      libraries=["pyhanabi"],
+      library_dirs=[lib_dir],
+      extra_link_args=["-Wl,-rpath,$ORIGIN",
+                       "-Wl,-rpath," + os.path.abspath(lib_dir)])
+  return builder
+
+
+def build(include_dir=PYHANABI_DIR, lib_dir=PYHANABI_DIR,
+          output_dir=PYHANABI_DIR, verbose=False):
+  """Compiles the extension.
+
+  Args:
+    include_dir: directory of pyhanabi.h.
+    lib_dir: directory of libpyhanabi.so.
+    output_dir: directory to write the extension to.
+    verbose: bool, whether to print the compiler commands.
+
+  Returns:
+    The path of the extension.
+  """
+  import shutil  # pylint: disable=g-import-not-at-top
+  import tempfile  # pylint: disable=g-import-not-at-top
+  builder = make_builder(include_dir, lib_dir)
+  tmpdir = tempfile.mkdtemp(prefix="pyhanabi_build")
+  try:
+    built = builder.compile(tmpdir=tmpdir, verbose=verbose)
+    target = os.path.join(output_dir, os.path.basename(built))
+    shutil.copy(built, target)
+  finally:
+    shutil.rmtree(tmpdir, ignore_errors=True)
+  return target
+
+
+USAGE = """usage: pyhanabi_build.py [options]
+--include_dir  directory of pyhanabi.h.
+--lib_dir      directory of libpyhanabi.so.
+--output_dir   directory to write the extension to.
+--optional     exit successfully if the extension cannot be built.
+--verbose      print the compiler commands."""
+
+
+if __name__ == "__main__":
+  import getopt  # pylint: disable=g-import-not-at-top
+  flags = {"include_dir": PYHANABI_DIR, "lib_dir": PYHANABI_DIR,
+           "output_dir": PYHANABI_DIR}
+  try:
+    options, arguments = getopt.getopt(
+        sys.argv[1:], "",
+        [flag + "=" for flag in flags] + ["optional", "verbose"])
+  except getopt.GetoptError:
+    sys.exit(USAGE)
+  if arguments:
+    sys.exit(USAGE)
+  optional = False
+  verbose = False
+  for flag, value in options:
+    if flag == "--optional":
+      optional = True
+    elif flag == "--verbose":
+      verbose = True
+    else:
+      flags[flag[2:]] = value
+
+  try:
+    path = build(flags["include_dir"], flags["lib_dir"], flags["output_dir"],
+                 verbose)
+  except Exception as error:  # pylint: disable=broad-except
+    # cffi reports compiler failures with distutils or setuptools errors.
+    if not optional:
+      raise
+    print("Not building the pyhanabi extension, pyhanabi will use ABI mode: "
+          "{}".format(error))
+  else:
+    print("Built {}".format(path))
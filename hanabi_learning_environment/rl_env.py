@@ -16,6 +16,10 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import random
+
+from hanabi_learning_environment import game_cache
+from hanabi_learning_environment import instrumentation
 from hanabi_learning_environment import pyhanabi
 from hanabi_learning_environment.pyhanabi import color_char_to_idx
 
@@ -82,7 +86,9 @@ class HanabiEnv(Environment):
   ```
   """
 
-  def __init__(self, config):
+  def __init__(self, config,
+               encoder_type=pyhanabi.ObservationEncoderType.CANONICAL,
+               sparse_observations=False):
     r"""Creates an environment with the given game configuration.
 
     Args:
@@ -99,17 +105,59 @@ class HanabiEnv(Environment):
             1: First-order common knowledge observation.
           - seed: int, Random seed.
           - random_start_player: bool, Random start player.
+      encoder_type: pyhanabi.ObservationEncoderType of the 'vectorized'
+        observations. CANONICAL observations are lists of bits, BELIEF
+        observations also have card probabilities.
+      sparse_observations: bool, if True observations hold the indices of the
+        bits set in their CANONICAL encoding as 'vectorized_indices', see
+        pyhanabi.ObservationEncoder.encode_sparse, instead of 'vectorized'.
+
+    The game and encoder are shared with the other users of the same
+    configuration, see game_cache.py, until close() is called.
     """
     assert isinstance(config, dict), "Expected config to be of type dict."
-    self.game = pyhanabi.HanabiGame(config)
-
-    self.observation_encoder = pyhanabi.ObservationEncoder(
-        self.game, pyhanabi.ObservationEncoderType.CANONICAL)
+    self.encoder_type = pyhanabi.ObservationEncoderType(encoder_type)
+    if (sparse_observations and
+        self.encoder_type != pyhanabi.ObservationEncoderType.CANONICAL):
+      raise ValueError("Sparse observations are CANONICAL encodings.")
+    self._config = dict(config)
+    self.sparse_observations = sparse_observations
+    self.game, self.observation_encoder = game_cache.acquire(
+        self._config, self.encoder_type)
+    # The shared game is not seeded, the seed of the config seeds the games
+    # reset without a seed instead.
+    seed = game_cache.config_seed(self._config)
+    self._seed_rng = None if seed is None else random.Random(seed)
+    # Canonical observations of consecutive steps are encoded incrementally.
+    self._incremental_encoder = None
+    if (self.encoder_type == pyhanabi.ObservationEncoderType.CANONICAL and
+        not sparse_observations):
+      self._incremental_encoder = pyhanabi.IncrementalObservationEncoder(
+          self.game)
     self.players = self.game.num_players()
 
-  def reset(self):
+  def close(self):
+    """Releases the shared game and encoder. The environment is unusable."""
+    if self._config is not None:
+      game_cache.release(self._config)
+      self._config = None
+
+  def __del__(self):
+    # The module may be torn down already at exit, and __init__ may have
+    # failed.
+    if game_cache is not None and hasattr(self, "_config"):
+      self.close()
+
+  @instrumentation.timed('env.reset')
+  def reset(self, seed=None):
     r"""Resets the environment for a new game.
 
+    Args:
+      seed: int, optional seed for the new game's chance events. Games reset
+        with the same seed deal the same cards given the same actions. If None,
+        the seed is drawn from a generator seeded by the config's "seed", or
+        from the game's random number generator if the config has no seed.
+
     Returns:
       observation: dict, containing the full observation about the game at the
         current step. *WARNING* This observation contains all the hands of the
@@ -207,10 +255,13 @@ class HanabiEnv(Environment):
                                   'num_players': 2,
                                   'vectorized': [ 0, 0, 1, ... ]}]}
     """
-    self.state = self.game.new_initial_state()
+    if seed is None and self._seed_rng is not None:
+      seed = self._seed_rng.randint(0, 2**31 - 1)
+    self.state = self.game.new_initial_state(seed=seed)
+    if self._incremental_encoder is not None:
+      self._incremental_encoder.reset()
 
-    while self.state.cur_player() == pyhanabi.CHANCE_PLAYER_ID:
-      self.state.deal_random_card()
+    self.state.deal_pending_cards()
 
     obs = self._make_observation_all_players()
     obs["current_player"] = self.state.cur_player()
@@ -232,6 +283,7 @@ class HanabiEnv(Environment):
     """
     return self.game.max_moves()
 
+  @instrumentation.timed('env.step')
   def step(self, action):
     """Take one step in the game.
 
@@ -354,8 +406,7 @@ class HanabiEnv(Environment):
     # Apply the action to the state.
     self.state.apply_move(action)
 
-    while self.state.cur_player() == pyhanabi.CHANCE_PLAYER_ID:
-      self.state.deal_random_card()
+    self.state.deal_pending_cards()
 
     observation = self._make_observation_all_players()
     done = self.state.is_terminal()
@@ -365,6 +416,7 @@ class HanabiEnv(Environment):
 
     return (observation, reward, done, info)
 
+  @instrumentation.timed('env.make_observation_all_players')
   def _make_observation_all_players(self):
     """Make observation for all players.
 
@@ -432,7 +484,14 @@ class HanabiEnv(Environment):
       obs_dict["card_knowledge"].append(player_hints_as_dicts)
 
     # ipdb.set_trace()
-    obs_dict["vectorized"] = self.observation_encoder.encode(observation)
+    if self.sparse_observations:
+      obs_dict["vectorized_indices"] = self.observation_encoder.encode_sparse(
+          observation)
+    elif self._incremental_encoder is not None:
+      obs_dict["vectorized"] = self._incremental_encoder.encode(observation,
+                                                                player_id)
+    else:
+      obs_dict["vectorized"] = self.observation_encoder.encode(observation)
     obs_dict["pyhanabi"] = observation
 
     return obs_dict
@@ -498,13 +557,19 @@ class HanabiEnv(Environment):
     return move
 
 
-def make(environment_name="Hanabi-Full", num_players=2, pyhanabi_path=None):
+def make(environment_name="Hanabi-Full", num_players=2, pyhanabi_path=None,
+         encoder_type=pyhanabi.ObservationEncoderType.CANONICAL,
+         sparse_observations=False):
   """Make an environment.
 
   Args:
     environment_name: str, Name of the environment to instantiate.
     num_players: int, Number of players in this game.
     pyhanabi_path: str, absolute path to header files for c code linkage.
+    encoder_type: pyhanabi.ObservationEncoderType of the vectorized
+      observations.
+    sparse_observations: bool, if True observations hold the indices of the
+      bits set in their encoding, see HanabiEnv.
 
   Returns:
     env: An `Environment` object.
@@ -534,7 +599,9 @@ def make(environment_name="Hanabi-Full", num_players=2, pyhanabi_path=None):
                 3,
             "observation_type":
                 pyhanabi.AgentObservationType.CARD_KNOWLEDGE.value
-        })
+        },
+        encoder_type=encoder_type,
+        sparse_observations=sparse_observations)
   elif environment_name == "Hanabi-Full-Minimal":
     return HanabiEnv(
         config={
@@ -544,7 +611,9 @@ def make(environment_name="Hanabi-Full", num_players=2, pyhanabi_path=None):
             "max_information_tokens": 8,
             "max_life_tokens": 3,
             "observation_type": pyhanabi.AgentObservationType.MINIMAL.value
-        })
+        },
+        encoder_type=encoder_type,
+        sparse_observations=sparse_observations)
   elif environment_name == "Hanabi-Small":
     return HanabiEnv(
         config={
@@ -562,7 +631,9 @@ def make(environment_name="Hanabi-Full", num_players=2, pyhanabi_path=None):
                 1,
             "observation_type":
                 pyhanabi.AgentObservationType.CARD_KNOWLEDGE.value
-        })
+        },
+        encoder_type=encoder_type,
+        sparse_observations=sparse_observations)
   elif environment_name == "Hanabi-Very-Small":
     return HanabiEnv(
         config={
@@ -580,7 +651,9 @@ def make(environment_name="Hanabi-Full", num_players=2, pyhanabi_path=None):
                 1,
             "observation_type":
                 pyhanabi.AgentObservationType.CARD_KNOWLEDGE.value
-        })
+        },
+        encoder_type=encoder_type,
+        sparse_observations=sparse_observations)
   else:
     raise ValueError("Unknown environment {}".format(environment_name))
 
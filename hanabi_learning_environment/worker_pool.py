@@ -0,0 +1,354 @@
+# Copyright 2018 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Pool of worker processes forked from a preloaded server process.
+
+Starting a worker from a fresh interpreter imports pyhanabi, loads the
+library, and builds the games and encoders again in every worker. A
+WorkerPool does this once: it starts a server process, which loads the
+library, builds the games and encoders of the given configurations and runs
+an optional initializer, and then forks the workers from it. Workers inherit
+everything the server loaded, and start in milliseconds. Their random number
+generators, and those of the cached games, are reseeded after the fork.
+
+  with worker_pool.WorkerPool(4, game_configs=[config]) as pool:
+    results = pool.map(play_games, tasks)
+
+Tasks are sent to the workers over pipes, as a picklable function and its
+arguments, and run in the worker with:
+
+  game = worker_pool.preloaded_game(config)
+  encoder = worker_pool.preloaded_encoder(config)
+
+The server is started from a fresh interpreter, so the pool can be used from
+processes that must not fork, e.g. after TensorFlow created a session.
+Forking needs a POSIX system.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+
+import collections
+import multiprocessing
+from multiprocessing import connection as mp_connection
+from multiprocessing import reduction
+import os
+import pickle
+import random
+import signal
+import socket
+import sys
+import traceback
+
+from hanabi_learning_environment import game_cache
+from hanabi_learning_environment import pyhanabi
+
+# Objects left by the initializer, inherited by the workers.
+_context = {}
+
+
+def preloaded_game(config):
+  """Returns the HanabiGame of a configuration.
+
+  In a worker, the game built by the server process if the configuration was
+  preloaded. Games are shared through game_cache, so environments built from
+  the same configuration use the preloaded game too.
+
+  Args:
+    config: dict, game parameters, as for pyhanabi.HanabiGame.
+  """
+  return game_cache.get_game(config)
+
+
+def preloaded_encoder(config):
+  """Returns the CANONICAL ObservationEncoder of preloaded_game(config)."""
+  return game_cache.get_encoder(config)
+
+
+def preloaded_context():
+  """Returns the dict of objects an initializer leaves for the workers.
+
+  The initializer of a WorkerPool runs in the server process, and can store
+  objects in this dict, e.g. multiprocessing queues passed in its arguments,
+  which can only be shared with the workers by inheritance.
+  """
+  return _context
+
+
+class WorkerError(Exception):
+  """Raised when a worker exits, or a task's exception cannot be sent."""
+
+
+class AsyncResult(object):
+  """Result of a task submitted to a WorkerPool."""
+
+  def __init__(self, pool):
+    self._pool = pool
+    self._ready = False
+    self._ok = None
+    self._value = None
+
+  def _set(self, ok, value):
+    self._ready = True
+    self._ok = ok
+    self._value = value
+
+  def ready(self):
+    """Returns whether the task finished, without blocking."""
+    if not self._ready:
+      self._pool._poll(timeout=0)  # pylint: disable=protected-access
+    return self._ready
+
+  def get(self):
+    """Blocks until the task finished, and returns its result.
+
+    Raises:
+      The exception of the task if it raised one, or WorkerError if its worker
+      exited.
+    """
+    while not self._ready:
+      self._pool._poll()  # pylint: disable=protected-access
+    if not self._ok:
+      raise self._value
+    return self._value
+
+
+def _init_worker():
+  """Undoes what a forked worker must not share with the server."""
+  # The server is a daemon process, which may not start children. Workers are
+  # not, so that tasks can start processes of their own.
+  multiprocessing.current_process().daemon = False
+  # Every worker would otherwise draw the same random numbers, and deal the
+  # same games, as the server and the other workers.
+  game_cache.reseed()
+  random.seed()
+  if "numpy" in sys.modules:
+    sys.modules["numpy"].random.seed()
+
+
+def _run_worker(conn):
+  """Runs the tasks received on a connection, until it is closed."""
+  try:
+    _init_worker()
+    while True:
+      try:
+        message = conn.recv_bytes()
+      except EOFError:
+        break
+      try:
+        function, args = pickle.loads(message)
+        reply = (True, function(*args))
+      except Exception as error:  # pylint: disable=broad-except
+        reply = (False, error, traceback.format_exc())
+      try:
+        conn.send(reply[:2])
+      except Exception:  # pylint: disable=broad-except
+        # The result or the exception cannot be pickled.
+        conn.send((False, WorkerError(
+            reply[2] if len(reply) > 2 else traceback.format_exc())))
+  finally:
+    # Skip the server's exit handlers, which belong to the server.
+    os._exit(0)  # pylint: disable=protected-access
+
+
+def _fork_worker(control):
+  """Forks a worker, and sends its connection end and pid on control."""
+  server_end, worker_end = socket.socketpair()
+  pid = os.fork()
+  if pid == 0:
+    control.close()
+    server_end.close()
+    _run_worker(mp_connection.Connection(worker_end.detach()))
+  worker_end.close()
+  reduction.send_handle(control, server_end.fileno(), os.getppid())
+  server_end.close()
+  control.send(pid)
+  return pid
+
+
+def _serve(control, game_configs, initializer, initargs):
+  """Entry point of the server process."""
+  try:
+    pyhanabi.load()
+    for config in game_configs:
+      preloaded_encoder(config)
+    if initializer is not None:
+      initializer(*initargs)
+  except Exception:  # pylint: disable=broad-except
+    control.send(traceback.format_exc())
+    return
+  control.send(None)
+
+  pids = []
+  while True:
+    try:
+      command = control.recv()
+    except EOFError:
+      break
+    if command != "fork":
+      break
+    pids.append(_fork_worker(control))
+  for pid in pids:
+    os.waitpid(pid, 0)
+
+
+class WorkerPool(object):
+  """Worker processes forked from a server preloaded with pyhanabi."""
+
+  def __init__(self, num_workers=None, game_configs=(), initializer=None,
+               initargs=()):
+    """Starts the server process and forks the workers.
+
+    Args:
+      num_workers: int, number of workers, defaults to the number of CPUs.
+      game_configs: list of dicts, game configurations whose games and
+        CANONICAL encoders are built before forking, see preloaded_game.
+      initializer: picklable function run in the server process before
+        forking, e.g. to import modules or fill preloaded_context.
+      initargs: tuple, arguments of the initializer. They are passed when the
+        server process starts, so they may include multiprocessing queues,
+        events or locks.
+
+    Raises:
+      WorkerError: if the server process could not be initialized.
+    """
+    if num_workers is None:
+      num_workers = multiprocessing.cpu_count()
+    # Duplex pipes are sockets on POSIX, which can carry file descriptors.
+    spawn = multiprocessing.get_context("spawn")
+    self._control, server_control = spawn.Pipe()
+    self._server = spawn.Process(
+        target=_serve,
+        args=(server_control, list(game_configs), initializer,
+              tuple(initargs)))
+    self._server.daemon = True
+    self._server.start()
+    server_control.close()
+
+    self._workers = {}
+    self._idle = []
+    self._running = {}
+    self._backlog = collections.deque()
+    try:
+      error = self._control.recv()
+    except EOFError:
+      error = "The server process exited."
+    if error is not None:
+      self._server.join()
+      raise WorkerError("Could not start the worker pool:\n" + error)
+    for _ in range(num_workers):
+      self._fork()
+
+  def _fork(self):
+    self._control.send("fork")
+    conn = mp_connection.Connection(reduction.recv_handle(self._control))
+    self._workers[conn] = self._control.recv()
+    self._idle.append(conn)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused_exc_info):
+    self.close()
+
+  def num_workers(self):
+    return len(self._workers)
+
+  def pids(self):
+    """Returns the process ids of the workers."""
+    return list(self._workers.values())
+
+  def submit(self, function, *args):
+    """Runs function(*args) in a worker.
+
+    The task starts as soon as a worker is idle. Idle workers only pick up
+    tasks while the pool is used, i.e. in submit, map or AsyncResult methods.
+
+    Args:
+      function: a picklable function, i.e. defined at the top level of a
+        module.
+      *args: picklable arguments.
+
+    Returns:
+      An AsyncResult.
+    """
+    if self._control is None:
+      raise ValueError("The worker pool is closed.")
+    result = AsyncResult(self)
+    self._backlog.append((result, pickle.dumps((function, args), -1)))
+    self._dispatch()
+    return result
+
+  def map(self, function, iterable):
+    """Returns [function(item) for item in iterable], computed by the workers.
+
+    Raises:
+      The first exception raised by a task, in iterable order.
+    """
+    results = [self.submit(function, item) for item in iterable]
+    return [result.get() for result in results]
+
+  def _dispatch(self):
+    while self._backlog and self._idle:
+      result, message = self._backlog.popleft()
+      conn = self._idle.pop()
+      conn.send_bytes(message)
+      self._running[conn] = result
+
+  def _poll(self, timeout=None):
+    """Collects the results of finished tasks and dispatches waiting ones."""
+    if not self._running:
+      if self._backlog:
+        raise WorkerError("Every worker of the pool exited.")
+      return
+    for conn in mp_connection.wait(list(self._running), timeout):
+      result = self._running.pop(conn)
+      try:
+        reply = conn.recv()
+      except EOFError:
+        del self._workers[conn]
+        conn.close()
+        result._set(False, WorkerError("The worker running the task exited."))  # pylint: disable=protected-access
+      else:
+        self._idle.append(conn)
+        result._set(*reply)  # pylint: disable=protected-access
+    self._dispatch()
+
+  def close(self):
+    """Stops the workers once their tasks are done, and the server.
+
+    Tasks that did not start are discarded.
+    """
+    if self._control is None:
+      return
+    self._backlog.clear()
+    for conn in list(self._workers):
+      conn.close()
+    self._workers = {}
+    self._idle = []
+    self._running = {}
+    self._control.send("stop")
+    self._control.close()
+    self._control = None
+    self._server.join()
+
+  def terminate(self):
+    """Kills the workers, running tasks included, and stops the server."""
+    if self._control is None:
+      return
+    for pid in self._workers.values():
+      try:
+        os.kill(pid, signal.SIGTERM)
+      except OSError:
+        pass
+    self.close()